@@ -1,16 +1,53 @@
 import os
+import json
+import threading
+import time
 from dotenv import load_dotenv
 import praw
-from typing import Optional
+from typing import Any, Dict, List, Optional
+from .rate_limit import ScheduledSession, get_scheduler, use_scheduler_throttle
+from .cassette import get_reddit_session
+from .utils import load_config
+
+# Tokens restored from disk must stay valid for at least this long to be reused
+TOKEN_EXPIRY_MARGIN = 60
+
+# prawcore authorizer attributes the token cache and token sharing rely on
+_AUTHORIZER_ATTRIBUTES = ("access_token", "scopes", "refresh")
+
+def _get_authorizer(reddit: praw.Reddit) -> Optional[Any]:
+    """
+    Get the prawcore authorizer behind a Reddit instance.
+    
+    This is the only place that reaches into prawcore's private state. If
+    the internals ever change shape, None is returned and callers fall back
+    to PRAW's normal authentication flow (a fresh login, no token cache).
+    
+    Args:
+        reddit: Reddit instance to inspect
+        
+    Returns:
+        The authorizer, or None if it does not expose the expected attributes
+    """
+    authorizer = getattr(getattr(reddit, "_core", None), "_authorizer", None)
+    if authorizer is None or not all(hasattr(authorizer, name) for name in _AUTHORIZER_ATTRIBUTES):
+        return None
+    return authorizer
 
 class RedditAuth:
     """
     A class to handle Reddit API authentication and provide a configured PRAW instance.
     """
     
-    def __init__(self):
-        """Initialize the RedditAuth instance by loading environment variables."""
+    def __init__(self, token_cache: Optional[str] = None):
+        """
+        Initialize the RedditAuth instance by loading environment variables.
+        
+        Args:
+            token_cache (str, optional): File used to persist the OAuth access token between runs
+        """
         load_dotenv()
+        self.token_cache = token_cache
         self.client_id = os.getenv('REDDIT_CLIENT_ID')
         self.client_secret = os.getenv('REDDIT_CLIENT_SECRET')
         self.username = os.getenv('REDDIT_USERNAME')
@@ -39,17 +76,31 @@ class RedditAuth:
             return False
         return True
 
-    def authenticate(self) -> Optional[praw.Reddit]:
+    def authenticate(self, token_source: Optional[praw.Reddit] = None) -> Optional[praw.Reddit]:
         """
         Authenticate with Reddit using the provided credentials.
         
+        Args:
+            token_source (praw.Reddit, optional): Authenticated instance whose
+                access token is reused instead of logging in again
+        
         Returns:
             praw.Reddit: Authenticated Reddit instance if successful, None otherwise
         
         Raises:
             Exception: If authentication fails
         """
-        if not self.validate_credentials():
+        session = get_reddit_session()
+        replaying = session is not None and session.mode == "replay"
+        if replaying:
+            # Recorded responses stand in for Reddit, so real credentials are optional
+            placeholder = "cassette"
+            self.client_id = self.client_id or placeholder
+            self.client_secret = self.client_secret or placeholder
+            self.username = self.username or placeholder
+            self.password = self.password or placeholder
+            self.user_agent = self.user_agent or 'script:whatsup:v1.0 (by /u/{})'.format(self.username)
+        elif not self.validate_credentials():
             return None
 
         try:
@@ -58,8 +109,22 @@ class RedditAuth:
                 client_secret=self.client_secret,
                 username=self.username,
                 password=self.password,
-                user_agent=self.user_agent
+                user_agent=self.user_agent,
+                requestor_kwargs={"session": session or ScheduledSession(get_scheduler())}
             )
+            use_scheduler_throttle(self._reddit)
+            
+            persist = self.token_cache and not replaying
+            if persist:
+                self._watch_token_refresh()
+            if token_source is not None and self._adopt_token(token_source):
+                return self._reddit
+            if persist and self._restore_token():
+                # The cached token is used as-is; prawcore refreshes it lazily once it expires
+                print("-" * 100)
+                print("Reusing cached Reddit access token")
+                return self._reddit
+            
             # Verify the authentication worked
             self._reddit.user.me()
             print("-" * 100) 
@@ -69,6 +134,110 @@ class RedditAuth:
             print(f"Authentication failed: {str(e)}")
             return None
 
+    def _token_owner(self) -> Dict[str, Any]:
+        """Identify the app and account a cached token belongs to."""
+        return {"client_id": self.client_id, "username": self.username}
+
+    def _restore_token(self) -> bool:
+        """
+        Load a still-valid access token from the token cache into PRAW.
+        
+        Returns:
+            bool: True if a cached token was restored
+        """
+        try:
+            with open(self.token_cache, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        remaining = cached.get("expires_at", 0) - time.time()
+        if cached.get("owner") != self._token_owner() or remaining <= TOKEN_EXPIRY_MARGIN:
+            return False
+        
+        return self._set_token(cached["access_token"], cached.get("scopes"), remaining)
+
+    def _set_token(self, access_token: str, scopes: Optional[List[str]], remaining: float) -> bool:
+        """
+        Install an access token that stays valid for `remaining` seconds into PRAW.
+        
+        Returns:
+            bool: False if PRAW's authorizer could not be reached, so it logs in itself
+        """
+        authorizer = _get_authorizer(self._reddit)
+        if authorizer is None:
+            return False
+        authorizer.access_token = access_token
+        authorizer.scopes = set(scopes or [])
+        if hasattr(authorizer, "_expiration_timestamp_ns") or not hasattr(authorizer, "_expiration_timestamp"):
+            authorizer._expiration_timestamp_ns = time.monotonic_ns() + int(remaining * 1e9)
+        else:
+            authorizer._expiration_timestamp = time.time() + remaining
+        return True
+
+    @staticmethod
+    def _token_remaining(reddit: praw.Reddit) -> float:
+        """Seconds until the access token of a Reddit instance expires (0 if unknown)."""
+        authorizer = _get_authorizer(reddit)
+        if hasattr(authorizer, "_expiration_timestamp_ns"):
+            return (authorizer._expiration_timestamp_ns - time.monotonic_ns()) / 1e9
+        if hasattr(authorizer, "_expiration_timestamp"):
+            return authorizer._expiration_timestamp - time.time()
+        return 0.0
+
+    def _adopt_token(self, source: praw.Reddit) -> bool:
+        """
+        Reuse the still-valid access token of another Reddit instance.
+        
+        Returns:
+            bool: True if a token was adopted
+        """
+        authorizer = _get_authorizer(source)
+        if authorizer is None or not authorizer.access_token:
+            return False
+        remaining = self._token_remaining(source)
+        if remaining <= TOKEN_EXPIRY_MARGIN:
+            return False
+        return self._set_token(authorizer.access_token, authorizer.scopes, remaining)
+
+    def _save_token(self) -> None:
+        """Write PRAW's current access token and its wall-clock expiry to the token cache."""
+        authorizer = _get_authorizer(self._reddit)
+        if authorizer is None or not authorizer.access_token:
+            return
+        remaining = self._token_remaining(self._reddit)
+        
+        cached = {
+            "owner": self._token_owner(),
+            "access_token": authorizer.access_token,
+            "scopes": sorted(authorizer.scopes or []),
+            "expires_at": time.time() + remaining
+        }
+        try:
+            directory = os.path.dirname(self.token_cache)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # The token grants account access, so keep the file private to the user
+            fd = os.open(self.token_cache, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(cached, f)
+        except OSError as e:
+            print(f"Could not save Reddit token cache: {str(e)}")
+
+    def _watch_token_refresh(self) -> None:
+        """Persist the token every time prawcore fetches a new one."""
+        authorizer = _get_authorizer(self._reddit)
+        if authorizer is None:
+            print("Reddit token cache disabled: PRAW's authorizer is not accessible")
+            return
+        refresh = authorizer.refresh
+        
+        def refresh_and_save():
+            refresh()
+            self._save_token()
+        
+        authorizer.refresh = refresh_and_save
+
     @property
     def reddit(self) -> Optional[praw.Reddit]:
         """
@@ -81,15 +250,67 @@ class RedditAuth:
             return self.authenticate()
         return self._reddit
 
+_clients: Dict[str, praw.Reddit] = {}
+_clients_lock = threading.Lock()
+
 def get_reddit_instance() -> Optional[praw.Reddit]:
     """
     Helper function to get an authenticated Reddit instance.
     
+    The instance is created once per process and shared by every caller, so
+    all modules reuse one login and one HTTP connection pool. When
+    `auth.token_cache` is configured, the access token is also persisted to
+    disk so later runs skip the login until it expires.
+    
     Returns:
         praw.Reddit: Authenticated Reddit instance if successful, None otherwise
     """
-    auth = RedditAuth()
-    return auth.reddit
+    config = load_config()
+    key = config.get("cassette", {}).get("mode", "off")
+    with _clients_lock:
+        if key not in _clients:
+            auth = RedditAuth(token_cache=config.get("auth", {}).get("token_cache"))
+            reddit = auth.reddit
+            if not reddit:
+                return None
+            _clients[key] = reddit
+        return _clients[key]
+
+_thread_clients = threading.local()
+
+def get_thread_reddit_instance() -> Optional[praw.Reddit]:
+    """
+    Get a Reddit instance owned by the calling thread.
+    
+    PRAW is not thread-safe: its session, authorizer and rate limiter state
+    are mutated on every request. Worker threads therefore each get their own
+    instance, which starts from the shared instance's access token (so no
+    extra login) and sends its requests through the same shared scheduler.
+    
+    Returns:
+        praw.Reddit: Authenticated Reddit instance for this thread, None if authentication failed
+    """
+    shared = get_reddit_instance()
+    if shared is None:
+        return None
+    config = load_config()
+    key = config.get("cassette", {}).get("mode", "off")
+    clients = getattr(_thread_clients, "clients", None)
+    if clients is None:
+        clients = _thread_clients.clients = {}
+    if key not in clients:
+        auth = RedditAuth(token_cache=config.get("auth", {}).get("token_cache"))
+        reddit = auth.authenticate(token_source=shared)
+        if not reddit:
+            return None
+        clients[key] = reddit
+    return clients[key]
+
+def reset_reddit_instances() -> None:
+    """Forget the shared Reddit instances so the next call authenticates again."""
+    with _clients_lock:
+        _clients.clear()
+    _thread_clients.clients = {}
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,372 @@
+"""
+Batch API mode for bulk structured completions
+
+Requests are written to a JSONL batch file, uploaded and submitted to the
+OpenAI Batch API, polled until the batch finishes, and mapped back to the
+requests in order. The submitted batch is recorded in a state file, so a run
+that is interrupted while waiting resumes the same batch instead of
+submitting (and paying for) it again.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+from openai import OpenAI
+from .cassette import get_openai_cassette
+from .llm_cache import LLMCache, get_llm_cache
+from .utils import load_config, replayed_completion
+
+# Batch statuses after which the batch will not change any more
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchError(Exception):
+    """Raised when a batch fails as a whole or one of its requests has no usable result."""
+
+
+class BatchRequest(NamedTuple):
+    """One structured chat completion request of a batch."""
+    model: str
+    messages: List[Dict[str, Any]]
+    response_format: Any
+
+
+def get_batch_settings() -> Dict[str, Any]:
+    """
+    Get the batch settings from the `batch` config block.
+
+    Returns:
+        Dict[str, Any]: enabled, topics, base_url, state_path, work_dir,
+        poll_seconds and completion_window
+    """
+    settings = load_config().get("batch", {})
+    return {
+        "enabled": settings.get("enabled", False),
+        "topics": settings.get("topics", False),
+        "base_url": settings.get("base_url"),
+        "state_path": settings.get("state_path", "batch_state.json"),
+        "work_dir": settings.get("work_dir", "batches"),
+        "poll_seconds": settings.get("poll_seconds", 60),
+        "completion_window": settings.get("completion_window", "24h")
+    }
+
+
+def strict_json_schema(schema: Any) -> Any:
+    """
+    Make a JSON schema acceptable to structured outputs in strict mode.
+
+    Every object gets `additionalProperties: false` and all of its properties
+    required; `None` defaults are dropped (optional fields stay nullable).
+
+    Args:
+        schema: JSON schema, e.g. from a Pydantic model's `model_json_schema()`
+
+    Returns:
+        Any: The same schema, updated in place
+    """
+    if isinstance(schema, list):
+        for entry in schema:
+            strict_json_schema(entry)
+        return schema
+    if not isinstance(schema, dict):
+        return schema
+    if schema.get("type") == "object":
+        schema.setdefault("additionalProperties", False)
+    if isinstance(schema.get("properties"), dict):
+        schema["required"] = list(schema["properties"])
+    if "default" in schema and schema["default"] is None:
+        del schema["default"]
+    for key in ("$defs", "properties"):
+        for entry in schema.get(key, {}).values():
+            strict_json_schema(entry)
+    for key in ("items", "anyOf", "allOf"):
+        if key in schema:
+            strict_json_schema(schema[key])
+    return schema
+
+
+def response_format_param(response_format: Any) -> Dict[str, Any]:
+    """
+    Build the `response_format` body of a structured completion request.
+
+    Args:
+        response_format: Pydantic model describing the response
+
+    Returns:
+        Dict[str, Any]: A strict `json_schema` response format named after the model
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.__name__,
+            "schema": strict_json_schema(response_format.model_json_schema()),
+            "strict": True
+        }
+    }
+
+
+class BatchRunner:
+    """
+    Submits batches of structured completion requests and collects their results.
+
+    Requests already in the LLM response cache are answered from it and left
+    out of the batch; batch results are written back to the cache.
+
+    In cassette record or replay mode no batch is submitted: the Files and
+    Batch endpoints are not recorded, so each request goes through the
+    cassette client instead and shares its entries with the synchronous path.
+    """
+    def __init__(self, client: Any = None, settings: Optional[Dict[str, Any]] = None,
+                 cache: Optional[LLMCache] = None):
+        """
+        Args:
+            client: OpenAI client exposing `files` and `batches` (default: the
+                cassette client when cassettes are on, otherwise one for `batch.base_url`)
+            settings: Batch settings (default: `get_batch_settings()`)
+            cache: Response cache (default: the shared cache when enabled)
+        """
+        self.settings = settings or get_batch_settings()
+        self.cassette = get_openai_cassette() if client is None else None
+        if client is None and self.cassette is None:
+            client = OpenAI(base_url=self.settings["base_url"])
+        self.client = client
+        self.cache = cache if cache is not None else get_llm_cache()
+
+    def run(self, name: str, requests: List[BatchRequest]) -> List[Any]:
+        """
+        Run requests through the Batch API and wait for their results.
+
+        Args:
+            name: Name of the batch (e.g. `post_summaries`); one batch per name can be pending
+            requests: Requests to send
+
+        Returns:
+            List[Any]: Per request, in order, a completion shaped like a
+            ParsedChatCompletion or the BatchError explaining why there is none
+
+        Raises:
+            BatchError: If the batch as a whole failed, expired or was cancelled without results
+        """
+        results: List[Any] = [None] * len(requests)
+        keys = [LLMCache.key(*request) for request in requests]
+        pending = []
+        for index, (request, key) in enumerate(zip(requests, keys)):
+            cached = self.cache.get(key, request.response_format) if self.cache is not None else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+        if not pending:
+            print(f"Batch {name}: all {len(requests)} requests answered from the cache")
+            return results
+
+        if self.cassette is not None:
+            outputs = self.run_through_cassette(name, requests, pending)
+        else:
+            outputs = self.submit_and_wait(name, requests, pending)
+        for index in pending:
+            results[index] = outputs[index]
+            if self.cache is not None and not isinstance(results[index], BatchError):
+                self.cache.put(keys[index], requests[index].model, results[index])
+        return results
+
+    def run_through_cassette(self, name: str, requests: List[BatchRequest], pending: List[int]) -> Dict[int, Any]:
+        """
+        Answer requests one by one through the cassette client.
+
+        Returns:
+            Dict[int, Any]: Parsed completion or BatchError per pending request index
+        """
+        print(f"Batch {name}: cassette mode, sending {len(pending)} requests through the cassette")
+        outputs: Dict[int, Any] = {}
+        for index in pending:
+            request = requests[index]
+            try:
+                outputs[index] = self.cassette.beta.chat.completions.parse(
+                    model=request.model,
+                    messages=request.messages,
+                    response_format=request.response_format
+                )
+            except Exception as e:
+                outputs[index] = BatchError(f"Request failed: {str(e)}")
+        return outputs
+
+    def submit_and_wait(self, name: str, requests: List[BatchRequest], pending: List[int]) -> Dict[int, Any]:
+        """
+        Send pending requests as one batch and wait for its results.
+
+        Returns:
+            Dict[int, Any]: Parsed completion or BatchError per pending request index
+
+        Raises:
+            BatchError: If the batch as a whole failed, expired or was cancelled without results
+        """
+        lines = [
+            json.dumps({
+                "custom_id": str(index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": requests[index].model,
+                    "messages": requests[index].messages,
+                    "response_format": response_format_param(requests[index].response_format)
+                }
+            }, ensure_ascii=False)
+            for index in pending
+        ]
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        batch = self.submit(name, content)
+        batch = self.wait(name, batch)
+
+        outputs = self.read_output(batch)
+        results: Dict[int, Any] = {}
+        for index in pending:
+            try:
+                results[index] = self.parse_output(outputs.get(str(index)), requests[index].response_format)
+            except BatchError as e:
+                results[index] = e
+
+        self.forget(name)
+        return results
+
+    def submit(self, name: str, content: bytes) -> Any:
+        """
+        Upload the batch file and create the batch, or resume the batch already
+        submitted for the same requests.
+
+        Args:
+            name: Name of the batch
+            content: JSONL batch file
+
+        Returns:
+            The Batch object
+        """
+        input_hash = hashlib.sha256(content).hexdigest()
+        state = self.load_state()
+        entry = state.get(name)
+        if entry and entry["input_hash"] == input_hash:
+            batch = self.client.batches.retrieve(entry["batch_id"])
+            if batch.status not in ("failed", "expired", "cancelled"):
+                print(f"Batch {name}: resuming {batch.id} ({batch.status})")
+                return batch
+
+        os.makedirs(self.settings["work_dir"], exist_ok=True)
+        input_path = os.path.join(self.settings["work_dir"], f"{name}-input.jsonl")
+        with open(input_path, "wb") as f:
+            f.write(content)
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.settings["completion_window"],
+            metadata={"name": name}
+        )
+        state[name] = {
+            "batch_id": batch.id,
+            "input_file_id": input_file.id,
+            "input_hash": input_hash,
+            "submitted_at": time.time()
+        }
+        self.save_state(state)
+        print(f"Batch {name}: submitted {batch.id} with {len(content.splitlines())} requests")
+        return batch
+
+    def wait(self, name: str, batch: Any) -> Any:
+        """
+        Poll a batch until it reaches a final status.
+
+        Returns:
+            The finished Batch object
+
+        Raises:
+            BatchError: If the batch ended without any output
+        """
+        while batch.status not in FINAL_STATUSES:
+            time.sleep(self.settings["poll_seconds"])
+            batch = self.client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            progress = f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else ""
+            print(f"Batch {name}: {batch.status}{progress}")
+
+        if batch.status != "completed" and not batch.output_file_id:
+            self.forget(name)
+            errors = "; ".join(error.message for error in (batch.errors.data if batch.errors and batch.errors.data else []))
+            raise BatchError(f"Batch {name} {batch.status}" + (f": {errors}" if errors else ""))
+        return batch
+
+    def read_output(self, batch: Any) -> Dict[str, Dict[str, Any]]:
+        """Read a finished batch's output and error files, keyed by custom_id."""
+        outputs: Dict[str, Dict[str, Any]] = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    output = json.loads(line)
+                    outputs[output["custom_id"]] = output
+        return outputs
+
+    @staticmethod
+    def parse_output(output: Optional[Dict[str, Any]], response_format: Any) -> Any:
+        """
+        Turn one line of batch output into a parsed completion.
+
+        Raises:
+            BatchError: If the request failed, was refused or has no output
+        """
+        if output is None:
+            raise BatchError("No result returned for this request")
+        response = output.get("response") or {}
+        if output.get("error") or response.get("status_code") != 200:
+            error = output.get("error") or response.get("body", {}).get("error") or {}
+            raise BatchError(f"Request failed: {error.get('message', error) or response.get('status_code')}")
+
+        body = response["body"]
+        message = body["choices"][0]["message"]
+        if not message.get("content"):
+            raise BatchError(f"Request refused: {message.get('refusal')}")
+        try:
+            parsed = response_format.model_validate_json(message["content"])
+        except ValueError as e:
+            raise BatchError(f"Invalid response: {str(e)}")
+        return replayed_completion(response_format, {
+            "model": body.get("model"),
+            "parsed": parsed.model_dump(),
+            "content": message["content"]
+        })
+
+    def load_state(self) -> Dict[str, Any]:
+        """Load the pending batches from the state file."""
+        if not os.path.exists(self.settings["state_path"]):
+            return {}
+        with open(self.settings["state_path"], "r") as f:
+            return json.load(f)
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        """Write the pending batches to the state file."""
+        temp_path = self.settings["state_path"] + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.settings["state_path"])
+
+    def forget(self, name: str) -> None:
+        """Drop a batch from the state file once it is collected or can no longer be resumed."""
+        state = self.load_state()
+        if state.pop(name, None) is not None:
+            self.save_state(state)
+
+
+def run_batch(name: str, requests: List[BatchRequest]) -> List[Any]:
+    """
+    Run requests through the Batch API with the configured settings.
+
+    Args:
+        name: Name of the batch
+        requests: Requests to send
+
+    Returns:
+        List[Any]: Parsed completion or BatchError per request, in order
+    """
+    return BatchRunner().run(name, requests)
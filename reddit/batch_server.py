@@ -0,0 +1,281 @@
+"""
+Local stand-in for the OpenAI Files and Batch API endpoints
+
+Implements just enough of `/v1/files` and `/v1/batches` for `batch.py` to
+upload a batch file, create and poll a batch and download its results without
+network access. Every request in a batch is answered with a placeholder that
+matches its JSON schema. Run it with
+
+    python -m reddit.batch_server --port 8089 --delay 5
+
+and set `batch.base_url` in config.json to `http://127.0.0.1:8089/v1`.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+
+def example_for_schema(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Build a placeholder value that validates against a JSON schema.
+
+    Args:
+        schema: JSON schema (as produced for a structured-output response format)
+        defs: `$defs` of the root schema, used to resolve references
+
+    Returns:
+        Any: Placeholder value
+    """
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_for_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        return example_for_schema(schema["anyOf"][0], defs)
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: example_for_schema(field, defs) for name, field in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_for_schema(schema.get("items", {}), defs)]
+    if kind == "integer":
+        return 0
+    if kind == "number":
+        return 0.0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return f"[{schema.get('title', 'placeholder')}]"
+
+
+class BatchStore:
+    """In-memory files and batches of the stand-in server."""
+    def __init__(self, delay: float = 0.0, error_every: int = 0):
+        """
+        Args:
+            delay: Seconds a batch stays in progress before it completes
+            error_every: Fail every Nth request of a batch (0 never fails)
+        """
+        self.delay = delay
+        self.error_every = error_every
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.contents: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> Dict[str, Any]:
+        """Store a file and return its file object."""
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        self.contents[file_id] = content
+        return self.files[file_id]
+
+    def create_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a batch for an uploaded input file and return its batch object."""
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        total = len(self.contents[body["input_file_id"]].splitlines())
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "in_progress_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": total, "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+            "_ready_at": time.time() + self.delay
+        }
+        return self.batch_view(batch_id)
+
+    def batch_view(self, batch_id: str) -> Dict[str, Any]:
+        """Return a batch object, completing the batch once its delay has passed."""
+        batch = self.batches[batch_id]
+        if batch["status"] == "in_progress" and time.time() >= batch["_ready_at"]:
+            self.complete(batch)
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    def complete(self, batch: Dict[str, Any]) -> None:
+        """Answer every request of a batch and attach the output and error files."""
+        outputs, errors = [], []
+        for number, line in enumerate(self.contents[batch["input_file_id"]].decode("utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            request_id = f"req_{uuid.uuid4().hex[:16]}"
+            if self.error_every and number % self.error_every == 0:
+                errors.append({
+                    "id": f"batch_req_{uuid.uuid4().hex[:16]}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 500, "request_id": request_id,
+                                 "body": {"error": {"message": "Simulated failure", "type": "server_error"}}},
+                    "error": None
+                })
+                continue
+            body = request["body"]
+            schema = body.get("response_format", {}).get("json_schema", {}).get("schema", {"type": "string"})
+            content = json.dumps(example_for_schema(schema))
+            outputs.append({
+                "id": f"batch_req_{uuid.uuid4().hex[:16]}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": request_id, "body": {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:16]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                        "role": "assistant", "content": content, "refusal": None
+                    }}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                }},
+                "error": None
+            })
+
+        def to_jsonl(rows):
+            return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+        if outputs:
+            batch["output_file_id"] = self.add_file(f"{batch['id']}_output.jsonl", "batch_output", to_jsonl(outputs))["id"]
+        if errors:
+            batch["error_file_id"] = self.add_file(f"{batch['id']}_error.jsonl", "batch_output", to_jsonl(errors))["id"]
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+
+class BatchHandler(BaseHTTPRequestHandler):
+    """Routes the Files and Batch endpoints to the server's BatchStore."""
+    server_version = "BatchStandIn/1.0"
+
+    @property
+    def store(self) -> BatchStore:
+        return self.server.store
+
+    def send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str) -> None:
+        self.send_json({"error": {"message": message, "type": "invalid_request_error"}}, status)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def read_upload(self) -> Tuple[Dict[str, str], Optional[Tuple[str, bytes]]]:
+        """Parse a multipart/form-data upload into its fields and its file."""
+        raw = b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + self.read_body()
+        fields, upload = {}, None
+        for part in BytesParser(policy=HTTP).parsebytes(raw).iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename():
+                upload = (part.get_filename(), part.get_payload(decode=True))
+            else:
+                fields[name] = part.get_payload(decode=True).decode("utf-8")
+        return fields, upload
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        with self.store.lock:
+            if path == "/v1/files":
+                fields, upload = self.read_upload()
+                if upload is None:
+                    return self.send_error_json(400, "Missing file")
+                return self.send_json(self.store.add_file(upload[0], fields.get("purpose", "batch"), upload[1]))
+
+            if path == "/v1/batches":
+                body = json.loads(self.read_body() or b"{}")
+                if body.get("input_file_id") not in self.store.contents:
+                    return self.send_error_json(404, f"No such file: {body.get('input_file_id')}")
+                return self.send_json(self.store.create_batch(body))
+
+            match = re.fullmatch(r"/v1/batches/([^/]+)/cancel", path)
+            if match and match.group(1) in self.store.batches:
+                batch = self.store.batches[match.group(1)]
+                if batch["status"] == "in_progress":
+                    batch["status"] = "cancelled"
+                return self.send_json(self.store.batch_view(match.group(1)))
+
+        self.send_error_json(404, f"Unknown endpoint {path}")
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        with self.store.lock:
+            match = re.fullmatch(r"/v1/batches/([^/]+)", path)
+            if match:
+                if match.group(1) not in self.store.batches:
+                    return self.send_error_json(404, f"No such batch: {match.group(1)}")
+                return self.send_json(self.store.batch_view(match.group(1)))
+
+            match = re.fullmatch(r"/v1/files/([^/]+)(/content)?", path)
+            if match and match.group(1) in self.store.files:
+                if not match.group(2):
+                    return self.send_json(self.store.files[match.group(1)])
+                content = self.store.contents[match.group(1)]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+
+        self.send_error_json(404, f"Unknown endpoint {path}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8089, delay: float = 0.0, error_every: int = 0) -> ThreadingHTTPServer:
+    """
+    Create the stand-in server (call `serve_forever()` to run it).
+
+    Args:
+        host: Address to bind
+        port: Port to bind (0 picks a free one)
+        delay: Seconds a batch stays in progress
+        error_every: Fail every Nth request of a batch (0 never fails)
+
+    Returns:
+        ThreadingHTTPServer: The server, with its BatchStore as `server.store`
+    """
+    server = ThreadingHTTPServer((host, port), BatchHandler)
+    server.store = BatchStore(delay, error_every)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenAI Batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=5.0, help="Seconds before a batch completes")
+    parser.add_argument("--error-every", type=int, default=0, help="Fail every Nth request (0 never fails)")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.delay, args.error_every)
+    print(f"Batch stand-in listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
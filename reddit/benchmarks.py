@@ -0,0 +1,387 @@
+"""
+Micro-benchmarks for the hot paths of the Reddit pipeline
+
+Usage:
+    python -m reddit.benchmarks comment_tree [--comments N]
+    python -m reddit.benchmarks db_writes [--posts N]
+    python -m reddit.benchmarks search [--posts N]
+    python -m reddit.benchmarks trending [--posts N]
+    python -m reddit.benchmarks prefilter [--subreddits N]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+from .comment_tree import CommentForest, walk_comments
+from .db import RedditDB
+from .formatter import format_comment_threads
+from .search import prefilter_subreddits
+from .trending import compute_trends, rank_posts, tails_to_arrays
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[Any, int]:
+    """Build an object and return it with the bytes allocated while building it."""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+def _timed(func: Callable[[], Any], repeat: int = 3) -> float:
+    """Best wall-clock time of `func` over `repeat` runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def synthetic_comments(total: int, width: int = 5, depth: int = 6, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build a synthetic nested comment tree in the RedditScraper dict shape.
+
+    Args:
+        total: Number of comments to generate
+        width: Maximum replies per comment
+        depth: Maximum reply depth
+        seed: Random seed
+
+    Returns:
+        List[Dict]: Top-level comment dictionaries with nested `replies`
+    """
+    rng = random.Random(seed)
+    roots: List[Dict[str, Any]] = []
+    # Comments that can still take replies, with their depth
+    open_nodes: List[Tuple[Dict[str, Any], int]] = []
+    for count in range(total):
+        comment = {
+            'id': f"c{count:x}",
+            'author': f"user{rng.randrange(1000)}",
+            'body': f"comment {count}",
+            'score': rng.randrange(-10, 1000),
+            'created_utc': 1.7e9 + count,
+            'replies': []
+        }
+        if not open_nodes or rng.random() < 0.05:
+            roots.append(comment)
+            level = 0
+        else:
+            index = rng.randrange(len(open_nodes))
+            parent, parent_level = open_nodes[index]
+            parent['replies'].append(comment)
+            if len(parent['replies']) >= width:
+                open_nodes[index] = open_nodes[-1]
+                open_nodes.pop()
+            level = parent_level + 1
+        if level < depth:
+            open_nodes.append((comment, level))
+    return roots
+
+def bench_comment_tree(total: int = 200_000) -> Dict[str, float]:
+    """
+    Compare nested dicts with CommentForest for memory and traversal cost.
+
+    Args:
+        total: Number of synthetic comments
+
+    Returns:
+        Dict[str, float]: Bytes per comment and traversal times in seconds
+    """
+    comments = synthetic_comments(total)
+
+    # Measure container overhead only; both shapes share the same string objects
+    nested, nested_bytes = _measure(lambda: _copy_nested(comments))
+    forest, forest_bytes = _measure(lambda: CommentForest.from_dicts(comments))
+
+    def count_recursive(nodes):
+        return sum(1 + count_recursive(node['replies']) for node in nodes)
+
+    results = {
+        'comments': len(forest),
+        'dict_bytes_per_comment': nested_bytes / total,
+        'forest_bytes_per_comment': forest_bytes / total,
+        'dict_recursive_count_s': _timed(lambda: count_recursive(nested)),
+        'dict_iterative_walk_s': _timed(lambda: sum(1 for _ in walk_comments(nested))),
+        'forest_count_replies_s': _timed(forest.count_replies),
+        'dict_format_s': _timed(lambda: format_comment_threads(nested), repeat=1),
+        'forest_format_s': _timed(lambda: format_comment_threads(forest), repeat=1),
+        'forest_to_dicts_s': _timed(forest.to_dicts, repeat=1)
+    }
+    return results
+
+def _copy_nested(comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rebuild the nested dict containers of a comment tree, sharing the field values."""
+    return [dict(comment, replies=_copy_nested(comment['replies'])) for comment in comments]
+
+def synthetic_posts(total: int, comments_per_post: int = 5, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build synthetic posts in the RedditScraper dict shape.
+
+    Args:
+        total: Number of posts
+        comments_per_post: Comments in each post's tree
+        seed: Random seed
+
+    Returns:
+        List[Dict]: Post information dictionaries
+    """
+    rng = random.Random(seed)
+    comments = synthetic_comments(comments_per_post, seed=seed)
+    return [
+        {
+            'id': f"p{index:x}",
+            'subreddit': f"sub{index % 30}",
+            'title': f"Synthetic post {index}",
+            'url': f"https://example.com/{index}",
+            'score': rng.randrange(0, 5000),
+            'created_utc': 1.7e9 + index,
+            'author': f"user{rng.randrange(1000)}",
+            'num_comments': comments_per_post,
+            'permalink': f"/r/sub/comments/p{index:x}",
+            'selftext': "lorem ipsum " * rng.randrange(1, 50),
+            'comments': comments
+        }
+        for index in range(total)
+    ]
+
+# The original one-copy-per-scrape schema, kept as the benchmark baseline
+_LEGACY_SCHEMA = '''
+CREATE TABLE reddit_searches (
+    id TEXT PRIMARY KEY,
+    keyword TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    subreddit JSON NOT NULL
+);
+CREATE TABLE subreddit_posts (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL,
+    subreddit_search_id TEXT NOT NULL,
+    subreddit TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    score INTEGER,
+    created_utc REAL,
+    author TEXT,
+    num_comments INTEGER,
+    permalink TEXT,
+    selftext TEXT,
+    comments TEXT,
+    FOREIGN KEY (subreddit_search_id) REFERENCES reddit_searches(id),
+    UNIQUE(post_id, subreddit_search_id)
+);
+'''
+
+def _legacy_record_posts(conn: sqlite3.Connection, subreddit_search_id: str, posts: List[Dict[str, Any]]) -> None:
+    """The original row-by-row insert loop, kept as the benchmark baseline."""
+    cursor = conn.cursor()
+    for post in posts:
+        try:
+            cursor.execute('''
+            INSERT INTO subreddit_posts (
+                id, post_id, subreddit_search_id, subreddit, title, url,
+                score, created_utc, author, num_comments,
+                permalink, selftext, comments
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                str(uuid.uuid4()), post['id'], subreddit_search_id, post['subreddit'],
+                post['title'], post['url'], post['score'], post['created_utc'], post['author'],
+                post['num_comments'], post['permalink'], post['selftext'], json.dumps(post['comments'])
+            ))
+        except sqlite3.IntegrityError:
+            continue
+    conn.commit()
+
+def bench_db_writes(total: int = 100_000, batch_size: int = 20) -> Dict[str, float]:
+    """
+    Ingest synthetic posts with the original row-by-row path and with RedditDB.record_posts.
+
+    Both paths receive posts in batches of `batch_size`, as the scraper writes them.
+    RedditDB is timed with the default storage settings and again with every
+    optional index maintained on write.
+
+    Args:
+        total: Number of synthetic posts
+        batch_size: Posts per record_posts call
+
+    Returns:
+        Dict[str, float]: Ingest times and throughput
+    """
+    posts = synthetic_posts(total)
+    batches = [posts[i:i + batch_size] for i in range(0, total, batch_size)]
+    results: Dict[str, float] = {'posts': total}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Baseline: default rollback journal and one INSERT per post
+        conn = sqlite3.connect(os.path.join(tmp, "legacy.db"))
+        conn.executescript(_LEGACY_SCHEMA)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("PRAGMA synchronous = FULL")
+        search_id = str(uuid.uuid4())
+        conn.execute("INSERT INTO reddit_searches VALUES (?, 'bench', '2024-01-01', '{}')", (search_id,))
+        conn.commit()
+        start = time.perf_counter()
+        for batch in batches:
+            _legacy_record_posts(conn, search_id, batch)
+        results['legacy_s'] = time.perf_counter() - start
+        conn.close()
+
+        variants = {
+            'batched': {"full_text_on_write": False, "minhash_index": False, "metrics": True},
+            'all_indexes': {"full_text_on_write": True, "minhash_index": True, "metrics": True},
+        }
+        for name, storage in variants.items():
+            db = RedditDB(os.path.join(tmp, f"{name}.db"), storage=storage)
+            search_id = db.record_search("bench", [{}])[0]
+            start = time.perf_counter()
+            for batch in batches:
+                db.record_posts(search_id, batch)
+            db.flush()
+            results[f'{name}_s'] = time.perf_counter() - start
+            db.close()
+
+    results['legacy_posts_per_s'] = total / results['legacy_s']
+    results['batched_posts_per_s'] = total / results['batched_s']
+    results['speedup'] = results['legacy_s'] / results['batched_s']
+    results['all_indexes_speedup'] = results['legacy_s'] / results['all_indexes_s']
+    return results
+
+def bench_search(total: int = 100_000, batch_size: int = 500) -> Dict[str, float]:
+    """
+    Index synthetic posts and time full-text queries against them.
+
+    Args:
+        total: Number of synthetic posts (each with its comments)
+        batch_size: Posts per record_posts call
+
+    Returns:
+        Dict[str, float]: Indexed row counts, ingest time and query latencies in milliseconds
+    """
+    rng = random.Random(1)
+    words = ["figma", "plugin", "design", "system", "token", "prototype", "layout", "color", "grid", "motion"]
+    posts = synthetic_posts(total)
+    for index, post in enumerate(posts):
+        # Give every post distinct ids and a few searchable words
+        post['title'] += " " + " ".join(rng.sample(words, 3))
+        post['comments'] = [dict(comment, id=f"{post['id']}_{comment['id']}") for comment in post['comments'][:1]]
+
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = RedditDB(os.path.join(tmp, "search.db"))
+        search_id = db.record_search("bench", [{}])[0]
+        start = time.perf_counter()
+        for i in range(0, total, batch_size):
+            db.record_posts(search_id, posts[i:i + batch_size])
+        db.update_search_index()
+        results['ingest_s'] = time.perf_counter() - start
+        results['indexed_posts'] = db.conn.execute("SELECT COUNT(*) FROM posts_fts").fetchone()[0]
+
+        queries = {
+            'single_term': ("figma", False),
+            'two_terms': ("figma prototype", False),
+            'phrase_or': ('"design system" OR motion', True),
+        }
+        for name, (query, raw) in queries.items():
+            results[f'{name}_ms'] = _timed(lambda: db.search_corpus(query, limit=20, raw=raw)) * 1000
+        results['deep_page_ms'] = _timed(lambda: db.search_corpus("figma", limit=20, page=50)) * 1000
+        results['subreddit_filter_ms'] = _timed(lambda: db.search_corpus("figma", subreddit="sub3")) * 1000
+        db.close()
+    return results
+
+def bench_trending(total: int = 300_000, scrapes: int = 6, seed: int = 0) -> Dict[str, float]:
+    """
+    Time the score/comment time series and velocity ranking over many posts.
+
+    Args:
+        total: Number of posts
+        scrapes: Snapshots recorded per post
+        seed: Random seed
+
+    Returns:
+        Dict[str, float]: Append, load, compute and end-to-end ranking times
+    """
+    rng = random.Random(seed)
+    base = 1_700_000_000
+    scores = [rng.randrange(0, 100) for _ in range(total)]
+    comments = [rng.randrange(0, 20) for _ in range(total)]
+    rates = [rng.expovariate(1 / 50) for _ in range(total)]
+
+    results: Dict[str, float] = {'posts': total, 'points': total * scrapes}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = RedditDB(os.path.join(tmp, "trending.db"))
+        start = time.perf_counter()
+        for scrape in range(scrapes):
+            ts = base + scrape * 3600
+            points = []
+            for index in range(total):
+                scores[index] += int(rates[index] * rng.uniform(0.5, 1.5))
+                comments[index] += rng.randrange(0, 3)
+                points.append((f"t{index:x}", ts, scores[index], comments[index], base - 3600.0))
+            # The scraper appends points as part of record_posts; call the writer step directly
+            db._writer.call(db._append_metrics, points)
+        results['append_s'] = time.perf_counter() - start
+        results['db_bytes'] = os.path.getsize(db.db_path) + os.path.getsize(db.db_path + "-wal")
+
+        start = time.perf_counter()
+        arrays = tails_to_arrays(db.get_metric_tails())
+        results['load_s'] = time.perf_counter() - start
+        results['compute_s'] = _timed(lambda: compute_trends(arrays))
+        results['rank_all_s'] = _timed(lambda: rank_posts(db), repeat=1)
+        sample = [f"t{index:x}" for index in rng.sample(range(total), 1000)]
+        results['rank_1000_s'] = _timed(lambda: rank_posts(db, sample))
+        db.close()
+    return results
+
+def bench_prefilter(total: int = 5_000, seed: int = 0) -> Dict[str, float]:
+    """Score synthetic subreddit descriptions against a profile with the TF-IDF prefilter."""
+    rng = random.Random(seed)
+    vocabulary = ("design figma prototype ux research cooking football travel gardening crypto "
+                  "stocks gaming anime music fitness cars movies books photography pets").split()
+    subreddits = [
+        {
+            'name': f"{rng.choice(vocabulary).title()}{rng.choice(vocabulary).title()}{index}",
+            'description': " ".join(rng.choice(vocabulary) for _ in range(rng.randrange(5, 30)))
+        }
+        for index in range(total)
+    ]
+    profile = "Aspiring UX designer. I want to learn about AI use in Figma design and prototyping."
+
+    kept, _ = prefilter_subreddits(profile, subreddits, threshold=0.05, top_k=100)
+    return {
+        'subreddits': total,
+        'kept': len(kept),
+        'score_s': _timed(lambda: prefilter_subreddits(profile, subreddits, threshold=0.05, top_k=100))
+    }
+
+def _print_results(name: str, results: Dict[str, float]) -> None:
+    print(f"=== {name} ===")
+    for key, value in results.items():
+        print(f"{key:32} {value:,.4f}" if isinstance(value, float) else f"{key:32} {value:,}")
+
+BENCHMARKS = {
+    'comment_tree': lambda args: bench_comment_tree(args.comments),
+    'db_writes': lambda args: bench_db_writes(args.posts),
+    'search': lambda args: bench_search(args.posts),
+    'trending': lambda args: bench_trending(args.posts),
+    'prefilter': lambda args: bench_prefilter(args.subreddits),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pipeline micro-benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS) + ["all"])
+    parser.add_argument("--comments", type=int, default=200_000, help="Synthetic comments for comment_tree")
+    parser.add_argument("--posts", type=int, default=100_000, help="Synthetic posts for db_writes, search and trending")
+    parser.add_argument("--subreddits", type=int, default=5_000, help="Synthetic subreddits for prefilter")
+    args = parser.parse_args()
+
+    names = sorted(BENCHMARKS) if args.benchmark == "all" else [args.benchmark]
+    for name in names:
+        _print_results(name, BENCHMARKS[name](args))
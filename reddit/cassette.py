@@ -0,0 +1,281 @@
+"""
+Record/replay transport for Reddit (PRAW) and OpenAI calls
+
+In record mode every Reddit HTTP response and every OpenAI structured completion
+made during a real run is written to a local cassette store. In replay mode the
+same responses are served back from the store, optionally with artificial
+latency, so the pipeline can run and be benchmarked without network access.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from .rate_limit import ScheduledSession, get_scheduler
+from .utils import completion_key, load_config, recorded_completion, replayed_completion
+
+MODES = ("off", "record", "replay")
+
+# Request fields that carry credentials and must never reach the store or the key
+_SECRET_FIELDS = {"password", "client_secret", "otp"}
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class CassetteStore:
+    """
+    An append-only JSONL store of recorded responses.
+
+    Responses are grouped by request key. Repeated identical requests are
+    replayed in the order they were recorded; once a key is exhausted its last
+    response is served again.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Any]] = {}
+        self._replayed: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry["response"])
+
+    def record(self, key: str, response: Any) -> None:
+        """Append a response for a request key."""
+        with self._lock:
+            self._entries.setdefault(key, []).append(response)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "response": response}, ensure_ascii=False) + "\n")
+
+    def replay(self, key: str) -> Any:
+        """Get the next recorded response for a request key."""
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                raise CassetteMissError(key)
+            index = self._replayed.get(key, 0)
+            self._replayed[key] = index + 1
+            return responses[min(index, len(responses) - 1)]
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self._entries.values())
+
+
+def _reddit_request_key(method: str, url: str, params: Any = None, data: Any = None) -> str:
+    """Hash the parts of a Reddit request that identify its response."""
+    def clean(fields):
+        if not fields:
+            return []
+        items = fields.items() if isinstance(fields, dict) else fields
+        return sorted((str(k), str(v)) for k, v in items if k not in _SECRET_FIELDS)
+
+    parts = urlsplit(url)
+    payload = json.dumps([method.upper(), parts.netloc + parts.path, parts.query, clean(params), clean(data)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CassetteSession(ScheduledSession):
+    """
+    A PRAW-compatible session that records or replays Reddit HTTP responses.
+
+    Recording goes through the shared request scheduler like a normal run.
+    Replaying never touches the network.
+    """
+    def __init__(self, store: CassetteStore, mode: str, latency: float = 0.0):
+        super().__init__(get_scheduler())
+        self.store = store
+        self.mode = mode
+        self.latency = latency
+
+    def request(self, method, url, *args, params=None, data=None, **kwargs):
+        key = _reddit_request_key(method, url, params, data)
+
+        if self.mode == "replay":
+            if self.latency:
+                time.sleep(self.latency)
+            recorded = self.store.replay(key)
+            response = requests.Response()
+            response.status_code = recorded["status_code"]
+            response.headers = CaseInsensitiveDict(recorded["headers"])
+            response._content = recorded["body"].encode("utf-8")
+            response.encoding = "utf-8"
+            response.url = url
+            response.request = requests.Request(method, url).prepare()
+            return response
+
+        response = super().request(method, url, *args, params=params, data=data, **kwargs)
+        body = response.text
+        if urlsplit(url).path.endswith("/access_token"):
+            # Never persist real tokens; a placeholder is enough to replay the login
+            token = response.json()
+            if "access_token" in token:
+                token["access_token"] = "cassette"
+            body = json.dumps(token)
+        self.store.record(key, {
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "body": body
+        })
+        return response
+
+
+class _ParseEndpoint:
+    """Stand-in for `client.beta.chat.completions` that records or replays `parse` calls."""
+    def __init__(self, owner: "CassetteOpenAI", completions: Any):
+        self._owner = owner
+        self._completions = completions
+
+    def parse(self, *, model: str, messages: List[Dict[str, Any]], response_format: Any, **kwargs):
+        owner = self._owner
+        key = completion_key(model, messages, response_format)
+
+        if owner.mode == "replay":
+            if owner.latency:
+                time.sleep(owner.latency)
+            recorded = owner.store.replay(key)
+            return replayed_completion(response_format, recorded)
+
+        response = self._completions.parse(model=model, messages=messages, response_format=response_format, **kwargs)
+        owner.store.record(key, recorded_completion(model, response))
+        return response
+
+
+class _AsyncParseEndpoint(_ParseEndpoint):
+    """Async stand-in for `client.beta.chat.completions`, sharing the same store and keys."""
+    async def parse(self, *, model: str, messages: List[Dict[str, Any]], response_format: Any, **kwargs):
+        owner = self._owner
+        key = completion_key(model, messages, response_format)
+
+        if owner.mode == "replay":
+            if owner.latency:
+                await asyncio.sleep(owner.latency)
+            recorded = owner.store.replay(key)
+            return replayed_completion(response_format, recorded)
+
+        response = await self._completions.parse(model=model, messages=messages, response_format=response_format, **kwargs)
+        owner.store.record(key, recorded_completion(model, response))
+        return response
+
+
+class CassetteOpenAI:
+    """
+    An OpenAI client wrapper exposing `beta.chat.completions.parse` and
+    `chat.completions.parse`, recording or replaying structured completions.
+    """
+    _endpoint = _ParseEndpoint
+
+    def __init__(self, store: CassetteStore, mode: str, latency: float = 0.0, client: Any = None):
+        self.store = store
+        self.mode = mode
+        self.latency = latency
+        if client is None and mode == "record":
+            client = self._create_client()
+        self._client = client
+        completions = client.chat.completions if client is not None else None
+        self.chat = SimpleNamespace(completions=self._endpoint(self, completions))
+        self.beta = SimpleNamespace(chat=self.chat)
+
+    def _create_client(self) -> Any:
+        from openai import OpenAI
+        return OpenAI()
+
+
+class CassetteAsyncOpenAI(CassetteOpenAI):
+    """
+    The AsyncOpenAI counterpart of CassetteOpenAI: `parse` is awaitable and
+    records to or replays from the same store.
+    """
+    _endpoint = _AsyncParseEndpoint
+
+    def _create_client(self) -> Any:
+        from openai import AsyncOpenAI
+        return AsyncOpenAI()
+
+    async def close(self) -> None:
+        """Close the wrapped client, if any."""
+        if self._client is not None:
+            await self._client.close()
+
+
+_stores: Dict[str, CassetteStore] = {}
+_stores_lock = threading.Lock()
+
+def get_cassette_settings() -> Dict[str, Any]:
+    """
+    Get the cassette settings from the `cassette` config block.
+
+    Returns:
+        Dict[str, Any]: mode, path and latency in seconds
+    """
+    settings = load_config().get("cassette", {})
+    mode = settings.get("mode", "off")
+    if mode not in MODES:
+        raise ValueError(f"Unknown cassette mode '{mode}', expected one of {', '.join(MODES)}")
+    return {
+        "mode": mode,
+        "path": settings.get("path", "cassettes"),
+        "latency": settings.get("latency_ms", 0) / 1000.0
+    }
+
+def get_store(path: str) -> CassetteStore:
+    """Get the shared store for a cassette file, loading it once per process."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = CassetteStore(path)
+        return _stores[path]
+
+def get_reddit_session() -> Optional[CassetteSession]:
+    """
+    Get a cassette session for PRAW if record or replay mode is configured.
+
+    Returns:
+        Optional[CassetteSession]: Session to pass to PRAW, or None when cassettes are off
+    """
+    settings = get_cassette_settings()
+    if settings["mode"] == "off":
+        return None
+    store = get_store(os.path.join(settings["path"], "reddit.jsonl"))
+    return CassetteSession(store, settings["mode"], settings["latency"])
+
+def get_openai_cassette(client: Any = None) -> Optional[CassetteOpenAI]:
+    """
+    Get a cassette OpenAI client if record or replay mode is configured.
+
+    Args:
+        client: Real OpenAI client to record through (created when needed)
+
+    Returns:
+        Optional[CassetteOpenAI]: Wrapped client, or None when cassettes are off
+    """
+    settings = get_cassette_settings()
+    if settings["mode"] == "off":
+        return None
+    store = get_store(os.path.join(settings["path"], "openai.jsonl"))
+    return CassetteOpenAI(store, settings["mode"], settings["latency"], client)
+
+def get_async_openai_cassette(client: Any = None) -> Optional[CassetteAsyncOpenAI]:
+    """
+    Get an async cassette OpenAI client if record or replay mode is configured.
+
+    Args:
+        client: Real AsyncOpenAI client to record through (created when needed)
+
+    Returns:
+        Optional[CassetteAsyncOpenAI]: Wrapped client, or None when cassettes are off
+    """
+    settings = get_cassette_settings()
+    if settings["mode"] == "off":
+        return None
+    store = get_store(os.path.join(settings["path"], "openai.jsonl"))
+    return CassetteAsyncOpenAI(store, settings["mode"], settings["latency"], client)
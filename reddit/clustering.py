@@ -0,0 +1,181 @@
+"""
+Group posts into clusters of similar discussions before topic recommendation
+"""
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from .text_vectors import HashedTfidf
+from .utils import Post
+
+# Characters of each post's formatted comments included in its vector
+COMMENT_CHARS = 2000
+
+
+def _row_ids(indptr: np.ndarray) -> np.ndarray:
+    """Row of every stored value of a CSR-style matrix."""
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def similarities(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Dot products between sparse rows and dense centroids.
+
+    Args:
+        indptr, indices, data: CSR-style rows from `HashedTfidf.fit_transform`
+        centroids: Dense matrix with one centroid per row
+
+    Returns:
+        np.ndarray: Matrix of shape (rows, centroids)
+    """
+    n_rows = len(indptr) - 1
+    rows = _row_ids(indptr)
+    contributions = data[:, None] * centroids[:, indices].T
+    return np.stack([np.bincount(rows, weights=contributions[:, k], minlength=n_rows)
+                     for k in range(len(centroids))], axis=1)
+
+
+def spherical_kmeans(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_features: int,
+                     n_clusters: int, iterations: int = 25, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster L2-normalised sparse rows by cosine similarity (k-means on the unit sphere).
+
+    Centroids are seeded with k-means++ and re-normalised after every update;
+    an empty cluster is re-seeded with the row farthest from its centroid.
+
+    Args:
+        indptr, indices, data: CSR-style rows from `HashedTfidf.fit_transform`
+        n_features: Number of columns
+        n_clusters: Number of clusters (at most the number of rows)
+        iterations: Maximum number of assignment/update rounds
+        seed: Random seed for the k-means++ initialisation
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Cluster label per row and the dense centroids
+    """
+    n_rows = len(indptr) - 1
+    n_clusters = max(1, min(n_clusters, n_rows))
+    rng = np.random.default_rng(seed)
+    rows = _row_ids(indptr)
+
+    def dense(row: int) -> np.ndarray:
+        vector = np.zeros(n_features)
+        vector[indices[indptr[row]:indptr[row + 1]]] = data[indptr[row]:indptr[row + 1]]
+        return vector
+
+    centroids = np.zeros((n_clusters, n_features))
+    centroids[0] = dense(int(rng.integers(n_rows)))
+    closest = similarities(indptr, indices, data, centroids[:1])[:, 0]
+    for k in range(1, n_clusters):
+        distance = np.clip(1.0 - closest, 0.0, None) ** 2
+        total = distance.sum()
+        row = int(rng.choice(n_rows, p=distance / total)) if total > 0 else int(rng.integers(n_rows))
+        centroids[k] = dense(row)
+        closest = np.maximum(closest, similarities(indptr, indices, data, centroids[k:k + 1])[:, 0])
+
+    labels = np.full(n_rows, -1)
+    for _ in range(iterations):
+        scores = similarities(indptr, indices, data, centroids)
+        new_labels = scores.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        sums = np.bincount(labels[rows] * n_features + indices, weights=data,
+                           minlength=n_clusters * n_features).reshape(n_clusters, n_features)
+        for k in np.flatnonzero(np.bincount(labels, minlength=n_clusters) == 0):
+            farthest = int(scores[np.arange(n_rows), labels].argmin())
+            sums[k] = dense(farthest)
+            scores[farthest] = np.inf  # Never pick the same row for two empty clusters
+            labels[farthest] = k
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms > 0, norms, 1.0)
+    return labels, centroids
+
+
+def cluster_posts(posts: List[Post], n_clusters: int = 8, representatives: int = 2,
+                  duplicate_threshold: float = 0.8, n_features: int = 2 ** 16,
+                  seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Group posts by TF-IDF similarity and pick representative posts per group.
+
+    Near-identical posts (crossposts, reposts) inside a cluster are collapsed
+    into the first of them in the input order, which is the hottest when the
+    posts were ranked by trend.
+
+    Args:
+        posts: Posts to cluster, in priority order
+        n_clusters: Number of clusters (at most the number of posts)
+        representatives: Representative posts kept per cluster
+        duplicate_threshold: Cosine similarity at or above which two posts count as the same discussion
+        n_features: Number of hash buckets of the vectors
+        seed: Random seed of the clustering
+
+    Returns:
+        List[Dict[str, Any]]: Clusters, largest first, each with `posts`,
+        `representatives`, `duplicates` (number of collapsed posts), `terms`
+        (top words), `subreddits` (Counter) and `score` (total score)
+    """
+    if not posts:
+        return []
+    vectorizer = HashedTfidf(n_features)
+    indptr, indices, data = vectorizer.fit_transform(
+        [f"{post.content}\n{(post.comments or '')[:COMMENT_CHARS]}" for post in posts]
+    )
+    labels, centroids = spherical_kmeans(indptr, indices, data, n_features, n_clusters, seed=seed)
+    centroid_scores = similarities(indptr, indices, data, centroids)
+    words = vectorizer.bucket_words()
+
+    clusters = []
+    for k in range(len(centroids)):
+        members = np.flatnonzero(labels == k)
+        if not len(members):
+            continue
+
+        # Dense vectors of the members over the columns they use, for pairwise similarity
+        spans = [np.arange(indptr[row], indptr[row + 1]) for row in members]
+        columns, local = np.unique(np.concatenate([indices[span] for span in spans]), return_inverse=True)
+        vectors = np.zeros((len(members), len(columns)))
+        offsets = np.cumsum([0] + [len(span) for span in spans])
+        for position, span in enumerate(spans):
+            vectors[position, local[offsets[position]:offsets[position + 1]]] = data[span]
+        pairwise = vectors @ vectors.T
+
+        kept: List[int] = []
+        for position in range(len(members)):
+            if not kept or pairwise[position, kept].max() < duplicate_threshold:
+                kept.append(position)
+
+        ranked = sorted(kept, key=lambda position: -centroid_scores[members[position], k])
+        top_columns = np.argsort(-centroids[k])[:20]
+        clusters.append({
+            'posts': [posts[row] for row in members],
+            'representatives': [posts[members[position]] for position in ranked[:representatives]],
+            'duplicates': len(members) - len(kept),
+            'terms': [words[column] for column in top_columns if centroids[k, column] > 0 and column in words][:8],
+            'subreddits': Counter(posts[row].subreddit for row in members),
+            'score': int(sum(posts[row].score or 0 for row in members))
+        })
+    clusters.sort(key=lambda cluster: (-len(cluster['posts']), -cluster['score']))
+    return clusters
+
+
+def format_clusters(clusters: List[Dict[str, Any]]) -> str:
+    """
+    Format clusters as a prompt: a summary line per cluster followed by its representative posts.
+
+    Args:
+        clusters: Output of `cluster_posts`
+
+    Returns:
+        str: Prompt text
+    """
+    sections = []
+    for number, cluster in enumerate(clusters, 1):
+        subreddits = ", ".join(f"r/{name} ({count})" for name, count in cluster['subreddits'].most_common())
+        header = (f"Cluster {number}: {len(cluster['posts'])} posts"
+                  + (f" ({cluster['duplicates']} near-duplicates)" if cluster['duplicates'] else "")
+                  + f" | {subreddits} | total score {cluster['score']}\n"
+                  + f"Key terms: {', '.join(cluster['terms'])}\n"
+                  + "Representative posts:\n")
+        sections.append(header + "\n---\n".join(post.stringify() for post in cluster['representatives']))
+    return "\n===\n".join(sections)
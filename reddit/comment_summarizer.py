@@ -2,12 +2,15 @@
 Module for summarizing comments from Reddit posts grouped by themes
 """
 import os
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 import praw
 import json
 from pydantic import BaseModel, Field
-from openai import OpenAI
+from .batch import BatchRequest, get_batch_settings, run_batch
+from .llm import get_async_settings, get_openai_client, run_concurrently
 from .auth import get_reddit_instance
+from .comment_tree import as_dicts
+from .db import RedditDB
 from .utils import load_config
 
 
@@ -20,12 +23,34 @@ class CommentSummarizer:
     
     This class processes comments from posts within themes and generates concise summaries
     focusing on technical details and key points for an engineer audience.
+    
+    Comments are taken from the scrape results passed in or from the scraper's
+    database first; Reddit is only queried for posts missing from both or whose
+    stored copy is older than `max_age_hours`.
     """
     def __init__(self, 
                  summaries_path: str = None,
-                 output_path: str = None):
+                 output_path: str = None,
+                 client=None,
+                 async_client=None,
+                 reddit: Optional[praw.Reddit] = None,
+                 db_path: Optional[str] = None,
+                 scraped_results: Optional[Dict[str, List[Dict[str, Any]]]] = None):
         config = load_config()
-        self.client = OpenAI()
+        self.client = client or get_openai_client()
+        self.async_client = async_client  # Created per run in async mode when None
+        self.async_settings = get_async_settings()
+        self.batch_settings = get_batch_settings()
+        self.reddit = reddit
+        self.db_path = db_path or config["paths"].get("database", "reddit_data.db")
+        self.db: Optional[RedditDB] = None  # Opened on the first lookup, closed by summarize_comments
+        self.scraped_posts = {
+            post['id']: post
+            for posts in (scraped_results or {}).values()
+            for post in posts
+        }
+        self.max_age_hours = config["summarizer"]["comment"].get("max_age_hours", 24)
+        self.source_stats = {'memory': 0, 'db': 0, 'network': 0}
         self.summaries_path = summaries_path or config["paths"]["theme_summaries"]
         self.output_path = output_path or config["paths"]["comment_summaries"]
         self.model = config["summarizer"]["comment"]["model"]
@@ -35,19 +60,69 @@ class CommentSummarizer:
         with open(prompt_path, 'r') as f:
             self.system_message = f.read()
 
-    def get_comments_for_post(self, reddit: praw.Reddit, post_id: str, max_comments: int = None) -> List[str]:
+    def format_stored_comments(self, comments: List[Dict[str, Any]], max_comments: int = None) -> List[str]:
+        """
+        Format an already scraped comment tree the same way as fetched comments.
+        
+        Args:
+            comments: Comment dictionaries as produced by RedditScraper
+            max_comments: Maximum number of top-level comments to use (defaults to config value)
+            
+        Returns:
+            List of formatted comment strings including replies
+        """
+        formatted = []
+        for comment in as_dicts(comments)[:max_comments or self.max_comments]:
+            formatted.append(f"[Score: {comment['score']}] {comment['body']}")
+            for reply in comment.get('replies', [])[:self.max_replies]:
+                formatted.append(f"  ↳ [Score: {reply['score']}] {reply['body']}")
+        return formatted
+
+    def get_stored_comments(self, post_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up a post's comment tree in the scrape results, then in the database.
+        
+        Args:
+            post_id: ID of the Reddit post
+            
+        Returns:
+            The stored comment tree, or None if the post must be fetched from Reddit
+        """
+        if post_id in self.scraped_posts:
+            self.source_stats['memory'] += 1
+            return self.scraped_posts[post_id].get('comments', [])
+        
+        if self.db_path:
+            if self.db is None:
+                self.db = RedditDB(self.db_path)
+            stored = self.db.get_latest_post(post_id, self.max_age_hours)
+            if stored is not None:
+                self.source_stats['db'] += 1
+                return stored['comments']
+        
+        return None
+
+    def get_comments_for_post(self, reddit: Optional[praw.Reddit], post_id: str, max_comments: int = None) -> List[str]:
         """
         Get comments and their replies for a specific post.
         
         Args:
-            reddit: Authenticated Reddit instance
+            reddit: Authenticated Reddit instance, or None to authenticate only if the post has to be fetched
             post_id: ID of the Reddit post
             max_comments: Maximum number of top-level comments to fetch (defaults to config value)
             
         Returns:
             List of formatted comment strings including replies
         """
+        stored = self.get_stored_comments(post_id)
+        if stored is not None:
+            return self.format_stored_comments(stored, max_comments)
+        
         try:
+            reddit = reddit or self.get_reddit()
+            if not reddit:
+                raise Exception("Failed to authenticate with Reddit")
+            self.source_stats['network'] += 1
             submission = reddit.submission(id=post_id)
             submission.comments.replace_more(limit=0)  # Remove MoreComments objects
             
@@ -69,12 +144,23 @@ class CommentSummarizer:
             print(f"Error fetching comments for post {post_id}: {str(e)}")
             return []
 
-    def get_theme_comments(self, reddit: praw.Reddit, theme: Dict[str, any]) -> Dict[str, List[str]]:
+    def get_reddit(self) -> Optional[praw.Reddit]:
+        """
+        Get the Reddit instance, authenticating on first use.
+        
+        Returns:
+            Authenticated Reddit instance, or None if authentication fails
+        """
+        if self.reddit is None:
+            self.reddit = get_reddit_instance()
+        return self.reddit
+
+    def get_theme_comments(self, reddit: Optional[praw.Reddit], theme: Dict[str, any]) -> Dict[str, List[str]]:
         """
         Get comments for all posts in a theme.
         
         Args:
-            reddit: Authenticated Reddit instance
+            reddit: Authenticated Reddit instance, or None to authenticate only when needed
             theme: Theme dictionary containing theme name and post IDs
             
         Returns:
@@ -92,14 +178,8 @@ class CommentSummarizer:
         Main function to summarize comments for all themes and their posts.
         
         Returns:
-            Dictionary mapping themes to their posts' comments and summaries, or None if authentication fails
+            Dictionary mapping themes to their posts' comments and summaries, or None if the themes cannot be loaded
         """
-        # Get authenticated Reddit instance
-        reddit = get_reddit_instance()
-        if not reddit:
-            print("Failed to authenticate with Reddit")
-            return None
-            
         # Load themes from theme summaries
         try:
             with open(self.summaries_path, "r") as f:
@@ -114,7 +194,7 @@ class CommentSummarizer:
             theme_name = theme["theme"]
             print(f"Processing theme: {theme_name}")
             
-            theme_comments = self.get_theme_comments(reddit, theme)
+            theme_comments = self.get_theme_comments(self.reddit, theme)
             if theme_comments:
                 theme_summaries[theme_name] = {
                     "post_url": theme["post_url"],
@@ -122,45 +202,136 @@ class CommentSummarizer:
                     "comments": theme_comments
                 }
         
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        
+        print(f"Comment sources: {self.source_stats['memory']} from scrape results, "
+              f"{self.source_stats['db']} from database, {self.source_stats['network']} fetched from Reddit")
+        
         # Generate summaries for each theme
-        final_summaries = []
-        for theme_name, data in theme_summaries.items():
-            concat_comments = data["post_summary"] + "\n\nComments:\n"
-            for post_id, comments in data["comments"].items():
-                for comment in comments:
-                    concat_comments += comment + "\n"            
+        if self.batch_settings["enabled"]:
+            final_summaries = self.generate_summaries_batch(theme_summaries)
+        elif self.async_settings["enabled"]:
+            final_summaries = self.generate_summaries_async(theme_summaries)
+        else:
+            final_summaries = []
+            for theme_name, data in theme_summaries.items():
+                try:
+                    response = self.client.beta.chat.completions.parse(
+                        model=self.model,
+                        messages=self.build_messages(data),
+                        response_format=CommentSummary,
+                    )
+                    final_summaries.append(self.build_summary(theme_name, data, response))
+                except Exception as e:
+                    print(f"Error generating summary for theme {theme_name}: {str(e)}")
+                    continue
+        
+        # Save summaries; a failed write is raised so callers do not mistake it for success
+        with open(self.output_path, "w") as f:
+            json.dump(final_summaries, indent=2, ensure_ascii=False, fp=f)
+        
+        return final_summaries
+
+    def generate_summaries_async(self, theme_summaries: Dict[str, Dict]) -> List[Dict[str, Any]]:
+        """
+        Generate the comment summaries of all themes concurrently with the async OpenAI client.
+        
+        At most `summarizer.async.max_concurrency` requests are in flight. Themes
+        whose request fails are reported and skipped; the rest keep theme order.
+        
+        Args:
+            theme_summaries: Post summary, URL and comments by theme name
             
-            try:
-                response = self.client.beta.chat.completions.parse(
+        Returns:
+            List of final summaries in theme order
+        """
+        def request(data: Dict[str, Any]):
+            async def call(client):
+                return await client.beta.chat.completions.parse(
                     model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.system_message},
-                        {"role": "user", "content": concat_comments},
-                    ],
+                    messages=self.build_messages(data),
                     response_format=CommentSummary,
                 )
-                response = response.choices[0].message.parsed.model_dump()
-                
-                final_summary = {
-                    "theme": theme_name,
-                    "post_url": data["post_url"],
-                    "post_summary": data["post_summary"],
-                    "comment_summary": response["comment_summary"]
-                }
-                final_summaries.append(final_summary)
-            except Exception as e:
-                print(f"Error generating summary for theme {theme_name}: {str(e)}")
-                continue
+            return call
         
-        # Save summaries
-        try:
-            with open(self.output_path, "w") as f:
-                json.dump(final_summaries, indent=2, ensure_ascii=False, fp=f)
-        except Exception as e:
-            print(f"Error saving summaries to {self.output_path}: {str(e)}")
+        outcomes = run_concurrently(
+            [request(data) for data in theme_summaries.values()],
+            self.async_settings["max_concurrency"],
+            self.async_client
+        )
+        return self.collect_summaries(theme_summaries, outcomes)
+
+    def generate_summaries_batch(self, theme_summaries: Dict[str, Dict]) -> List[Dict[str, Any]]:
+        """
+        Generate the comment summaries of all themes as one Batch API job (see batch.py).
+        
+        Blocks until the batch finishes; an interrupted run resumes the same
+        batch. Themes whose request fails are reported and skipped.
+        
+        Args:
+            theme_summaries: Post summary, URL and comments by theme name
+            
+        Returns:
+            List of final summaries in theme order
+        """
+        outcomes = run_batch("comment_summaries", [
+            BatchRequest(self.model, self.build_messages(data), CommentSummary)
+            for data in theme_summaries.values()
+        ])
+        return self.collect_summaries(theme_summaries, outcomes)
+
+    def collect_summaries(self, theme_summaries: Dict[str, Dict], outcomes: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Turn per-theme completions (or the exceptions raised instead) into final summaries.
         
+        Args:
+            theme_summaries: Post summary, URL and comments by theme name
+            outcomes: Completion or exception per theme, in theme order
+            
+        Returns:
+            List of final summaries in theme order, without the failed themes
+        """
+        final_summaries = []
+        for (theme_name, data), outcome in zip(theme_summaries.items(), outcomes):
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                final_summaries.append(self.build_summary(theme_name, data, outcome))
+            except Exception as e:
+                print(f"Error generating summary for theme {theme_name}: {str(e)}")
         return final_summaries
 
+    def build_messages(self, data: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Build the chat messages asking for a theme's comment summary.
+        
+        Args:
+            data: Post summary and comments by post ID of one theme
+            
+        Returns:
+            System and user messages for the completion request
+        """
+        concat_comments = data["post_summary"] + "\n\nComments:\n"
+        for post_id, comments in data["comments"].items():
+            for comment in comments:
+                concat_comments += comment + "\n"
+        return [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": concat_comments},
+        ]
+
+    def build_summary(self, theme_name: str, data: Dict[str, Any], response: Any) -> Dict[str, Any]:
+        """Combine a theme's post summary with the comment summary parsed from its completion."""
+        response = response.choices[0].message.parsed.model_dump()
+        return {
+            "theme": theme_name,
+            "post_url": data["post_url"],
+            "post_summary": data["post_summary"],
+            "comment_summary": response["comment_summary"]
+        }
+
 if __name__ == "__main__":
     summarizer = CommentSummarizer()
     summaries = summarizer.summarize_comments()
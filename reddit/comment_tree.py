@@ -0,0 +1,164 @@
+"""
+Compact, array-backed representation of scraped comment trees
+"""
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+
+class CommentForest:
+    """
+    A comment forest stored as parallel columns in pre-order.
+
+    Row i holds one comment; `parents[i]` is the row of its parent (-1 for
+    top-level comments) and `depths[i]` its depth (0 for top-level comments).
+    Because rows are in pre-order, every subtree is a contiguous range of rows,
+    so traversals are plain loops instead of recursion over nested dicts.
+    """
+    __slots__ = ('ids', 'authors', 'bodies', 'scores', 'created', 'parents', 'depths')
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.authors: List[str] = []
+        self.bodies: List[str] = []
+        self.scores = array('q')
+        self.created = array('d')
+        self.parents = array('i')
+        self.depths = array('i')
+
+    def append(self, comment_id: str, author: str, body: str, score: int, created_utc: float,
+               parent: int = -1) -> int:
+        """
+        Append a comment after the last row of its parent's subtree.
+
+        Args:
+            comment_id: Reddit ID of the comment
+            author: Author name
+            body: Comment text
+            score: Comment score
+            created_utc: Creation timestamp
+            parent: Row of the parent comment, or -1 for a top-level comment
+
+        Returns:
+            int: Row of the new comment
+        """
+        self.ids.append(comment_id)
+        self.authors.append(author)
+        self.bodies.append(body)
+        self.scores.append(score or 0)
+        self.created.append(created_utc or 0.0)
+        self.parents.append(parent)
+        self.depths.append(self.depths[parent] + 1 if parent >= 0 else 0)
+        return len(self.ids) - 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def roots(self) -> List[int]:
+        """Rows of the top-level comments, in order."""
+        return [row for row, parent in enumerate(self.parents) if parent < 0]
+
+    def subtree_end(self, row: int) -> int:
+        """Row just past the last descendant of `row`."""
+        depth = self.depths[row]
+        end = row + 1
+        while end < len(self.depths) and self.depths[end] > depth:
+            end += 1
+        return end
+
+    def children(self, row: int) -> List[int]:
+        """Rows of the direct replies to `row`, in order."""
+        depth = self.depths[row] + 1
+        return [child for child in range(row + 1, self.subtree_end(row)) if self.depths[child] == depth]
+
+    def count_replies(self) -> int:
+        """Number of comments that are replies rather than top-level comments."""
+        return sum(1 for parent in self.parents if parent >= 0)
+
+    def walk(self, start: int = 0, end: int = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Iterate over comments in pre-order without building nested dicts.
+
+        Args:
+            start: First row to visit
+            end: Row to stop before (defaults to the end of the forest)
+
+        Yields:
+            Tuple[int, Dict]: Depth and a flat comment dictionary (without replies)
+        """
+        for row in range(start, len(self.ids) if end is None else end):
+            yield self.depths[row], {
+                'id': self.ids[row],
+                'author': self.authors[row],
+                'body': self.bodies[row],
+                'score': self.scores[row],
+                'created_utc': self.created[row]
+            }
+
+    @classmethod
+    def from_dicts(cls, comments: List[Dict[str, Any]]) -> "CommentForest":
+        """
+        Build a forest from the nested dict shape produced by RedditScraper.
+
+        Args:
+            comments: Top-level comment dictionaries with nested `replies`
+
+        Returns:
+            CommentForest: Equivalent compact forest
+        """
+        forest = cls()
+        stack = [(comment, -1) for comment in reversed(comments)]
+        while stack:
+            comment, parent = stack.pop()
+            row = forest.append(comment['id'], comment['author'], comment['body'],
+                                comment['score'], comment['created_utc'], parent)
+            stack.extend((reply, row) for reply in reversed(comment.get('replies', [])))
+        return forest
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        Convert back to the nested dict shape stored in the database and read by the formatter.
+
+        Returns:
+            List[Dict]: Top-level comment dictionaries with nested `replies`
+        """
+        roots = []
+        nodes = []
+        for row in range(len(self.ids)):
+            node = {
+                'id': self.ids[row],
+                'author': self.authors[row],
+                'body': self.bodies[row],
+                'score': self.scores[row],
+                'created_utc': self.created[row],
+                'replies': []
+            }
+            nodes.append(node)
+            parent = self.parents[row]
+            (nodes[parent]['replies'] if parent >= 0 else roots).append(node)
+        return roots
+
+
+Comments = Union[List[Dict[str, Any]], CommentForest]
+
+def walk_comments(comments: Comments) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Iterate over a comment tree in pre-order, whichever shape it is stored in.
+
+    Args:
+        comments: Nested comment dictionaries or a CommentForest
+
+    Yields:
+        Tuple[int, Dict]: Depth and comment dictionary
+    """
+    if isinstance(comments, CommentForest):
+        yield from comments.walk()
+        return
+    stack = [(0, comment) for comment in reversed(comments)]
+    while stack:
+        depth, comment = stack.pop()
+        yield depth, comment
+        stack.extend((depth + 1, reply) for reply in reversed(comment.get('replies', [])))
+
+def as_dicts(comments: Comments) -> List[Dict[str, Any]]:
+    """Return comments in the nested dict shape."""
+    return comments.to_dicts() if isinstance(comments, CommentForest) else comments
@@ -1,5 +1,5 @@
 import json
-from openai import OpenAI
+from .llm import get_openai_client
 from pydantic import BaseModel, Field
 from typing import List
 from .utils import load_config
@@ -16,7 +16,7 @@ class UserProfileResponse(BaseModel):
 
 class UserProfile:
     def __init__(self, who, interest, intent):
-        self.client = OpenAI()
+        self.client = get_openai_client()
         self.who = who
         self.interest = interest
         self.intent = intent
@@ -1,20 +1,319 @@
+import argparse
+import atexit
+import hashlib
+import queue
 import sqlite3
 import json
+import os
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from collections.abc import Sequence
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set, Tuple
+import numpy as np
+from .comment_tree import CommentForest, Comments
+from .dedup import band_buckets, minhash, post_text
+from .utils import load_config
+
+# Bumped whenever existing databases need a data migration (stored in PRAGMA user_version)
+SCHEMA_VERSION = 6
+
+# Content tables whose rows are added to the full-text indexes, tracked in fts_progress
+_FTS_SOURCES = ("post_contents", "comment_bodies", "post_snapshots")
+
+def _doc_rowid(reddit_id: str) -> int:
+    """
+    Map a Reddit ID to a stable full-text index rowid.
+    
+    Reddit IDs are base36 integers, so the mapping is collision free for real
+    IDs; anything else (or too long for a rowid) falls back to a 63-bit hash.
+    """
+    try:
+        rowid = int(reddit_id, 36)
+        if rowid < 2 ** 63:
+            return rowid
+    except ValueError:
+        pass
+    return int.from_bytes(hashlib.sha1(reddit_id.encode("utf-8")).digest()[:8], "big") >> 1
+
+def _fts_query(text: str) -> str:
+    """Quote every term of a free-text query so FTS5 treats it as plain words (AND)."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def get_storage_settings() -> Dict[str, bool]:
+    """
+    Get the optional write-path work from the `storage` config block.
+    
+    Returns:
+        Dict[str, bool]: full_text_on_write (index new text while recording it,
+        instead of before the next search), minhash_index (keep the MinHash
+        near-duplicate index) and metrics (keep the score/comment time series)
+    """
+    settings = load_config().get("storage", {})
+    return {
+        "full_text_on_write": settings.get("full_text_on_write", False),
+        "minhash_index": settings.get("minhash_index", False),
+        "metrics": settings.get("metrics", True)
+    }
+
+class LazyComments(Sequence):
+    """
+    A post's comment list that is only read from the database on first access.
+    
+    Behaves like the list of nested comment dictionaries it stands for.
+    """
+    def __init__(self, db: "RedditDB", snapshot_id: str):
+        self._db = db
+        self._snapshot_id = snapshot_id
+        self._comments: Optional[List[Dict[str, Any]]] = None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load (once) and return the nested comment dictionaries."""
+        if self._comments is None:
+            self._comments = self._db.get_post_comments(self._snapshot_id)
+        return self._comments
+
+    def __getitem__(self, index):
+        return self.load()[index]
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._comments is not None else "not loaded"
+        return f"LazyComments({self._snapshot_id!r}, {state})"
+
+
+class DBWriteError(Exception):
+    """Raised by flush/close when queued writes failed; `errors` holds the original exceptions."""
+    def __init__(self, errors: List[BaseException]):
+        super().__init__(f"{len(errors)} database write(s) failed, first: {errors[0]!r}")
+        self.errors = errors
+
+
+class DBWriter:
+    """
+    A background thread that owns a database's write connection.
+    
+    Writes are queued (the queue is bounded, so producers block instead of
+    piling up memory) and drained in batches. Each batch is one transaction
+    and each write in it runs under its own savepoint, so a failing write is
+    rolled back without losing the rest of the batch.
+    """
+    _STOP = object()
+
+    def __init__(self, conn: sqlite3.Connection, max_queue: int = 256, batch_size: int = 64):
+        """
+        Args:
+            conn: Write connection, opened with check_same_thread=False
+            max_queue: Writes that can wait in the queue before producers block
+            batch_size: Maximum writes committed in one transaction
+        """
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._errors: List[BaseException] = []
+        self._errors_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="RedditDB-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def ident(self) -> int:
+        """Thread identifier of the writer thread."""
+        return self._thread.ident
+
+    def _enqueue(self, func: Callable, args: Tuple, transaction: bool, detached: bool) -> Future:
+        if self._closed:
+            raise RuntimeError("Database writer is closed")
+        future = Future()
+        self._queue.put((func, args, transaction, detached, future))
+        return future
+
+    def call(self, func: Callable, *args, transaction: bool = True) -> Any:
+        """
+        Run `func(*args)` on the writer thread and wait for it to be committed.
+        
+        Args:
+            func: Function using the write connection
+            transaction: Run inside a batch transaction; False runs it on its own
+                (for statements such as VACUUM that cannot run in a transaction)
+            
+        Returns:
+            Any: What `func` returned; its exception is raised here
+        """
+        return self._enqueue(func, args, transaction, False).result()
+
+    def post(self, func: Callable, *args) -> None:
+        """Queue `func(*args)` without waiting; failures are raised by the next flush."""
+        self._enqueue(func, args, True, True)
+
+    def flush(self) -> None:
+        """
+        Block until every queued write is committed.
+        
+        Raises:
+            DBWriteError: If writes queued with `post` failed since the last flush
+        """
+        self._queue.join()
+        with self._errors_lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise DBWriteError(errors)
+
+    def close(self) -> None:
+        """Commit the remaining writes and stop the writer thread."""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self) -> None:
+        carry = None
+        while True:
+            item = carry if carry is not None else self._queue.get()
+            carry = None
+            if item is self._STOP:
+                self._queue.task_done()
+                return
+            if not item[2]:
+                self._apply([item], transaction=False)
+                continue
+            
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP or not item[2]:
+                    carry = item
+                    break
+                batch.append(item)
+            self._apply(batch, transaction=True)
+
+    def _apply(self, batch: List[Tuple], transaction: bool) -> None:
+        """Run a batch of writes and resolve their futures once it is committed."""
+        outcomes = []
+        try:
+            if not transaction:
+                func, args, _, _, _ = batch[0]
+                outcomes.append((func(*args), None))
+            else:
+                self.conn.execute("BEGIN")
+                for func, args, _, _, _ in batch:
+                    self.conn.execute("SAVEPOINT write")
+                    try:
+                        result = func(*args)
+                    except Exception as e:
+                        self.conn.execute("ROLLBACK TO write")
+                        outcomes.append((None, e))
+                    else:
+                        outcomes.append((result, None))
+                    self.conn.execute("RELEASE write")
+                self.conn.commit()
+        except Exception as e:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            outcomes = [(None, e)] * len(batch)
+        
+        for (_, _, _, detached, future), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            elif detached:
+                print(f"Error writing to database: {str(error)}")
+                with self._errors_lock:
+                    self._errors.append(error)
+                future.set_exception(error)
+            else:
+                future.set_exception(error)
+            self._queue.task_done()
+
 
 class RedditDB:
-    def __init__(self, db_path: str = "reddit_data.db"):
-        """Initialize database connection and create tables if they don't exist."""
+    """
+    Storage for scraped searches, posts and comments.
+    
+    All writes go through one DBWriter thread that owns the write connection,
+    so any number of threads can record results concurrently. Reads use a
+    read-only connection per calling thread; in WAL mode they never block the
+    writer. Call `flush()` to wait for queued writes and `close()` (or use the
+    database as a context manager) to commit and release everything.
+    """
+    def __init__(self, db_path: str = "reddit_data.db", max_queue: int = 256, batch_size: int = 64,
+                 storage: Optional[Dict[str, bool]] = None):
+        """
+        Initialize database connection and create tables if they don't exist.
+        
+        Args:
+            db_path (str): Path to the SQLite database
+            max_queue (int): Writes that can be queued before producers block
+            batch_size (int): Maximum queued writes committed in one transaction
+            storage (Dict[str, bool], optional): Overrides for `get_storage_settings()`
+        """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.storage = {**get_storage_settings(), **(storage or {})}
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        
+        write_conn = sqlite3.connect(db_path, check_same_thread=False)
         # Enable JSON support
-        self.conn.execute("PRAGMA foreign_keys = ON")
+        write_conn.execute("PRAGMA foreign_keys = ON")
+        self.configure_connection(write_conn)
+        self._write_conn = write_conn
+        self._writer = DBWriter(write_conn, max_queue, batch_size)
         self.create_tables()
+        # Commit queued writes at interpreter exit if the owner never closed us
+        atexit.register(self.close)
+
+    @staticmethod
+    def configure_connection(conn: sqlite3.Connection, read_only: bool = False) -> None:
+        """
+        Apply the journaling and cache pragmas used for every connection.
+        
+        WAL lets readers run alongside the writer, and synchronous=NORMAL is
+        durable in WAL mode while avoiding an fsync on every commit.
+        """
+        if not read_only:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -65536")  # 64 MiB page cache
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        The connection for the calling thread: the write connection on the
+        writer thread, otherwise this thread's read-only connection.
+        """
+        if threading.get_ident() == self._writer.ident:
+            return self._write_conn
+        reader = getattr(self._local, 'conn', None)
+        if reader is None:
+            if self._closed:
+                raise RuntimeError("Database is closed")
+            uri = Path(self.db_path).absolute().as_uri() + "?mode=ro"
+            reader = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.configure_connection(reader, read_only=True)
+            self._local.conn = reader
+            with self._readers_lock:
+                self._readers.append(reader)
+        return reader
 
     def create_tables(self):
-        """Create necessary tables if they don't exist."""
+        """Create necessary tables if they don't exist (runs on the writer thread)."""
+        self._writer.call(self._create_tables, transaction=False)
+
+    def _create_tables(self):
         cursor = self.conn.cursor()
         
         # Create tables with proper schema
@@ -28,31 +327,371 @@ class RedditDB:
         ''')
         
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS subreddit_posts (
-            id TEXT PRIMARY KEY,
+        CREATE INDEX IF NOT EXISTS idx_reddit_searches_created_at
+        ON reddit_searches (created_at)
+        ''')
+        
+        existing = cursor.execute(
+            "SELECT type FROM sqlite_master WHERE name = 'subreddit_posts'"
+        ).fetchone()
+        if existing is None:
+            # New database: nothing to migrate
+            self._create_content_tables(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        elif existing[0] == 'table':
+            # Databases older than version 3 store a full copy of every post
+            # per scrape; make sure the tables the migrations read exist
+            self._create_legacy_comments_table(cursor)
+        
+        # Score/comment-count time series: one row per post per scrape, each
+        # holding the change since the previous row (the first row holds the
+        # absolute values), so the integers stay small in SQLite's varint
+        # encoding. The head table holds the latest absolute values.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_metrics (
+            post_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            ts_delta INTEGER NOT NULL,
+            score_delta INTEGER NOT NULL,
+            comments_delta INTEGER NOT NULL,
+            PRIMARY KEY (post_id, seq)
+        ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_metrics_head (
+            post_id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            num_comments INTEGER NOT NULL,
+            created_utc REAL
+        ) WITHOUT ROWID
+        ''')
+        
+        # MinHash near-duplicate index: one signature per post (of its latest
+        # text) and one LSH bucket row per signature band
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_minhash (
+            post_id TEXT PRIMARY KEY,
+            signature BLOB NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_lsh_buckets (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            post_id TEXT NOT NULL,
+            PRIMARY KEY (band, bucket, post_id)
+        ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_post_lsh_buckets_post_id
+        ON post_lsh_buckets (post_id)
+        ''')
+        
+        # Full-text indexes keep one document per Reddit ID (the latest scraped text)
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            title, selftext,
+            post_id UNINDEXED, subreddit UNINDEXED, created_utc UNINDEXED,
+            tokenize = 'porter unicode61'
+        )
+        ''')
+        
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+            body,
+            comment_id UNINDEXED, post_id UNINDEXED, subreddit UNINDEXED, created_utc UNINDEXED,
+            tokenize = 'porter unicode61'
+        )
+        ''')
+        
+        # Highest row of each content table already in the full-text indexes
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fts_progress (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        cursor.executemany(
+            "INSERT OR IGNORE INTO fts_progress (name, last_id) VALUES (?, 0)",
+            [(name,) for name in _FTS_SOURCES]
+        )
+        
+        self.conn.commit()
+        self._migrate()
+
+    @staticmethod
+    def _create_content_tables(cursor: sqlite3.Cursor) -> None:
+        """
+        Create the content-addressed post and comment tables.
+        
+        Post text and comment bodies are stored once per distinct version in
+        `post_contents` and `comment_bodies`. Every scrape adds only link rows
+        (`post_snapshots`, `comment_links`) holding the fields that change
+        between scrapes. The `subreddit_posts` and `comments` views join them
+        back into one row per post / comment per scrape.
+        """
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_contents (
+            content_id INTEGER PRIMARY KEY,
+            content_hash BLOB NOT NULL UNIQUE,
             post_id TEXT NOT NULL,
-            subreddit_search_id TEXT NOT NULL,
             subreddit TEXT NOT NULL,
             title TEXT,
             url TEXT,
-            score INTEGER,
             created_utc REAL,
             author TEXT,
-            num_comments INTEGER,
             permalink TEXT,
-            selftext TEXT,
-            comments TEXT,
+            selftext TEXT
+        )
+        ''')
+        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_snapshots (
+            snapshot_key INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            post_id TEXT NOT NULL,
+            subreddit_search_id TEXT NOT NULL,
+            content_id INTEGER NOT NULL,
+            score INTEGER,
+            num_comments INTEGER,
             FOREIGN KEY (subreddit_search_id) REFERENCES reddit_searches(id),
+            FOREIGN KEY (content_id) REFERENCES post_contents(content_id),
             UNIQUE(post_id, subreddit_search_id)
         )
         ''')
         
-        self.conn.commit()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comment_bodies (
+            body_id INTEGER PRIMARY KEY,
+            content_hash BLOB NOT NULL UNIQUE,
+            comment_id TEXT NOT NULL,
+            author TEXT,
+            body TEXT,
+            created_utc REAL
+        )
+        ''')
+        
+        # One row per comment per scraped post; position is the pre-order index
+        # within the post's tree, so ordering by it rebuilds the tree in one pass.
+        # Keyed by the integer snapshot key to keep these (the most numerous) rows small
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comment_links (
+            snapshot_key INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            parent_id TEXT,
+            depth INTEGER NOT NULL,
+            score INTEGER,
+            body_id INTEGER NOT NULL,
+            FOREIGN KEY (snapshot_key) REFERENCES post_snapshots(snapshot_key) ON DELETE CASCADE,
+            FOREIGN KEY (body_id) REFERENCES comment_bodies(body_id),
+            PRIMARY KEY (snapshot_key, position)
+        ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_post_snapshots_post_id
+        ON post_snapshots (post_id)
+        ''')
+        
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_post_snapshots_search_id
+        ON post_snapshots (subreddit_search_id)
+        ''')
+        
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_post_snapshots_content_id
+        ON post_snapshots (content_id)
+        ''')
+        
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_post_contents_subreddit
+        ON post_contents (subreddit)
+        ''')
+        
+        cursor.execute('''
+        CREATE VIEW IF NOT EXISTS subreddit_posts AS
+        SELECT
+            s.id, s.post_id, s.subreddit_search_id, c.subreddit, c.title, c.url,
+            s.score, c.created_utc, c.author, s.num_comments, c.permalink, c.selftext
+        FROM post_snapshots s
+        JOIN post_contents c ON c.content_id = s.content_id
+        ''')
+        
+        cursor.execute('''
+        CREATE VIEW IF NOT EXISTS comments AS
+        SELECT
+            s.id AS snapshot_id, l.position, b.comment_id, s.post_id, l.parent_id,
+            l.depth, l.score, b.author, b.body, b.created_utc
+        FROM comment_links l
+        JOIN post_snapshots s ON s.snapshot_key = l.snapshot_key
+        JOIN comment_bodies b ON b.body_id = l.body_id
+        ''')
+
+    @staticmethod
+    def _create_legacy_comments_table(cursor: sqlite3.Cursor) -> None:
+        """Create the pre-version-3 comments table that migrations 1 and 2 write to and read from."""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comments (
+            snapshot_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            comment_id TEXT NOT NULL,
+            post_id TEXT NOT NULL,
+            parent_id TEXT,
+            depth INTEGER NOT NULL,
+            score INTEGER,
+            author TEXT,
+            body TEXT,
+            created_utc REAL,
+            FOREIGN KEY (snapshot_id) REFERENCES subreddit_posts(id) ON DELETE CASCADE,
+            UNIQUE(snapshot_id, position)
+        )
+        ''')
+
+    def migrate(self) -> None:
+        """Bring an existing database up to SCHEMA_VERSION (runs on the writer thread)."""
+        self._writer.call(self._migrate, transaction=False)
+
+    def _migrate(self) -> None:
+        """
+        Bring an existing database up to SCHEMA_VERSION.
+        
+        Version 1 moves the JSON `subreddit_posts.comments` blobs into the
+        `comments` table and clears the blob column. Version 2 fills the
+        full-text indexes from the stored posts and comments. Version 3 moves
+        posts and comments into the content-addressed tables, keeping every
+        snapshot ID, and drops the per-scrape copies. Version 4 builds the
+        score/comment-count time series from the stored snapshots. Version 5
+        fills the MinHash near-duplicate index from the stored post text.
+        Version 6 marks everything stored so far as full-text indexed, since
+        older versions indexed text as it was written.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            with self.conn:
+                rows = self.conn.execute(
+                    "SELECT id, post_id, comments FROM subreddit_posts WHERE comments IS NOT NULL"
+                )
+                for snapshot_id, post_id, comments_json in rows.fetchall():
+                    self.conn.executemany('''
+                    INSERT INTO comments (
+                        snapshot_id, position, comment_id, post_id, parent_id,
+                        depth, score, author, body, created_utc
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', self._comment_rows(snapshot_id, post_id, json.loads(comments_json)))
+                self.conn.execute("UPDATE subreddit_posts SET comments = NULL WHERE comments IS NOT NULL")
+        if version < 2:
+            with self.conn:
+                # Oldest scrape first so the latest text of each post/comment wins
+                posts = self.conn.execute('''
+                SELECT p.id, p.post_id, p.subreddit, p.title, p.selftext, p.created_utc
+                FROM subreddit_posts p
+                JOIN reddit_searches s ON s.id = p.subreddit_search_id
+                ORDER BY s.created_at
+                ''').fetchall()
+                self._index_posts([(row[1], row[2], row[3], row[4], row[5]) for row in posts])
+                for snapshot_id, post_id, subreddit, _, _, _ in posts:
+                    self._index_comments((subreddit, row) for row in self.conn.execute('''
+                    SELECT snapshot_id, position, comment_id, post_id, parent_id,
+                           depth, score, author, body, created_utc
+                    FROM comments WHERE snapshot_id = ?
+                    ''', (snapshot_id,)))
+        if version < 3:
+            with self.conn:
+                # Renaming is DDL, so open the transaction explicitly to keep
+                # the whole move atomic
+                self.conn.execute("BEGIN")
+                self.conn.execute("ALTER TABLE subreddit_posts RENAME TO legacy_subreddit_posts")
+                self.conn.execute("ALTER TABLE comments RENAME TO legacy_comments")
+                self._create_content_tables(self.conn.cursor())
+                
+                snapshots = self.conn.execute('''
+                SELECT
+                    p.id, p.subreddit_search_id, p.post_id, p.subreddit, p.title, p.url,
+                    p.score, p.created_utc, p.author, p.num_comments, p.permalink, p.selftext
+                FROM legacy_subreddit_posts p
+                LEFT JOIN reddit_searches s ON s.id = p.subreddit_search_id
+                ORDER BY s.created_at
+                ''').fetchall()
+                for start in range(0, len(snapshots), 500):
+                    chunk = snapshots[start:start + 500]
+                    comment_rows: Dict[str, List[Tuple]] = {row[0]: [] for row in chunk}
+                    for comment_row in self.conn.execute(f'''
+                    SELECT snapshot_id, position, comment_id, post_id, parent_id,
+                           depth, score, author, body, created_utc
+                    FROM legacy_comments
+                    WHERE snapshot_id IN ({", ".join("?" * len(chunk))})
+                    ORDER BY snapshot_id, position
+                    ''', [row[0] for row in chunk]):
+                        comment_rows[comment_row[0]].append(comment_row)
+                    
+                    self._write_snapshots([
+                        self._hash_snapshot(row[0], row[1], {
+                            'id': row[2],
+                            'subreddit': row[3],
+                            'title': row[4],
+                            'url': row[5],
+                            'score': row[6],
+                            'created_utc': row[7],
+                            'author': row[8],
+                            'num_comments': row[9],
+                            'permalink': row[10],
+                            'selftext': row[11]
+                        }, comment_rows[row[0]])
+                        for row in chunk
+                    ])
+                
+                self.conn.execute("DROP TABLE legacy_comments")
+                self.conn.execute("DROP TABLE legacy_subreddit_posts")
+                self.conn.execute("PRAGMA user_version = 3")
+        if version < 4:
+            with self.conn:
+                snapshots = self.conn.execute('''
+                SELECT s.post_id, r.created_at, s.score, s.num_comments, c.created_utc
+                FROM post_snapshots s
+                JOIN reddit_searches r ON r.id = s.subreddit_search_id
+                JOIN post_contents c ON c.content_id = s.content_id
+                ORDER BY r.created_at
+                ''').fetchall()
+                self._append_metrics([
+                    (post_id, int(datetime.fromisoformat(created_at).timestamp()), score, num_comments, created_utc)
+                    for post_id, created_at, score, num_comments, created_utc in snapshots
+                ])
+        if version < 5:
+            with self.conn:
+                # Oldest content first so each post ends up indexed by its latest text
+                rows = self.conn.execute(
+                    "SELECT post_id, title, selftext, url FROM post_contents ORDER BY content_id"
+                )
+                while True:
+                    chunk = rows.fetchmany(500)
+                    if not chunk:
+                        break
+                    self._index_minhash({
+                        post_id: minhash(post_text({'title': title, 'selftext': selftext, 'url': url}))
+                        for post_id, title, selftext, url in chunk
+                    })
+        if version < 6:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO fts_progress (name, last_id) VALUES (?, ?)",
+                    self._fts_bounds().items()
+                )
+        if version < SCHEMA_VERSION:
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     def record_search(self, keyword: str, results: List[Dict[str, Any]]) -> List[str]:
         """
         Record search results in the database.
         
+        The write is queued; the IDs are generated here so they can be used
+        for `record_posts` right away.
+        
         Args:
             keyword (str): The search term used
             results (List[Dict[str, Any]]): List of raw subreddit results
@@ -60,123 +699,968 @@ class RedditDB:
         Returns:
             List[str]: List of generated search IDs
         """
-        cursor = self.conn.cursor()
-        search_ids = []
-        
-        for result in results:
-            search_id = str(uuid.uuid4())
-            cursor.execute('''
-            INSERT INTO reddit_searches (id, keyword, created_at, subreddit)
-            VALUES (?, ?, ?, ?)
-            ''', (
-                search_id,
-                keyword,
-                datetime.now().isoformat(),
-                json.dumps(result)
-            ))
-            search_ids.append(search_id)
+        search_ids = [str(uuid.uuid4()) for _ in results]
+        created_at = datetime.now().isoformat()
         
-        self.conn.commit()
+        self._writer.post(self._insert_searches, [
+            (search_id, keyword, created_at, json.dumps(result))
+            for search_id, result in zip(search_ids, results)
+        ])
         return search_ids
 
+    def _insert_searches(self, rows: List[Tuple[str, str, str, str]]) -> None:
+        self.conn.executemany('''
+        INSERT INTO reddit_searches (id, keyword, created_at, subreddit)
+        VALUES (?, ?, ?, ?)
+        ''', rows)
+
+    @staticmethod
+    def _comment_rows(snapshot_id: str, post_id: str, comments: Comments) -> Iterable[Tuple]:
+        """
+        Flatten a post's comment tree into comments table rows.
+        
+        Args:
+            snapshot_id (str): ID of the subreddit_posts row the comments belong to
+            post_id (str): Reddit ID of the post
+            comments (Comments): Nested comment dicts or a CommentForest
+            
+        Yields:
+            Tuple: One comments table row per comment, in pre-order
+        """
+        forest = comments if isinstance(comments, CommentForest) else CommentForest.from_dicts(comments)
+        for row in range(len(forest)):
+            parent = forest.parents[row]
+            yield (
+                snapshot_id,
+                row,
+                forest.ids[row],
+                post_id,
+                forest.ids[parent] if parent >= 0 else None,
+                forest.depths[row],
+                forest.scores[row],
+                forest.authors[row],
+                forest.bodies[row],
+                forest.created[row]
+            )
+
+    @staticmethod
+    def _content_hash(*fields: Any) -> bytes:
+        """Hash the fields that make up one version of a post or comment."""
+        return hashlib.blake2b(json.dumps(fields, ensure_ascii=False).encode("utf-8"), digest_size=16).digest()
+
+    def _content_ids(self, table: str, id_column: str, columns: Tuple[str, ...],
+                     rows_by_hash: Dict[bytes, Tuple]) -> Tuple[Dict[bytes, int], List[bytes]]:
+        """
+        Get the IDs of content rows, inserting the ones not stored yet.
+        
+        Args:
+            table (str): post_contents or comment_bodies
+            id_column (str): Integer primary key column of the table
+            columns (Tuple[str, ...]): Columns of the values in `rows_by_hash`
+            rows_by_hash (Dict[bytes, Tuple]): Column values keyed by content hash
+            
+        Returns:
+            Tuple[Dict[bytes, int], List[bytes]]: ID of every hash, and the hashes
+            that were inserted by this call
+        """
+        def lookup(hashes: List[bytes]) -> Dict[bytes, int]:
+            found = {}
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                found.update(self.conn.execute(f'''
+                SELECT content_hash, {id_column} FROM {table}
+                WHERE content_hash IN ({", ".join("?" * len(chunk))})
+                ''', chunk))
+            return found
+        
+        ids = lookup(list(rows_by_hash))
+        new_hashes = [content_hash for content_hash in rows_by_hash if content_hash not in ids]
+        if new_hashes:
+            # Assign IDs up front instead of reading them back (the caller holds
+            # the write transaction)
+            first_id = self.conn.execute(f"SELECT COALESCE(MAX({id_column}), 0) + 1 FROM {table}").fetchone()[0]
+            ids.update((content_hash, first_id + index) for index, content_hash in enumerate(new_hashes))
+            self.conn.executemany(f'''
+            INSERT INTO {table} ({id_column}, content_hash, {", ".join(columns)})
+            VALUES (?, ?, {", ".join("?" * len(columns))})
+            ''', [(ids[content_hash], content_hash, *rows_by_hash[content_hash]) for content_hash in new_hashes])
+        return ids, new_hashes
+
+    @classmethod
+    def _hash_snapshot(cls, snapshot_id: str, subreddit_search_id: str, post: Dict[str, Any],
+                       comment_rows: List[Tuple]) -> Tuple:
+        """
+        Split a post and its comment rows into content fields and their hashes.
+        
+        Touches no connection, so producers can run it before queueing a write.
+        
+        Args:
+            snapshot_id (str): ID of the new post snapshot
+            subreddit_search_id (str): ID of the related reddit_searches record
+            post (Dict): Post dictionary
+            comment_rows (List[Tuple]): The post's rows from `_comment_rows`
+            
+        Returns:
+            Tuple: (snapshot ID, subreddit search ID, post, (post hash, post_contents
+            fields), [(body hash, comment_bodies fields, comment row)]), as
+            `_write_snapshots` takes them
+        """
+        fields = (
+            post['id'], post.get('subreddit', ''), post.get('title', ''), post.get('url', ''),
+            post.get('created_utc', 0.0), post.get('author', ''), post.get('permalink', ''),
+            post.get('selftext', '')
+        )
+        bodies = []
+        for row in comment_rows:
+            # (comment_id, author, body, created_utc)
+            body = (row[2], row[7], row[8], row[9])
+            bodies.append((cls._content_hash(row[3], *body), body, row))
+        return snapshot_id, subreddit_search_id, post, (cls._content_hash(*fields), fields), bodies
+
+    def _write_snapshots(self, snapshots: List[Tuple]) -> List[Dict[str, Any]]:
+        """
+        Write scraped posts and their comments as content rows plus snapshot links.
+        
+        Must be called inside a transaction.
+        
+        Args:
+            snapshots: Output of `_hash_snapshot` for every post
+            
+        Returns:
+            List[Dict]: Posts whose content was not stored before
+        """
+        post_rows: Dict[bytes, Tuple] = {}
+        post_hashes = []
+        for _, _, _, (content_hash, fields), _ in snapshots:
+            post_rows[content_hash] = fields
+            post_hashes.append(content_hash)
+        content_ids, new_post_hashes = self._content_ids(
+            'post_contents', 'content_id',
+            ('post_id', 'subreddit', 'title', 'url', 'created_utc', 'author', 'permalink', 'selftext'),
+            post_rows
+        )
+        
+        # Assign snapshot keys up front so comment links can reference them
+        # without reading them back (the caller holds the write transaction)
+        first_key = self.conn.execute("SELECT COALESCE(MAX(snapshot_key), 0) + 1 FROM post_snapshots").fetchone()[0]
+        snapshot_keys = {snapshot[0]: first_key + index for index, snapshot in enumerate(snapshots)}
+        self.conn.executemany('''
+        INSERT INTO post_snapshots (snapshot_key, id, post_id, subreddit_search_id, content_id, score, num_comments)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (snapshot_keys[snapshot_id], snapshot_id, post['id'], search_id, content_ids[content_hash],
+             post.get('score', 0), post.get('num_comments', 0))
+            for (snapshot_id, search_id, post, _, _), content_hash in zip(snapshots, post_hashes)
+        ])
+        
+        body_rows: Dict[bytes, Tuple] = {}
+        comment_hashes = []
+        for _, _, _, _, bodies in snapshots:
+            for content_hash, fields, row in bodies:
+                body_rows[content_hash] = fields
+                comment_hashes.append((content_hash, row))
+        body_ids, _ = self._content_ids(
+            'comment_bodies', 'body_id', ('comment_id', 'author', 'body', 'created_utc'), body_rows
+        )
+        
+        self.conn.executemany('''
+        INSERT INTO comment_links (snapshot_key, position, parent_id, depth, score, body_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (snapshot_keys[row[0]], row[1], row[4], row[5], row[6], body_ids[content_hash])
+            for content_hash, row in comment_hashes
+        ])
+        
+        new_posts = {content_ids[content_hash] for content_hash in new_post_hashes}
+        return [post for (_, _, post, _, _), content_hash in zip(snapshots, post_hashes)
+                if content_ids[content_hash] in new_posts]
+
+    def _index_posts(self, posts: Iterable[Tuple[str, str, str, str, float]]) -> None:
+        """Add or replace (post_id, subreddit, title, selftext, created_utc) documents in posts_fts."""
+        self.conn.executemany('''
+        INSERT OR REPLACE INTO posts_fts (rowid, title, selftext, post_id, subreddit, created_utc)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (_doc_rowid(post_id), title or '', selftext or '', post_id, subreddit, created_utc)
+            for post_id, subreddit, title, selftext, created_utc in posts
+        ])
+
+    def _index_comments(self, rows: Iterable[Tuple[str, Tuple]]) -> None:
+        """Add or replace comments_fts documents for (subreddit, comments row) pairs."""
+        self.conn.executemany('''
+        INSERT OR REPLACE INTO comments_fts (rowid, body, comment_id, post_id, subreddit, created_utc)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (_doc_rowid(row[2]), row[8] or '', row[2], row[3], subreddit, row[9])
+            for subreddit, row in rows
+        ])
+
+    def _fts_bounds(self) -> Dict[str, int]:
+        """Highest row ID currently stored in each table tracked by fts_progress."""
+        keys = {"post_contents": "content_id", "comment_bodies": "body_id", "post_snapshots": "snapshot_key"}
+        return {
+            name: self.conn.execute(f"SELECT COALESCE(MAX({keys[name]}), 0) FROM {name}").fetchone()[0]
+            for name in _FTS_SOURCES
+        }
+
+    def _index_pending(self) -> None:
+        """
+        Add post text and comment bodies stored since the last call to the full-text indexes.
+        
+        Content rows are only ever inserted, with increasing IDs, so everything
+        above the IDs recorded in fts_progress is new. Must run on the writer thread.
+        """
+        done = dict(self.conn.execute("SELECT name, last_id FROM fts_progress"))
+        bounds = self._fts_bounds()
+        if all(bounds[name] <= done.get(name, 0) for name in _FTS_SOURCES):
+            return
+        
+        # Oldest content first so each post/comment ends up indexed by its latest text
+        posts = self.conn.execute('''
+        SELECT post_id, subreddit, title, selftext, created_utc FROM post_contents
+        WHERE content_id > ? AND content_id <= ?
+        ORDER BY content_id
+        ''', (done.get("post_contents", 0), bounds["post_contents"]))
+        while True:
+            chunk = posts.fetchmany(500)
+            if not chunk:
+                break
+            self._index_posts(chunk)
+        
+        # New bodies are linked from snapshots written after the last call, so
+        # the link primary key bounds the scan
+        comments = self.conn.execute('''
+        SELECT c.subreddit, l.snapshot_key, l.position, b.comment_id, s.post_id, l.parent_id,
+               l.depth, l.score, b.author, b.body, b.created_utc
+        FROM comment_links l
+        JOIN comment_bodies b ON b.body_id = l.body_id
+        JOIN post_snapshots s ON s.snapshot_key = l.snapshot_key
+        JOIN post_contents c ON c.content_id = s.content_id
+        WHERE l.snapshot_key > ? AND l.snapshot_key <= ? AND l.body_id > ? AND l.body_id <= ?
+        ORDER BY l.snapshot_key, l.position
+        ''', (done.get("post_snapshots", 0), bounds["post_snapshots"],
+              done.get("comment_bodies", 0), bounds["comment_bodies"]))
+        while True:
+            chunk = comments.fetchmany(500)
+            if not chunk:
+                break
+            self._index_comments((row[0], row[1:]) for row in chunk)
+        
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO fts_progress (name, last_id) VALUES (?, ?)", bounds.items()
+        )
+
+    def update_search_index(self) -> None:
+        """
+        Bring the full-text indexes up to date with every queued write.
+        
+        `search_corpus` does this itself; call it to pay the indexing cost
+        ahead of the first search.
+        
+        Raises:
+            DBWriteError: If queued writes failed since the last flush
+        """
+        self._writer.call(self._index_pending)
+
+    def _index_minhash(self, signatures: Dict[str, Optional[np.ndarray]]) -> None:
+        """Add or replace the MinHash signatures (None for a text without words) and LSH buckets of posts."""
+        post_ids = list(signatures)
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            self.conn.execute(f"DELETE FROM post_lsh_buckets WHERE post_id IN ({placeholders})", chunk)
+            self.conn.execute(f"DELETE FROM post_minhash WHERE post_id IN ({placeholders})", chunk)
+        
+        signatures = {post_id: signature for post_id, signature in signatures.items() if signature is not None}
+        self.conn.executemany(
+            "INSERT INTO post_minhash (post_id, signature) VALUES (?, ?)",
+            [(post_id, signature.tobytes()) for post_id, signature in signatures.items()]
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO post_lsh_buckets (band, bucket, post_id) VALUES (?, ?, ?)",
+            [(band, bucket, post_id) for post_id, signature in signatures.items()
+             for band, bucket in enumerate(band_buckets(signature))]
+        )
+
     def record_posts(self, subreddit_search_id: str, posts: List[Dict[str, Any]]) -> None:
         """
         Record posts for a subreddit search result.
         
+        Comment trees are flattened, content hashed and (with `minhash_index`)
+        MinHash signatures computed on the calling thread,
+        then the write is queued and returns immediately; the writer stores all posts and their
+        comments in a single transaction. Post text and comment bodies already
+        stored from an earlier scrape are linked rather than copied. The
+        optional work selected by `storage` (full-text indexing on write,
+        MinHash index, metric time series) joins the same transaction. Posts
+        already stored for this subreddit search are skipped. Failures are
+        raised by the next `flush()`.
+        
         Args:
             subreddit_search_id (str): ID of the related reddit_searches record
-            posts (List[Dict]): List of posts to store
+            posts (List[Dict]): List of posts to store; must not be modified afterwards
         """
-        cursor = self.conn.cursor()
-        
+        prepared = []
+        signatures = {}
         for post in posts:
-            try:
-                cursor.execute('''
-                INSERT INTO subreddit_posts (
-                    id, post_id, subreddit_search_id, subreddit, title, url,
-                    score, created_utc, author, num_comments,
-                    permalink, selftext, comments
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    str(uuid.uuid4()),
-                    post['id'],
-                    subreddit_search_id,
-                    post.get('subreddit', ''),
-                    post.get('title', ''),
-                    post.get('url', ''),
-                    post.get('score', 0),
-                    post.get('created_utc', 0.0),
-                    post.get('author', ''),
-                    post.get('num_comments', 0),
-                    post.get('permalink', ''),
-                    post.get('selftext', ''),
-                    json.dumps(post.get('comments', []))
-                ))
-            except sqlite3.IntegrityError:
-                # Skip if this post already exists for this subreddit search
+            snapshot_id = str(uuid.uuid4())
+            comment_rows = list(self._comment_rows(snapshot_id, post['id'], post.get('comments', [])))
+            prepared.append(self._hash_snapshot(snapshot_id, subreddit_search_id, post, comment_rows))
+            if self.storage["minhash_index"]:
+                signatures[post['id']] = minhash(post_text(post))
+        self._writer.post(self._record_posts, subreddit_search_id, prepared, signatures, int(time.time()))
+
+    def _record_posts(self, subreddit_search_id: str, prepared: List[Tuple],
+                      signatures: Dict[str, Optional[np.ndarray]], scraped_at: int) -> None:
+        post_ids = list({snapshot[2]['id'] for snapshot in prepared})
+        stored = set()
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            stored.update(row[0] for row in self.conn.execute(f'''
+            SELECT post_id FROM post_snapshots
+            WHERE subreddit_search_id = ? AND post_id IN ({", ".join("?" * len(chunk))})
+            ''', [subreddit_search_id, *chunk]))
+        
+        snapshots = []
+        for snapshot in prepared:
+            if snapshot[2]['id'] not in stored:
+                stored.add(snapshot[2]['id'])
+                snapshots.append(snapshot)
+        
+        new_posts = self._write_snapshots(snapshots)
+        if self.storage["full_text_on_write"]:
+            self._index_pending()
+        if self.storage["minhash_index"]:
+            self._index_minhash({post['id']: signatures[post['id']] for post in new_posts})
+        if self.storage["metrics"]:
+            self._append_metrics([
+                (post['id'], scraped_at, post.get('score', 0), post.get('num_comments', 0), post.get('created_utc'))
+                for _, _, post, _, _ in snapshots
+            ])
+
+    def _append_metrics(self, points: List[Tuple[str, int, int, int, Optional[float]]]) -> None:
+        """
+        Append (post_id, ts, score, num_comments, created_utc) points to the time series.
+        
+        Points must be in chronological order; a point not newer than the
+        latest one stored for its post is skipped.
+        """
+        post_ids = list({point[0] for point in points})
+        heads: Dict[str, List] = {}
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            for row in self.conn.execute(f'''
+            SELECT post_id, seq, ts, score, num_comments, created_utc FROM post_metrics_head
+            WHERE post_id IN ({", ".join("?" * len(chunk))})
+            ''', chunk):
+                heads[row[0]] = list(row[1:])
+        
+        rows = []
+        changed = set()
+        for post_id, ts, score, num_comments, created_utc in points:
+            score, num_comments = score or 0, num_comments or 0
+            head = heads.get(post_id)
+            if head is None:
+                rows.append((post_id, 0, ts, score, num_comments))
+                heads[post_id] = [0, ts, score, num_comments, created_utc]
+            elif ts > head[1]:
+                seq = head[0] + 1
+                rows.append((post_id, seq, ts - head[1], score - head[2], num_comments - head[3]))
+                heads[post_id] = [seq, ts, score, num_comments, created_utc if created_utc is not None else head[4]]
+            else:
                 continue
+            changed.add(post_id)
         
-        self.conn.commit()
+        self.conn.executemany('''
+        INSERT INTO post_metrics (post_id, seq, ts_delta, score_delta, comments_delta)
+        VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        self.conn.executemany('''
+        INSERT OR REPLACE INTO post_metrics_head (post_id, seq, ts, score, num_comments, created_utc)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(post_id, *heads[post_id]) for post_id in changed])
 
-    def get_recent_searches(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def load_comment_forests(self, snapshot_ids: Iterable[str]) -> Dict[str, CommentForest]:
         """
-        Get recent search results.
+        Rebuild the comment trees of stored posts from the comments table.
+        
+        Rows are streamed from one ordered cursor, so no intermediate list of
+        rows is built.
         
         Args:
-            limit (int): Number of recent results to return
+            snapshot_ids (Iterable[str]): IDs of subreddit_posts rows
             
         Returns:
-            List[Dict[str, Any]]: List of recent search results with their posts
+            Dict[str, CommentForest]: Comment forest for every requested row
+        """
+        snapshot_ids = list(snapshot_ids)
+        forests = {snapshot_id: CommentForest() for snapshot_id in snapshot_ids}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(snapshot_ids), 500):
+            chunk = snapshot_ids[start:start + 500]
+            cursor = self.conn.execute(f'''
+            SELECT snapshot_id, comment_id, parent_id, author, body, score, created_utc
+            FROM comments
+            WHERE snapshot_id IN ({", ".join("?" * len(chunk))})
+            ORDER BY snapshot_id, position
+            ''', chunk)
+            
+            rows_by_id: Dict[str, int] = {}
+            current = None
+            for snapshot_id, comment_id, parent_id, author, body, score, created_utc in cursor:
+                if snapshot_id != current:
+                    current = snapshot_id
+                    rows_by_id = {}
+                forest = forests[snapshot_id]
+                parent = rows_by_id.get(parent_id, -1) if parent_id is not None else -1
+                rows_by_id[comment_id] = forest.append(comment_id, author, body, score, created_utc, parent)
+        return forests
+
+    def get_post_comments(self, snapshot_id: str) -> List[Dict[str, Any]]:
+        """
+        Get a stored post's comments in the nested dict shape produced by RedditScraper.
+        
+        Args:
+            snapshot_id (str): ID of the subreddit_posts row
+            
+        Returns:
+            List[Dict]: Top-level comment dictionaries with nested `replies`
+        """
+        return self.load_comment_forests([snapshot_id])[snapshot_id].to_dicts()
+
+    def get_top_comments(self, subreddit: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the highest scoring comments stored for a subreddit.
+        
+        Each comment appears once, with the highest score it was seen with.
+        
+        Args:
+            subreddit (str): Subreddit name
+            limit (int): Number of comments to return
+            
+        Returns:
+            List[Dict[str, Any]]: Flat comment dictionaries, best first
+        """
+        cursor = self.conn.execute('''
+        SELECT b.comment_id, s.post_id, l.parent_id, l.depth, MAX(l.score) AS best_score,
+               b.author, b.body, b.created_utc
+        FROM post_contents p
+        JOIN post_snapshots s ON s.content_id = p.content_id
+        JOIN comment_links l ON l.snapshot_key = s.snapshot_key
+        JOIN comment_bodies b ON b.body_id = l.body_id
+        WHERE p.subreddit = ?
+        GROUP BY b.comment_id
+        ORDER BY best_score DESC
+        LIMIT ?
+        ''', (subreddit, limit))
+        
+        return [
+            {
+                'id': row[0],
+                'post_id': row[1],
+                'parent_id': row[2],
+                'depth': row[3],
+                'score': row[4],
+                'author': row[5],
+                'body': row[6],
+                'created_utc': row[7]
+            }
+            for row in cursor
+        ]
+
+    def get_latest_post(self, post_id: str, max_age_hours: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recently scraped copy of a post.
+        
+        Args:
+            post_id (str): Reddit ID of the post
+            max_age_hours (float, optional): Ignore copies scraped longer ago than this
+            
+        Returns:
+            Optional[Dict[str, Any]]: Post data with its comments and the time it
+            was scraped (`scraped_at`), or None if the post was never stored
         """
         cursor = self.conn.cursor()
         
         cursor.execute('''
         SELECT 
-            s.id, s.keyword, s.created_at, s.subreddit,
             p.post_id, p.subreddit, p.title, p.url, p.score, p.created_utc,
-            p.author, p.num_comments, p.permalink, p.selftext, p.comments
-        FROM reddit_searches s
-        LEFT JOIN subreddit_posts p ON s.id = p.subreddit_search_id
-        ORDER BY s.created_at DESC, p.created_at DESC
-        ''')
+            p.author, p.num_comments, p.permalink, p.selftext, p.id,
+            s.created_at
+        FROM subreddit_posts p
+        JOIN reddit_searches s ON s.id = p.subreddit_search_id
+        WHERE p.post_id = ?
+        ORDER BY s.created_at DESC
+        LIMIT 1
+        ''', (post_id,))
         
-        searches = {}
-        for row in cursor.fetchall():
-            search_id = row[0]
-            if search_id not in searches:
-                searches[search_id] = {
-                    'id': row[0],
-                    'keyword': row[1],
-                    'created_at': row[2],
-                    'subreddit': json.loads(row[3]),
-                    'posts': []
-                }
-            if row[4]:  # If there are posts
+        row = cursor.fetchone()
+        if not row:
+            return None
+        if max_age_hours is not None and datetime.now() - datetime.fromisoformat(row[11]) > timedelta(hours=max_age_hours):
+            return None
+        return {
+            'id': row[0],
+            'subreddit': row[1],
+            'title': row[2],
+            'url': row[3],
+            'score': row[4],
+            'created_utc': row[5],
+            'author': row[6],
+            'num_comments': row[7],
+            'permalink': row[8],
+            'selftext': row[9],
+            'comments': self.get_post_comments(row[10]),
+            'scraped_at': row[11]
+        }
+
+    def get_searches_page(self, limit: int = 10, after: Optional[Tuple[str, int]] = None,
+                          comments: str = "eager") -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+        """
+        Get one page of searches, newest first, with their posts.
+        
+        Pages are keyset paginated on (created_at, rowid), so fetching a page
+        costs the same however deep into the history it is.
+        
+        Args:
+            limit (int): Number of searches on the page
+            after (Tuple[str, int], optional): Cursor returned with the previous page
+            comments (str): "eager" to load comment trees, "lazy" to load each
+                post's comments on first access, or "none" to leave them out
+            
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]: The searches
+            and the cursor for the next page (None when this is the last page)
+        """
+        if comments not in ("eager", "lazy", "none"):
+            raise ValueError(f"Unknown comments mode '{comments}', expected eager, lazy or none")
+        
+        if after is None:
+            cursor = self.conn.execute('''
+            SELECT rowid, id, keyword, created_at, subreddit
+            FROM reddit_searches
+            ORDER BY created_at DESC, rowid DESC
+            LIMIT ?
+            ''', (limit,))
+        else:
+            cursor = self.conn.execute('''
+            SELECT rowid, id, keyword, created_at, subreddit
+            FROM reddit_searches
+            WHERE (created_at, rowid) < (?, ?)
+            ORDER BY created_at DESC, rowid DESC
+            LIMIT ?
+            ''', (after[0], after[1], limit))
+        
+        search_rows = cursor.fetchall()
+        searches = {
+            row[1]: {
+                'id': row[1],
+                'keyword': row[2],
+                'created_at': row[3],
+                'subreddit': json.loads(row[4]),
+                'posts': []
+            }
+            for row in search_rows
+        }
+        
+        posts = []
+        if searches:
+            search_ids = list(searches)
+            post_cursor = self.conn.execute(f'''
+            SELECT
+                post_id, subreddit, title, url, score, created_utc,
+                author, num_comments, permalink, selftext, id, subreddit_search_id
+            FROM subreddit_posts
+            WHERE subreddit_search_id IN ({", ".join("?" * len(search_ids))})
+            ORDER BY subreddit_search_id, created_utc DESC
+            ''', search_ids)
+            for row in post_cursor:
                 post_data = {
-                    'id': row[4],
-                    'subreddit': row[5],
-                    'title': row[6],
-                    'url': row[7],
-                    'score': row[8],
-                    'created_utc': row[9],
-                    'author': row[10],
-                    'num_comments': row[11],
-                    'permalink': row[12],
-                    'selftext': row[13],
-                    'comments': json.loads(row[14])
+                    'id': row[0],
+                    'subreddit': row[1],
+                    'title': row[2],
+                    'url': row[3],
+                    'score': row[4],
+                    'created_utc': row[5],
+                    'author': row[6],
+                    'num_comments': row[7],
+                    'permalink': row[8],
+                    'selftext': row[9]
                 }
-                searches[search_id]['posts'].append(post_data)
+                if comments == "lazy":
+                    post_data['comments'] = LazyComments(self, row[10])
+                searches[row[11]]['posts'].append(post_data)
+                posts.append((row[10], post_data))
+        
+        if comments == "eager" and posts:
+            forests = self.load_comment_forests(snapshot_id for snapshot_id, _ in posts)
+            for snapshot_id, post_data in posts:
+                post_data['comments'] = forests[snapshot_id].to_dicts()
+        
+        next_cursor = (search_rows[-1][3], search_rows[-1][0]) if len(search_rows) == limit else None
+        return list(searches.values()), next_cursor
+
+    def iter_searches(self, page_size: int = 50, comments: str = "lazy") -> Iterator[Dict[str, Any]]:
+        """
+        Stream every stored search, newest first, one page at a time.
+        
+        Args:
+            page_size (int): Searches fetched per query
+            comments (str): "eager", "lazy" or "none" (see `get_searches_page`)
+            
+        Yields:
+            Dict[str, Any]: A search with its posts
+        """
+        after = None
+        while True:
+            searches, after = self.get_searches_page(page_size, after, comments)
+            yield from searches
+            if after is None:
+                return
+
+    def get_recent_searches(self, limit: int = 10, comments: str = "eager") -> List[Dict[str, Any]]:
+        """
+        Get recent search results.
+        
+        Args:
+            limit (int): Number of recent results to return
+            comments (str): "eager", "lazy" or "none" (see `get_searches_page`)
+            
+        Returns:
+            List[Dict[str, Any]]: List of recent search results with their posts
+        """
+        searches, _ = self.get_searches_page(limit, comments=comments)
+        return searches
+
+    def get_metric_series(self, post_id: str) -> List[Tuple[int, int, int]]:
+        """
+        Decode a post's score/comment-count history.
+        
+        Args:
+            post_id (str): Reddit ID of the post
+            
+        Returns:
+            List[Tuple[int, int, int]]: (timestamp, score, num_comments) per scrape, oldest first
+        """
+        series = []
+        ts = score = num_comments = 0
+        for ts_delta, score_delta, comments_delta in self.conn.execute('''
+        SELECT ts_delta, score_delta, comments_delta FROM post_metrics
+        WHERE post_id = ? ORDER BY seq
+        ''', (post_id,)):
+            ts, score, num_comments = ts + ts_delta, score + score_delta, num_comments + comments_delta
+            series.append((ts, score, num_comments))
+        return series
+
+    def get_metric_tails(self, post_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple]:
+        """
+        Stream the latest values and last two changes of every (or the given) post.
+        
+        This is all velocity and acceleration need, so at most two delta rows
+        per post are read however long its history is.
+        
+        Args:
+            post_ids (Iterable[str], optional): Posts to read; defaults to every tracked post
+            
+        Yields:
+            Tuple: post_id, ts, score, num_comments, created_utc, then the
+            ts/score/comments deltas of the latest change and of the change
+            before it (None where the post has fewer scrapes)
+        """
+        query = '''
+        SELECT h.post_id, h.ts, h.score, h.num_comments, h.created_utc,
+               l.ts_delta, l.score_delta, l.comments_delta,
+               p.ts_delta, p.score_delta, p.comments_delta
+        FROM post_metrics_head h
+        LEFT JOIN post_metrics l ON l.post_id = h.post_id AND l.seq = h.seq AND h.seq > 0
+        LEFT JOIN post_metrics p ON p.post_id = h.post_id AND p.seq = h.seq - 1 AND h.seq > 1
+        '''
+        if post_ids is None:
+            yield from self.conn.execute(query)
+            return
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            yield from self.conn.execute(query + f"WHERE h.post_id IN ({', '.join('?' * len(chunk))})", chunk)
+
+    def get_metrics_version(self) -> Tuple[int, int, Optional[int]]:
+        """
+        Summarize the score/comment time series cheaply enough to fingerprint it.
+        
+        The tuple changes whenever a point is appended for any post.
         
-        return list(searches.values())[:limit]
+        Returns:
+            Tuple[int, int, Optional[int]]: Tracked posts, total points and latest timestamp
+        """
+        posts, points, latest = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(seq), 0), MAX(ts) FROM post_metrics_head"
+        ).fetchone()
+        return posts, points, latest
+
+    def get_minhash_signatures(self, post_ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Read the MinHash signatures of posts.
+        
+        Args:
+            post_ids (Iterable[str]): Reddit IDs of the posts
+            
+        Returns:
+            Dict[str, np.ndarray]: Signature per post; posts without one are left out
+        """
+        post_ids = list(post_ids)
+        signatures = {}
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            for post_id, signature in self.conn.execute(f'''
+            SELECT post_id, signature FROM post_minhash
+            WHERE post_id IN ({", ".join("?" * len(chunk))})
+            ''', chunk):
+                signatures[post_id] = np.frombuffer(signature, dtype=np.uint32)
+        return signatures
+
+    def get_lsh_candidate_pairs(self, post_ids: Iterable[str]) -> Set[Tuple[str, str]]:
+        """
+        Find stored posts sharing an LSH bucket with any of the given posts.
+        
+        Args:
+            post_ids (Iterable[str]): Reddit IDs of the posts to look up
+            
+        Returns:
+            Set[Tuple[str, str]]: (post_id, other_post_id) candidate pairs; the other post may
+            be any stored post, including ones from earlier scrapes
+        """
+        post_ids = list(post_ids)
+        pairs = set()
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            pairs.update(self.conn.execute(f'''
+            SELECT DISTINCT a.post_id, b.post_id
+            FROM post_lsh_buckets a
+            JOIN post_lsh_buckets b ON b.band = a.band AND b.bucket = a.bucket AND b.post_id != a.post_id
+            WHERE a.post_id IN ({", ".join("?" * len(chunk))})
+            ''', chunk))
+        return pairs
+
+    def search_corpus(self, query: str, limit: int = 20, page: int = 1, kind: str = "all",
+                      subreddit: Optional[str] = None, since: Optional[float] = None,
+                      raw: bool = False) -> List[Dict[str, Any]]:
+        """
+        Full-text search over stored post titles, selftext and comment bodies.
+        
+        Results are ranked by BM25 (best first) and paginated in SQL. Text
+        recorded since the last search is indexed first, unless
+        `full_text_on_write` already did so.
+        
+        Args:
+            query (str): Words to search for; all must match unless `raw` is set
+            limit (int): Results per page
+            page (int): 1-based page number
+            kind (str): "posts", "comments" or "all"
+            subreddit (str, optional): Only return results from this subreddit
+            since (float, optional): Only return results created at or after this UTC timestamp
+            raw (bool): Pass `query` to FTS5 unchanged (allows OR, NEAR, prefix* and column filters)
+            
+        Returns:
+            List[Dict[str, Any]]: Matches with kind, IDs, subreddit, snippet and rank
+        """
+        match = query if raw else _fts_query(query)
+        if not match:
+            return []
+        if not self.storage["full_text_on_write"]:
+            self.update_search_index()
+        
+        selects = []
+        params: List[Any] = []
+        filters = ""
+        filter_params: List[Any] = []
+        if subreddit:
+            filters += " AND subreddit = ?"
+            filter_params.append(subreddit)
+        if since is not None:
+            filters += " AND created_utc >= ?"
+            filter_params.append(since)
+        
+        if kind in ("all", "posts"):
+            selects.append(f'''
+            SELECT 'post', post_id, NULL, subreddit, created_utc, title,
+                   snippet(posts_fts, -1, '[', ']', '…', 12), bm25(posts_fts, 5.0, 1.0)
+            FROM posts_fts WHERE posts_fts MATCH ?{filters}
+            ''')
+            params += [match, *filter_params]
+        if kind in ("all", "comments"):
+            selects.append(f'''
+            SELECT 'comment', post_id, comment_id, subreddit, created_utc, NULL,
+                   snippet(comments_fts, 0, '[', ']', '…', 12), bm25(comments_fts)
+            FROM comments_fts WHERE comments_fts MATCH ?{filters}
+            ''')
+            params += [match, *filter_params]
+        if not selects:
+            raise ValueError(f"Unknown search kind '{kind}', expected posts, comments or all")
+        
+        cursor = self.conn.execute(
+            " UNION ALL ".join(selects) + " ORDER BY 8 LIMIT ? OFFSET ?",
+            [*params, limit, (max(page, 1) - 1) * limit]
+        )
+        return [
+            {
+                'kind': row[0],
+                'post_id': row[1],
+                'comment_id': row[2],
+                'subreddit': row[3],
+                'created_utc': row[4],
+                'title': row[5],
+                'snippet': row[6],
+                'rank': row[7]
+            }
+            for row in cursor
+        ]
+
+    def storage_report(self) -> Dict[str, Any]:
+        """
+        Compare what is stored with what one full copy per scrape would take.
+        
+        Returns:
+            Dict[str, Any]: Row counts, text bytes stored vs. referenced, and
+            database file usage
+        """
+        def scalar(sql: str) -> int:
+            return self.conn.execute(sql).fetchone()[0] or 0
+        
+        post_text = "length(CAST(c.title AS BLOB)) + length(CAST(c.selftext AS BLOB)) + length(CAST(c.url AS BLOB))"
+        post_bytes = scalar(f"SELECT SUM({post_text}) FROM post_contents c")
+        post_bytes_copied = scalar(f'''
+        SELECT SUM({post_text}) FROM post_snapshots s JOIN post_contents c ON c.content_id = s.content_id
+        ''')
+        body_bytes = scalar("SELECT SUM(length(CAST(body AS BLOB))) FROM comment_bodies")
+        body_bytes_copied = scalar('''
+        SELECT SUM(length(CAST(b.body AS BLOB))) FROM comment_links l JOIN comment_bodies b ON b.body_id = l.body_id
+        ''')
+        page_size = scalar("PRAGMA page_size")
+        
+        return {
+            'post_snapshots': scalar("SELECT COUNT(*) FROM post_snapshots"),
+            'post_contents': scalar("SELECT COUNT(*) FROM post_contents"),
+            'comment_links': scalar("SELECT COUNT(*) FROM comment_links"),
+            'comment_bodies': scalar("SELECT COUNT(*) FROM comment_bodies"),
+            'text_bytes_stored': post_bytes + body_bytes,
+            'text_bytes_without_dedup': post_bytes_copied + body_bytes_copied,
+            'text_bytes_saved': post_bytes_copied + body_bytes_copied - post_bytes - body_bytes,
+            'file_bytes': scalar("PRAGMA page_count") * page_size,
+            'free_bytes': scalar("PRAGMA freelist_count") * page_size
+        }
+
+    def vacuum(self) -> None:
+        """Commit queued writes, then rebuild the database file to release free pages."""
+        self.flush()
+        
+        def vacuum():
+            self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        
+        self._writer.call(vacuum, transaction=False)
 
     def drop_tables(self):
         """Drop all tables from the database."""
+        self._writer.call(self._drop_tables, transaction=False)
+
+    def _drop_tables(self):
         cursor = self.conn.cursor()
-        cursor.execute("DROP TABLE IF EXISTS subreddit_posts")
+        cursor.execute("DROP TABLE IF EXISTS posts_fts")
+        cursor.execute("DROP TABLE IF EXISTS comments_fts")
+        cursor.execute("DROP TABLE IF EXISTS fts_progress")
+        cursor.execute("DROP TABLE IF EXISTS post_metrics")
+        cursor.execute("DROP TABLE IF EXISTS post_metrics_head")
+        cursor.execute("DROP TABLE IF EXISTS post_lsh_buckets")
+        cursor.execute("DROP TABLE IF EXISTS post_minhash")
+        cursor.execute("DROP VIEW IF EXISTS comments")
+        cursor.execute("DROP VIEW IF EXISTS subreddit_posts")
+        cursor.execute("DROP TABLE IF EXISTS comment_links")
+        cursor.execute("DROP TABLE IF EXISTS comment_bodies")
+        cursor.execute("DROP TABLE IF EXISTS post_snapshots")
+        cursor.execute("DROP TABLE IF EXISTS post_contents")
         cursor.execute("DROP TABLE IF EXISTS reddit_searches")
         self.conn.commit()
 
+    def flush(self) -> None:
+        """
+        Block until every queued write is committed and visible to readers.
+        
+        Raises:
+            DBWriteError: If queued writes failed since the last flush
+        """
+        self._writer.flush()
+
     def close(self):
-        """Close the database connection."""
-        self.conn.close()
+        """Commit queued writes, stop the writer thread and close every connection."""
+        if self._closed:
+            return
+        atexit.unregister(self.close)
+        try:
+            self._writer.close()
+        finally:
+            self._closed = True
+            self._write_conn.close()
+            with self._readers_lock:
+                for reader in self._readers:
+                    reader.close()
+                self._readers = []
+
+    def __enter__(self) -> "RedditDB":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the local Reddit database")
+    parser.add_argument("--db", default="reddit_data.db", help="Path to the SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    search_parser = commands.add_parser("search", help="Full-text search over stored posts and comments")
+    search_parser.add_argument("query", help="Words to search for")
+    search_parser.add_argument("--kind", choices=["all", "posts", "comments"], default="all")
+    search_parser.add_argument("--subreddit", help="Only search this subreddit")
+    search_parser.add_argument("--days", type=float, help="Only return results from the last N days")
+    search_parser.add_argument("--limit", type=int, default=20, help="Results per page")
+    search_parser.add_argument("--page", type=int, default=1, help="Page number")
+    search_parser.add_argument("--raw", action="store_true", help="Use FTS5 query syntax as-is")
+    
+    migrate_parser = commands.add_parser("migrate", help="Upgrade the database schema and report the space saved")
+    migrate_parser.add_argument("--no-vacuum", action="store_true", help="Skip compacting the file afterwards")
+    commands.add_parser("report", help="Show how much storage deduplication saves")
+    args = parser.parse_args()
+    
+    def file_size(path: str) -> int:
+        return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+    
+    size_before = file_size(args.db)
+    version_before = sqlite3.connect(args.db).execute("PRAGMA user_version").fetchone()[0] if size_before else None
+    db = RedditDB(args.db)
+    try:
+        if args.command in ("migrate", "report"):
+            if args.command == "migrate":
+                print(f"Schema version {version_before} -> {SCHEMA_VERSION}")
+                if not args.no_vacuum:
+                    db.vacuum()
+                print(f"File size: {size_before:,} -> {file_size(args.db):,} bytes")
+            for key, value in db.storage_report().items():
+                print(f"{key:28} {value:,}")
+
+        elif args.command == "search":
+            since = time.time() - args.days * 86400 if args.days else None
+            start = time.perf_counter()
+            results = db.search_corpus(args.query, args.limit, args.page, args.kind,
+                                       args.subreddit, since, args.raw)
+            elapsed = (time.perf_counter() - start) * 1000
+            for result in results:
+                location = f"r/{result['subreddit']} post {result['post_id']}"
+                if result['kind'] == 'comment':
+                    location += f" comment {result['comment_id']}"
+                print(f"[{result['kind']}] {location} (rank {result['rank']:.2f})")
+                if result['title']:
+                    print(f"  {result['title']}")
+                print(f"  {result['snippet']}")
+            print(f"{len(results)} results on page {args.page} in {elapsed:.1f} ms")
+    finally:
+        db.close()
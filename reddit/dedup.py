@@ -0,0 +1,416 @@
+"""
+Near-duplicate and crosspost detection with MinHash and locality-sensitive hashing
+
+Each post is reduced to a MinHash signature over word shingles of its title,
+selftext and link. Signatures are split into bands; posts sharing any band
+bucket are candidate duplicates, and candidates are confirmed by the fraction
+of matching signature values (an estimate of their Jaccard similarity).
+Posts linking to the same URL, including crossposts (whose URL is the
+permalink of the original post), are duplicates regardless of their text.
+"""
+import re
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import numpy as np
+from .comment_tree import CommentForest, as_dicts
+from .utils import load_config
+
+# Signature length and banding; 32 bands of 4 rows make pairs above ~0.45
+# Jaccard similarity likely to share a bucket
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+# Words per shingle; the words of shorter texts are their shingles
+SHINGLE_WORDS = 3
+# Characters of selftext hashed per post
+MAX_TEXT_CHARS = 10000
+
+# Universal hashing (a * x + b) mod p with a Mersenne prime small enough that
+# the products fit in 64 bits
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.int64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.int64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PERMALINK = re.compile(r"^(?:[a-z]+\.)?reddit\.com/(?:r/[^/]+/)?comments/([a-z0-9]+)")
+_SHORT_LINK = re.compile(r"^redd\.it/([a-z0-9]+)$")
+# Query parameters that only track where a link was shared
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|ref|ref_src|ref_source|share_id|si|fbclid|gclid)$")
+
+
+def get_dedup_settings() -> Dict[str, Any]:
+    """
+    Get the deduplication settings from the `dedup` config block.
+
+    Returns:
+        Dict[str, Any]: enabled, threshold and merge_comments
+    """
+    settings = load_config().get("dedup", {})
+    return {
+        "enabled": settings.get("enabled", True),
+        "threshold": settings.get("threshold", 0.6),
+        "merge_comments": settings.get("merge_comments", True)
+    }
+
+
+def url_key(url: Optional[str]) -> Optional[str]:
+    """
+    Normalise a post URL so that links to the same thing compare equal.
+
+    Reddit permalinks and redd.it short links become `t3_<id>`, so a
+    crosspost's URL matches the original post's own permalink. Other links
+    lose their scheme, `www.`, fragment, trailing slash and tracking parameters.
+
+    Args:
+        url: Post URL
+
+    Returns:
+        Optional[str]: Normalised key, or None when there is no URL
+    """
+    if not url:
+        return None
+    parts = urlsplit(url.strip() if "://" in url else "https://www.reddit.com" + url.strip())
+    host = parts.netloc.lower()
+    host = host[4:] if host.startswith("www.") else host
+    path = parts.path.rstrip("/")
+    location = host + path.lower()
+    match = _PERMALINK.match(location) or _SHORT_LINK.match(location)
+    if match:
+        return f"t3_{match.group(1)}"
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query)
+                             if not _TRACKING_PARAMS.match(key)))
+    return host + path + ("?" + query if query else "")
+
+
+def post_text(post: Dict[str, Any]) -> str:
+    """Text a post's signature is computed from: title, selftext and link."""
+    return "\n".join((post.get('title') or '', (post.get('selftext') or '')[:MAX_TEXT_CHARS],
+                      url_key(post.get('url')) or ''))
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """
+    Hash the overlapping word n-grams of a text.
+
+    Args:
+        text: Text to shingle
+
+    Returns:
+        np.ndarray: Distinct shingle hashes below the hashing prime (empty for a text without words)
+    """
+    words = np.array([zlib.crc32(word.encode()) for word in _WORD.findall(text.lower())], dtype=np.int64)
+    if len(words) >= SHINGLE_WORDS:
+        count = len(words) - SHINGLE_WORDS + 1
+        shingles = words[:count]
+        for offset in range(1, SHINGLE_WORDS):
+            shingles = (shingles * 1_000_003 + words[offset:offset + count]) % _PRIME
+        words = shingles
+    return np.unique(words % _PRIME)
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """
+    Compute the MinHash signature of a text.
+
+    Args:
+        text: Text to sign
+
+    Returns:
+        Optional[np.ndarray]: NUM_PERM uint32 values, or None for a text without words
+    """
+    shingles = shingle_hashes(text)
+    if not len(shingles):
+        return None
+    return ((_A[:, None] * shingles[None, :] + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def band_buckets(signature: np.ndarray) -> List[int]:
+    """Bucket of each LSH band of a signature, in band order."""
+    return [zlib.crc32(band.tobytes()) for band in signature.reshape(BANDS, ROWS)]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures: the fraction of equal values."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class LSHIndex:
+    """In-memory LSH index over signatures, for posts not (yet) in the database index."""
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        """Index a signature under a key."""
+        self.signatures[key] = signature
+        for band, bucket in enumerate(band_buckets(signature)):
+            self.buckets[(band, bucket)].append(key)
+
+    def query(self, signature: np.ndarray, threshold: float) -> List[str]:
+        """
+        Find indexed keys whose signature is at least `threshold` similar.
+
+        Returns:
+            List[str]: Matching keys, most similar first
+        """
+        candidates = {key for band, bucket in enumerate(band_buckets(signature))
+                      for key in self.buckets.get((band, bucket), ())}
+        scored = [(similarity(signature, self.signatures[key]), key) for key in candidates]
+        return [key for score, key in sorted(scored, reverse=True) if score >= threshold]
+
+
+class _DisjointSets:
+    """Union-find over post positions."""
+    def __init__(self, size: int):
+        self.parents = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self.parents[item] != item:
+            self.parents[item] = self.parents[self.parents[item]]
+            item = self.parents[item]
+        return item
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parents[max(a, b)] = min(a, b)
+
+
+def find_duplicate_groups(posts: List[Dict[str, Any]], threshold: float = 0.6,
+                          db: Any = None) -> List[List[int]]:
+    """
+    Group posts that are crossposts, link to the same URL or have near-identical text.
+
+    With a database, signatures and bucket matches are read from its
+    incrementally maintained index (posts must be recorded and flushed);
+    posts missing from it are signed here.
+
+    Args:
+        posts: Post dictionaries as returned by the scraper
+        threshold: Estimated Jaccard similarity at or above which two posts are duplicates
+        db: RedditDB holding the MinHash index (optional)
+
+    Returns:
+        List[List[int]]: Positions of the posts of every group with more than one post
+    """
+    sets = _DisjointSets(len(posts))
+    positions: Dict[str, List[int]] = defaultdict(list)
+    for position, post in enumerate(posts):
+        positions[post['id']].append(position)
+
+    # The same post listed in several subreddits, and posts sharing a link
+    by_url: Dict[str, int] = {}
+    for position, post in enumerate(posts):
+        for key in (f"t3_{post['id']}", url_key(post.get('url'))):
+            if key is None:
+                continue
+            if key in by_url:
+                sets.union(by_url[key], position)
+            else:
+                by_url[key] = position
+
+    post_ids = list(positions)
+    signatures = db.get_minhash_signatures(post_ids) if db is not None else {}
+    candidates = db.get_lsh_candidate_pairs(post_ids) if db is not None else set()
+    unindexed = [post_id for post_id in post_ids if post_id not in signatures]
+    for post_id in unindexed:
+        signature = minhash(post_text(posts[positions[post_id][0]]))
+        if signature is not None:
+            signatures[post_id] = signature
+    if any(post_id in signatures for post_id in unindexed):
+        index = LSHIndex()
+        for post_id, signature in signatures.items():
+            index.add(post_id, signature)
+        for post_id in unindexed:
+            if post_id in signatures:
+                candidates.update((post_id, other) for other in index.query(signatures[post_id], threshold)
+                                  if other != post_id)
+    for a, b in candidates:
+        if a in signatures and b in signatures and similarity(signatures[a], signatures[b]) >= threshold:
+            sets.union(positions[a][0], positions[b][0])
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for position in range(len(posts)):
+        groups[sets.find(position)].append(position)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def choose_canonical(posts: List[Dict[str, Any]]) -> int:
+    """
+    Pick the post a duplicate group collapses into.
+
+    The original of a crosspost wins; otherwise the post with the highest
+    score (then the most comments, then the oldest).
+
+    Returns:
+        int: Position of the canonical post within `posts`
+    """
+    links = [url_key(post.get('url')) for post in posts]
+    originals = [position for position, post in enumerate(posts)
+                 if any(link == f"t3_{post['id']}" and other['id'] != post['id']
+                        for link, other in zip(links, posts))]
+    return min(originals or range(len(posts)),
+               key=lambda position: (-(posts[position].get('score') or 0),
+                                     -(posts[position].get('num_comments') or 0),
+                                     posts[position].get('created_utc') or 0))
+
+
+def merge_comments(posts: List[Dict[str, Any]]) -> Any:
+    """
+    Merge the comment trees of duplicate posts into one.
+
+    Top-level threads of all posts are combined (a thread already present,
+    by comment ID, is kept once) and ordered by score. The result has the
+    representation of the first post's comments.
+
+    Args:
+        posts: Canonical post first, then its duplicates
+
+    Returns:
+        The merged comments, as a list of dicts or a CommentForest
+    """
+    seen = set()
+    threads = []
+    for post in posts:
+        for thread in as_dicts(post.get('comments', [])):
+            if thread.get('id') not in seen:
+                seen.add(thread.get('id'))
+                threads.append(thread)
+    threads.sort(key=lambda thread: -(thread.get('score') or 0))
+    if isinstance(posts[0].get('comments'), CommentForest):
+        return CommentForest.from_dicts(threads)
+    return threads
+
+
+def collapse_duplicates(results: Dict[str, List[Dict[str, Any]]], threshold: float = 0.6,
+                        merge: bool = True, db: Any = None
+                        ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+    """
+    Collapse every group of duplicate posts into its canonical post.
+
+    The canonical post stays where it was listed; its duplicates are removed.
+    It gains a `crossposts` list describing the removed posts and, when
+    `merge` is set, their comment threads (with `num_comments` summed).
+
+    Args:
+        results: Subreddit-to-posts mapping from the scraper (not modified)
+        threshold: Estimated Jaccard similarity at or above which two posts are duplicates
+        merge: Whether to merge the duplicates' comments into the canonical post
+        db: RedditDB holding the MinHash index (optional)
+
+    Returns:
+        Tuple[Dict, Dict[str, int]]: Deduplicated results and the run's dedup statistics
+    """
+    listed = [(subreddit, post) for subreddit, posts in results.items() for post in posts]
+    posts = [post for _, post in listed]
+    groups = find_duplicate_groups(posts, threshold, db)
+
+    replaced: Dict[int, Dict[str, Any]] = {}
+    removed = set()
+    stats = {'posts': len(posts), 'groups': len(groups), 'duplicates': 0,
+             'cross_subreddit_groups': 0, 'comments_merged': 0, 'largest_group': 0}
+    for group in groups:
+        members = [posts[position] for position in group]
+        canonical = group[choose_canonical(members)]
+        duplicates = [position for position in group if position != canonical]
+        ordered = [posts[canonical]] + [posts[position] for position in duplicates]
+
+        post = dict(posts[canonical])
+        post['crossposts'] = [
+            {'id': other['id'], 'subreddit': listed[position][0], 'url': other.get('url'),
+             'score': other.get('score'), 'num_comments': other.get('num_comments')}
+            for position, other in zip(duplicates, ordered[1:])
+        ]
+        if merge:
+            post['comments'] = merge_comments(ordered)
+            post['num_comments'] = (post.get('num_comments') or 0) + sum(
+                other.get('num_comments') or 0 for other in ordered[1:] if other['id'] != post['id'])
+            stats['comments_merged'] += len(post['comments']) - len(as_dicts(ordered[0].get('comments', [])))
+        replaced[canonical] = post
+        removed.update(duplicates)
+
+        stats['duplicates'] += len(duplicates)
+        stats['largest_group'] = max(stats['largest_group'], len(group))
+        if len({listed[position][0] for position in group}) > 1:
+            stats['cross_subreddit_groups'] += 1
+
+    collapsed: Dict[str, List[Dict[str, Any]]] = {subreddit: [] for subreddit in results}
+    for position, (subreddit, post) in enumerate(listed):
+        if position not in removed:
+            collapsed[subreddit].append(replaced.get(position, post))
+    stats['unique'] = stats['posts'] - stats['duplicates']
+    return collapsed, stats
+
+
+def iter_unique_posts(post_stream: Iterable[Tuple[str, Dict[str, Any]]], threshold: float = 0.6,
+                      db: Any = None, stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Drop the duplicates of posts already seen in a stream, yielding each post as it arrives.
+
+    A post is a duplicate when it is a crosspost of, shares a link with or is
+    near-identical to an earlier post of the stream. The first post of a group
+    is kept as it is: it was already yielded when its duplicates arrive, so
+    unlike `collapse_duplicates` no canonical post is chosen and no comments
+    are merged. Only the links and signatures of kept posts are held in memory.
+
+    Args:
+        post_stream: Subreddit name and post pairs
+        threshold: Estimated Jaccard similarity at or above which two posts are duplicates
+        db: RedditDB holding the MinHash index, used for the signatures of posts already in it (optional)
+        stats: Dictionary updated in place with the run's dedup statistics
+
+    Yields:
+        Tuple[str, Dict]: Subreddit name and post of every post that is not a duplicate
+    """
+    stats = stats if stats is not None else {}
+    stats.update(posts=0, unique=0, duplicates=0, groups=0, cross_subreddit_groups=0, largest_group=0)
+    kept_by_key: Dict[str, str] = {}
+    index = LSHIndex()
+    # Kept post ID -> its subreddit, group size and whether the group spans subreddits
+    kept: Dict[str, List[Any]] = {}
+
+    for subreddit, post in post_stream:
+        stats['posts'] += 1
+        keys = [key for key in (f"t3_{post['id']}", url_key(post.get('url'))) if key is not None]
+        original = next((kept_by_key[key] for key in keys if key in kept_by_key), None)
+        signature = None
+        if original is None:
+            signature = db.get_minhash_signatures([post['id']]).get(post['id']) if db is not None else None
+            if signature is None:
+                signature = minhash(post_text(post))
+            if signature is not None:
+                original = next(iter(index.query(signature, threshold)), None)
+
+        if original is not None:
+            group = kept[original]
+            group[1] += 1
+            stats['duplicates'] += 1
+            stats['groups'] += group[1] == 2
+            stats['largest_group'] = max(stats['largest_group'], group[1])
+            if group[0] != subreddit and not group[2]:
+                group[2] = True
+                stats['cross_subreddit_groups'] += 1
+            continue
+
+        for key in keys:
+            kept_by_key.setdefault(key, post['id'])
+        if signature is not None:
+            index.add(post['id'], signature)
+        kept[post['id']] = [subreddit, 1, False]
+        stats['unique'] += 1
+        yield subreddit, post
+
+
+def print_dedup_stats(stats: Dict[str, int]) -> None:
+    """Print a run's deduplication statistics."""
+    line = f"Dedup: {stats['posts']} posts -> {stats['unique']} unique, {stats['duplicates']} duplicates removed"
+    if 'groups' in stats:
+        line += (f" ({stats['groups']} groups, {stats['cross_subreddit_groups']} across subreddits, "
+                 f"largest {stats['largest_group']}")
+        if 'comments_merged' in stats:
+            line += f", {stats['comments_merged']} comment threads merged"
+        line += ")"
+    print(line)
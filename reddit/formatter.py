@@ -1,6 +1,28 @@
 import json
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, TextIO, Tuple, Union
 from datetime import datetime
+from .comment_tree import CommentForest, Comments, walk_comments
+
+def count_post_stats(post: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Count the comments and replies of a single post.
+    
+    Args:
+        post (Dict[str, Any]): Post data dictionary
+        
+    Returns:
+        Dict[str, int]: Statistics about the post
+    """
+    comments = post.get('comments', [])
+    if isinstance(comments, CommentForest):
+        return {'posts': 1, 'comments': len(comments.roots()), 'replies': comments.count_replies()}
+    
+    total = sum(1 for _ in walk_comments(comments))
+    return {
+        'posts': 1,
+        'comments': len(comments),
+        'replies': total - len(comments)
+    }
 
 def count_data_stats(results: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
     """
@@ -12,29 +34,30 @@ def count_data_stats(results: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]
     Returns:
         Dict[str, int]: Statistics about the data
     """
-    total_posts = 0
-    total_comments = 0
-    total_replies = 0
-    
-    def count_replies(comment: Dict[str, Any]) -> int:
-        replies_count = len(comment.get('replies', []))
-        for reply in comment.get('replies', []):
-            replies_count += count_replies(reply)
-        return replies_count
-    
+    stats = {'posts': 0, 'comments': 0, 'replies': 0}
     for subreddit, posts in results.items():
-        total_posts += len(posts)
         for post in posts:
-            comments = post.get('comments', [])
-            total_comments += len(comments)
-            for comment in comments:
-                total_replies += count_replies(comment)
+            for key, value in count_post_stats(post).items():
+                stats[key] += value
+    return stats
+
+def print_data_stats(stats: Dict[str, int], api_requests: int, requests_saved: int = 0) -> None:
+    """
+    Print the scrape statistics header.
     
-    return {
-        'posts': total_posts,
-        'comments': total_comments,
-        'replies': total_replies
-    }
+    Args:
+        stats (Dict[str, int]): Statistics from count_data_stats
+        api_requests (int): Number of API requests made while scraping
+        requests_saved (int): Number of API requests avoided while scraping
+    """
+    print(f"=== Reddit Data Scrape - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
+    print(f"Total Posts: {stats['posts']}")
+    print(f"Total Comments: {stats['comments']}")
+    print(f"Total Replies: {stats['replies']}")
+    print(f"Total API Requests: {api_requests}")
+    if requests_saved:
+        print(f"API Requests Saved: {requests_saved}")
+    print("\n" + "=" * 80 + "\n")
 
 def format_comment_tree(comment: Dict[str, Any], indent: int = 2) -> str:
     """
@@ -47,59 +70,170 @@ def format_comment_tree(comment: Dict[str, Any], indent: int = 2) -> str:
     Returns:
         str: Formatted comment tree as text
     """
-    indent_str = " " * indent
+    return format_comment_threads([comment], indent)[0]
+
+def format_comment_threads(comments: Comments, indent: int = 2) -> List[str]:
+    """
+    Format every top-level comment and its replies in a tree structure.
+    
+    Walks the tree iteratively, so it accepts nested comment dicts as well as a CommentForest.
+    
+    Args:
+        comments (Comments): Top-level comments with their replies
+        indent (int): Indentation level of top-level comments
+        
+    Returns:
+        List[str]: One formatted comment tree per top-level comment
+    """
+    threads = []
+    for depth, comment in walk_comments(comments):
+        indent_str = " " * (indent + 4 * depth)
+        block = (f"\n{indent_str}└─ {comment['body']}\n"
+                 f"{indent_str}   Score: {comment['score']} | Author: {comment['author']}")
+        if depth == 0:
+            threads.append([block])
+        else:
+            threads[-1].append(block)
+    return ["\n".join(blocks) for blocks in threads]
+
+def flatten_results(results: Dict[str, List[Dict[str, Any]]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Turn a subreddit-to-posts mapping into a stream of (subreddit, post) pairs.
+    
+    Args:
+        results (Dict[str, List[Dict]]): Scraped Reddit data
+        
+    Yields:
+        Tuple[str, Dict]: Subreddit name and post data
+    """
+    for subreddit, posts in results.items():
+        for post in posts:
+            yield subreddit, post
+
+def format_post_text(index: int, post: Dict[str, Any]) -> List[str]:
+    """
+    Format a single post and its comment threads as text lines.
+    
+    Args:
+        index (int): 1-based position of the post within its subreddit
+        post (Dict[str, Any]): Post data dictionary
+        
+    Returns:
+        List[str]: Formatted lines
+    """
     output = [
-        f"\n{indent_str}└─ {comment['body']}",
-        f"{indent_str}   Score: {comment['score']} | Author: {comment['author']}"
+        f"\n{index}. {post['title']}",
+        f"Score: {post['score']} | Comments: {post['num_comments']}",
+        f"URL: {post['url']}"
     ]
+    if post.get('crossposts'):
+        output.append("Also posted in: " + ", ".join(
+            f"r/{crosspost['subreddit']} ({crosspost['url']})" for crosspost in post['crossposts']
+        ))
+    output.append("\nComment thread:")
+    output.extend(format_comment_threads(post['comments']))
+    output.append("-" * 80)
+    return output
+
+def iter_format_reddit_data(post_stream: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[str]:
+    """
+    Format a stream of posts as text, one chunk at a time.
     
-    # Format replies recursively
-    for reply in comment.get('replies', []):
-        output.append(format_comment_tree(reply, indent + 4))
+    Joining the chunks gives the same text as format_reddit_data.
     
-    return "\n".join(output)
+    Args:
+        post_stream (Iterable[Tuple[str, Dict]]): Subreddit name and post pairs, grouped by subreddit
+        
+    Yields:
+        str: Formatted text chunks
+    """
+    current_subreddit = None
+    index = 0
+    first = True
+    for subreddit, post in post_stream:
+        lines = []
+        if subreddit != current_subreddit:
+            current_subreddit = subreddit
+            index = 0
+            lines.extend([f"\nTop posts from r/{subreddit}:", "-" * 80])
+        index += 1
+        lines.extend(format_post_text(index, post))
+        
+        chunk = "\n".join(lines)
+        yield chunk if first else "\n" + chunk
+        first = False
 
-def format_reddit_data(results: Dict[str, List[Dict[str, Any]]], api_requests: int) -> str:
+def format_reddit_data(results: Dict[str, List[Dict[str, Any]]], api_requests: int, requests_saved: int = 0) -> str:
     """
     Format the scraped Reddit data as a readable text string.
     
     Args:
         results (Dict[str, List[Dict]]): Scraped Reddit data
+        api_requests (int): Number of API requests made while scraping
+        requests_saved (int): Number of API requests avoided while scraping
         
     Returns:
         str: Formatted data as text
     """
-    output = []
-    stats = count_data_stats(results)
+    print_data_stats(count_data_stats(results), api_requests, requests_saved)
     
-    # Add timestamp and statistics header
-    print(f"=== Reddit Data Scrape - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
-    print(f"Total Posts: {stats['posts']}")
-    print(f"Total Comments: {stats['comments']}")
-    print(f"Total Replies: {stats['replies']}")
-    print(f"Total API Requests: {api_requests}")
-    print("\n" + "=" * 80 + "\n")
-    
-    # Format the data
+    output = []
     for subreddit, posts in results.items():
-        output.append(f"\nTop posts from r/{subreddit}:")
-        output.append("-" * 80)
-        
-        for i, post in enumerate(posts, 1):
-            output.extend([
-                f"\n{i}. {post['title']}",
-                f"Score: {post['score']} | Comments: {post['num_comments']}",
-                f"URL: {post['url']}",
-                "\nComment thread:"
-            ])
-            
-            for comment in post['comments']:
-                output.append(format_comment_tree(comment))
-            
+        if not posts:
+            # Subreddits without posts still get a heading
+            output.append(f"\nTop posts from r/{subreddit}:")
             output.append("-" * 80)
+        else:
+            output.append("".join(iter_format_reddit_data((subreddit, post) for post in posts)))
     
     return "\n".join(output)
 
+def format_post_json(subreddit: str, post: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Format a single post into the simplified JSON structure.
+    
+    Args:
+        subreddit (str): Subreddit name
+        post (Dict[str, Any]): Post data dictionary
+        
+    Returns:
+        Dict[str, Any]: Formatted post with comments
+    """
+    # Format comments using the same tree structure as the text format
+    comments_text = format_comment_threads(post.get('comments', []))
+    
+    formatted = {
+        'post_id': post['id'],
+        'post_content': post['title'] + "\n" + (post['selftext'] if post['selftext'] else ""),
+        'post_url': post['url'],
+        'score': post['score'],
+        'author': post['author'],
+        'created_utc': post['created_utc'],
+        'num_comments': post['num_comments'],
+        'subreddit': subreddit,
+        'comments': '\n'.join(comments_text)
+    }
+    if post.get('crossposts'):
+        # Duplicates collapsed into this post (see dedup.collapse_duplicates)
+        formatted['crossposts'] = [
+            {'post_id': crosspost['id'], 'subreddit': crosspost['subreddit'], 'post_url': crosspost['url']}
+            for crosspost in post['crossposts']
+        ]
+    return formatted
+
+def iter_format_json_data(post_stream: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """
+    Format a stream of posts into the simplified JSON structure, one post at a time.
+    
+    Args:
+        post_stream (Iterable[Tuple[str, Dict]]): Subreddit name and post pairs
+        
+    Yields:
+        Dict[str, Any]: Formatted post with comments
+    """
+    for subreddit, post in post_stream:
+        yield format_post_json(subreddit, post)
+
 def format_json_data(results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
     """
     Format the scraped Reddit data into a simplified JSON structure.
@@ -110,57 +244,103 @@ def format_json_data(results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str,
     Returns:
         List[Dict]: List of formatted posts with comments
     """
-    formatted_posts = []
-    
-    for subreddit, posts in results.items():
-        for post in posts:
-            # Format comments using the same tree structure as the text format
-            comments_text = []
-            for comment in post.get('comments', []):
-                comments_text.append(format_comment_tree(comment))
-            
-            # Create the formatted post entry
-            formatted_post = {
-                'post_id': post['id'],
-                'post_content': post['title'] + "\n" + (post['selftext'] if post['selftext'] else ""),
-                'post_url': post['url'],
-                'score': post['score'],
-                'author': post['author'],
-                'created_utc': post['created_utc'],
-                'num_comments': post['num_comments'],
-                'subreddit': subreddit,
-                'comments': '\n'.join(comments_text)
-            }
-            formatted_posts.append(formatted_post)
-    
-    return formatted_posts
-
-def save_to_file(data: str, filename: str):
+    return list(iter_format_json_data(flatten_results(results)))
+
+def save_to_file(data: Union[str, Iterable[str]], filename: str):
     """
     Save formatted data to a text file.
     
     Args:
-        data (str): Formatted data to save
+        data (Union[str, Iterable[str]]): Formatted data, or text chunks written as they arrive
         filename (str): Name of the file to save to
     """
     try:
         with open(filename, 'w', encoding='utf-8') as f:
-            f.write(data)
+            if isinstance(data, str):
+                f.write(data)
+            else:
+                for chunk in data:
+                    f.write(chunk)
         print(f"Data successfully saved to {filename}")
     except Exception as e:
         print(f"Error saving data to file: {str(e)}")
 
-def save_json_to_file(data: List[Dict[str, Any]], filename: str):
+class JsonArrayWriter:
+    """
+    Write items to an open file as a JSON array, one item at a time.
+    
+    The output is identical to json.dump(items, f, indent=2, ensure_ascii=False).
+    """
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.count = 0
+        self.f.write("[")
+    
+    def write(self, item: Any) -> None:
+        """Append one item to the array."""
+        self.f.write("\n" if self.count == 0 else ",\n")
+        item_json = json.dumps(item, indent=2, ensure_ascii=False)
+        self.f.write("\n".join("  " + line for line in item_json.split("\n")))
+        self.count += 1
+    
+    def close(self) -> None:
+        """Terminate the array."""
+        self.f.write("]" if self.count == 0 else "\n]")
+
+def save_json_to_file(data: Union[List[Dict[str, Any]], Dict[str, Any], Iterator[Any]], filename: str):
     """
     Save data as JSON file.
     
     Args:
-        data (List[Dict]): Data to save
+        data (Union[List[Dict], Dict, Iterator]): Data to save. Iterators are written
+            as a JSON array while they are consumed.
         filename (str): Name of the file to save to
     """
     try:
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+            if isinstance(data, (list, dict)):
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            else:
+                writer = JsonArrayWriter(f)
+                for item in data:
+                    writer.write(item)
+                writer.close()
         print(f"JSON data successfully saved to {filename}")
     except Exception as e:
         print(f"Error saving JSON data to file: {str(e)}")
+
+def stream_reddit_data(post_stream: Iterable[Tuple[str, Dict[str, Any]]], text_filename: str, json_filename: str) -> Dict[str, int]:
+    """
+    Write the text and JSON outputs from a single pass over a stream of posts.
+    
+    Only the post currently being written is held in memory.
+    
+    Args:
+        post_stream (Iterable[Tuple[str, Dict]]): Subreddit name and post pairs, grouped by subreddit
+        text_filename (str): Name of the text file to save to
+        json_filename (str): Name of the JSON file to save to
+        
+    Returns:
+        Dict[str, int]: Statistics about the streamed data
+    """
+    stats = {'posts': 0, 'comments': 0, 'replies': 0}
+    
+    with open(text_filename, 'w', encoding='utf-8') as text_file, \
+         open(json_filename, 'w', encoding='utf-8') as json_file:
+        json_writer = JsonArrayWriter(json_file)
+        
+        def written(stream):
+            # Count and write each post's JSON entry as it passes through to the text formatter
+            for subreddit, post in stream:
+                for key, value in count_post_stats(post).items():
+                    stats[key] += value
+                json_writer.write(format_post_json(subreddit, post))
+                yield subreddit, post
+        
+        for chunk in iter_format_reddit_data(written(post_stream)):
+            text_file.write(chunk)
+        json_writer.close()
+    
+    print(f"Data successfully saved to {text_filename}")
+    print(f"JSON data successfully saved to {json_filename}")
+    return stats
@@ -0,0 +1,88 @@
+"""
+Shared OpenAI client construction for every LLM call site
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+from openai import AsyncOpenAI, OpenAI
+from .cassette import get_async_openai_cassette, get_openai_cassette
+from .llm_cache import CachedAsyncOpenAI, CachedOpenAI, get_llm_cache
+from .utils import load_config
+
+
+def get_openai_client() -> Any:
+    """
+    Get the OpenAI client used by the pipeline.
+    
+    Returns a cassette client when the `cassette` config block is set to
+    record or replay, otherwise a regular OpenAI client. Either is wrapped in
+    the response cache when `llm_cache.enabled` is set.
+    
+    Returns:
+        OpenAI client, or a CassetteOpenAI/CachedOpenAI exposing the same `parse` calls
+    """
+    client = get_openai_cassette() or OpenAI()
+    cache = get_llm_cache()
+    return CachedOpenAI(client, cache) if cache is not None else client
+
+
+def get_async_openai_client() -> Any:
+    """
+    Get the async OpenAI client used by the async summarization mode.
+    
+    The client is bound to the event loop it is first used on, so create one
+    per `asyncio.run` and close it before the loop ends.
+    
+    Returns:
+        AsyncOpenAI client, or a CassetteAsyncOpenAI/CachedAsyncOpenAI exposing the same awaitable `parse` calls
+    """
+    client = get_async_openai_cassette() or AsyncOpenAI()
+    cache = get_llm_cache()
+    return CachedAsyncOpenAI(client, cache) if cache is not None else client
+
+
+def get_async_settings() -> Dict[str, Any]:
+    """
+    Get the async summarization settings from the `summarizer.async` config block.
+    
+    Returns:
+        Dict[str, Any]: `enabled` and `max_concurrency` (requests in flight at once)
+    """
+    settings = load_config()["summarizer"].get("async", {})
+    return {
+        "enabled": settings.get("enabled", False),
+        "max_concurrency": max(1, settings.get("max_concurrency", 4))
+    }
+
+
+def run_concurrently(requests: List[Callable[[Any], Awaitable[Any]]],
+                     max_concurrency: int = 4,
+                     client: Any = None) -> List[Any]:
+    """
+    Run async LLM calls on one event loop with at most `max_concurrency` in flight.
+    
+    A failing call does not cancel the others: its exception is returned in
+    its place, so callers can handle each result like a per-item try/except.
+    
+    Args:
+        requests: Functions taking the async client and returning a coroutine
+        max_concurrency: Maximum number of calls awaiting a response at once
+        client: Async client to use (default: a new `get_async_openai_client()`, closed afterwards)
+        
+    Returns:
+        List[Any]: Result or raised exception of each request, in the order of `requests`
+    """
+    async def run() -> List[Any]:
+        async_client = client or get_async_openai_client()
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def bounded(request):
+            async with semaphore:
+                return await request(async_client)
+        
+        try:
+            return await asyncio.gather(*(bounded(request) for request in requests), return_exceptions=True)
+        finally:
+            if client is None:
+                await async_client.close()
+    
+    return asyncio.run(run())
@@ -0,0 +1,304 @@
+"""
+Persistent, content-addressed cache of structured OpenAI completions
+
+Responses are stored in SQLite under the hash of the model, messages and
+response schema (`completion_key`), so re-running the pipeline after a crash or
+with the same inputs serves earlier answers instead of paying for them again.
+Entries expire after a TTL and the least recently used ones are evicted once
+the cache grows past its size limit.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from .utils import completion_key, load_config, recorded_completion, replayed_completion
+
+
+class LLMCache:
+    """
+    A SQLite store of completions keyed by request hash.
+
+    Lookups refresh an entry's `last_used` time; writes evict expired entries
+    and then the least recently used ones until the total stored size fits in
+    `max_bytes`. Safe to share between threads.
+    """
+    def __init__(self, path: str = "llm_cache.db", ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, bypass: bool = False):
+        """
+        Args:
+            path: Path to the SQLite database
+            ttl: Seconds an entry stays valid (None keeps entries until evicted)
+            max_bytes: Maximum total size of stored responses (None for no limit)
+            bypass: Skip lookups so every request reaches the API; responses are still stored
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'bypassed': 0, 'writes': 0, 'evicted': 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions(last_used);
+            CREATE INDEX IF NOT EXISTS idx_completions_created_at ON completions(created_at);
+        ''')
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, Any]], response_format: Any, **kwargs) -> str:
+        """
+        Build the cache key of a request.
+
+        Extra request parameters (temperature, seed, ...) are part of the key
+        so differently sampled requests never share an entry.
+        """
+        key = completion_key(model, messages, response_format)
+        if kwargs:
+            extra = json.dumps(kwargs, sort_keys=True, default=str)
+            key = hashlib.sha256((key + extra).encode("utf-8")).hexdigest()
+        return key
+
+    def get(self, key: str, response_format: Any) -> Optional[SimpleNamespace]:
+        """
+        Look up a cached completion.
+
+        Args:
+            key: Cache key from `LLMCache.key`
+            response_format: Pydantic model to rebuild the parsed response with
+
+        Returns:
+            Optional[SimpleNamespace]: The completion shaped like a ParsedChatCompletion, or None on a miss
+        """
+        with self._lock:
+            if self.bypass:
+                self._stats['bypassed'] += 1
+                return None
+
+            now = time.time()
+            row = self.conn.execute(
+                "SELECT response, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and row[1] < now - self.ttl:
+                self.conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._stats['expired'] += 1
+                row = None
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+
+            try:
+                completion = replayed_completion(response_format, json.loads(row[0]))
+            except Exception:
+                # Stored under an older version of the schema class; fetch it again
+                self._stats['misses'] += 1
+                return None
+            self.conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self._stats['hits'] += 1
+            return completion
+
+    def put(self, key: str, model: str, response: Any) -> None:
+        """
+        Store a completion, then evict expired and least recently used entries.
+
+        Responses without a parsed result (refusals) are not cached.
+
+        Args:
+            key: Cache key from `LLMCache.key`
+            model: Model that produced the response
+            response: ParsedChatCompletion (or an equivalent) returned by `parse`
+        """
+        recorded = recorded_completion(model, response)
+        if recorded["parsed"] is None:
+            return
+        payload = json.dumps(recorded, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, payload, len(payload.encode("utf-8")), now, now)
+            )
+            self._stats['writes'] += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the least recently used ones beyond `max_bytes`."""
+        evicted = 0
+        if self.ttl is not None:
+            evicted += self.conn.execute(
+                "DELETE FROM completions WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        if self.max_bytes is not None:
+            evicted += self.conn.execute('''
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running
+                        FROM completions
+                    ) WHERE running > ?
+                )
+            ''', (self.max_bytes,)).rowcount
+        self._stats['evicted'] += evicted
+
+    def clear(self) -> int:
+        """Delete every entry and return how many there were."""
+        with self._lock:
+            return self.conn.execute("DELETE FROM completions").rowcount
+
+    def purge(self) -> int:
+        """Delete expired entries and enforce the size limit; returns the number of entries removed."""
+        with self._lock:
+            before = self._stats['evicted']
+            self._evict(time.time())
+            return self._stats['evicted'] - before
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics for this process and the stored totals.
+
+        Returns:
+            Dict[str, Any]: Hits, misses, expired, bypassed lookups, writes,
+            evictions and hit rate, plus stored entries and bytes
+        """
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['entries'] = entries
+        stats['bytes'] = size
+        return stats
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self.conn.close()
+
+
+class _CachedParseEndpoint:
+    """Stand-in for `client.beta.chat.completions` that serves `parse` calls from the cache."""
+    def __init__(self, cache: LLMCache, completions: Any):
+        self._cache = cache
+        self._completions = completions
+
+    def parse(self, *, model: str, messages: List[Dict[str, Any]], response_format: Any, **kwargs):
+        key = LLMCache.key(model, messages, response_format, **kwargs)
+        cached = self._cache.get(key, response_format)
+        if cached is not None:
+            return cached
+        response = self._completions.parse(model=model, messages=messages, response_format=response_format, **kwargs)
+        self._cache.put(key, model, response)
+        return response
+
+
+class _AsyncCachedParseEndpoint(_CachedParseEndpoint):
+    """
+    Async stand-in for `client.beta.chat.completions`, sharing the same cache.
+
+    Cache reads and writes (including eviction) run in a worker thread so the
+    SQLite calls never block the event loop.
+    """
+    async def parse(self, *, model: str, messages: List[Dict[str, Any]], response_format: Any, **kwargs):
+        key = LLMCache.key(model, messages, response_format, **kwargs)
+        cached = await asyncio.to_thread(self._cache.get, key, response_format)
+        if cached is not None:
+            return cached
+        response = await self._completions.parse(model=model, messages=messages, response_format=response_format, **kwargs)
+        await asyncio.to_thread(self._cache.put, key, model, response)
+        return response
+
+
+class CachedOpenAI:
+    """
+    An OpenAI client wrapper exposing `beta.chat.completions.parse` and
+    `chat.completions.parse`, answering repeated requests from an LLMCache.
+    """
+    _endpoint = _CachedParseEndpoint
+
+    def __init__(self, client: Any, cache: LLMCache):
+        self.client = client
+        self.cache = cache
+        completions = self._endpoint(cache, client.beta.chat.completions)
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=self.chat)
+
+
+class CachedAsyncOpenAI(CachedOpenAI):
+    """The AsyncOpenAI counterpart of CachedOpenAI: `parse` is awaitable."""
+    _endpoint = _AsyncCachedParseEndpoint
+
+    async def close(self) -> None:
+        """Close the wrapped client."""
+        await self.client.close()
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache_settings() -> Dict[str, Any]:
+    """
+    Get the cache settings from the `llm_cache` config block.
+
+    Returns:
+        Dict[str, Any]: enabled, path, ttl in seconds, max_bytes and bypass
+    """
+    settings = load_config().get("llm_cache", {})
+    ttl_hours = settings.get("ttl_hours")
+    max_size_mb = settings.get("max_size_mb")
+    return {
+        "enabled": settings.get("enabled", False),
+        "path": settings.get("path", "llm_cache.db"),
+        "ttl": ttl_hours * 3600 if ttl_hours is not None else None,
+        "max_bytes": int(max_size_mb * 1024 * 1024) if max_size_mb is not None else None,
+        "bypass": settings.get("bypass", False)
+    }
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Get the process-wide cache shared by every LLM call site.
+
+    Returns:
+        Optional[LLMCache]: The cache, or None when `llm_cache.enabled` is false
+    """
+    global _cache
+    settings = get_cache_settings()
+    if not settings["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(settings["path"], settings["ttl"], settings["max_bytes"], settings["bypass"])
+        return _cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clean the LLM response cache")
+    parser.add_argument("command", choices=["stats", "purge", "clear"],
+                        help="stats: show stored totals; purge: drop expired/over-size entries; clear: drop everything")
+    args = parser.parse_args()
+
+    settings = get_cache_settings()
+    cache = LLMCache(settings["path"], settings["ttl"], settings["max_bytes"])
+    try:
+        if args.command == "purge":
+            print(f"Removed {cache.purge():,} entries")
+        elif args.command == "clear":
+            print(f"Removed {cache.clear():,} entries")
+        stats = cache.stats()
+        print(f"{stats['entries']:,} entries, {stats['bytes']:,} bytes in {settings['path']}")
+    finally:
+        cache.close()
@@ -1,5 +1,6 @@
-from .utils import load_config
+from .utils import load_config, TopicRecommendations
 from .reddit_scraper import RedditScraper
+from .db import RedditDB
 from .sys_prompt_generator import SystemPromptGenerator
 from .create_user_profile import UserProfile
 # from .prompts.examples.topic_recommender_prompt import SYSTEM_MESSAGE as TOPIC_RECOMMENDER_MESSAGE
@@ -8,27 +9,224 @@ from .create_user_profile import UserProfile
 from .formatter import (
     format_reddit_data,
     format_json_data,
+    print_data_stats,
     save_to_file,
-    save_json_to_file
+    save_json_to_file,
+    stream_reddit_data
 )
 from .topic_rec import TopicRecommender
 from .post_summarizer import PostSummarizer
+from .batch import get_batch_settings
+from .llm import get_async_settings
+from .llm_cache import get_llm_cache
 from .comment_summarizer import CommentSummarizer
+from .comment_tree import as_dicts
+from .pipeline import Pipeline, PipelineError, Stage, get_pipeline_settings
+from .dedup import collapse_duplicates, get_dedup_settings, iter_unique_posts, print_dedup_stats
+import argparse
+import json
 import time
 import os
+from typing import Any, Dict, Iterable, List
 from .to_md import json_to_markdown
 
-def main():
+def write_scraped_results(results: Dict[str, List[Dict[str, Any]]], api_requests: int,
+                          requests_saved: int, filename: str) -> None:
     """
-    Main function to demonstrate usage of the RedditScraper class
-    and formatting utilities.
+    Save (deduplicated) scrape results with their comment trees, for the formatting stages.
+    
+    Args:
+        results (Dict[str, List[Dict]]): Subreddit-to-posts mapping
+        api_requests (int): API requests made by the scrape
+        requests_saved (int): Requests avoided by the scrape
+        filename (str): Name of the JSON file to save to
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({
+            'api_requests': api_requests,
+            'requests_saved': requests_saved,
+            'results': {
+                subreddit: [dict(post, comments=as_dicts(post.get('comments', []))) for post in posts]
+                for subreddit, posts in results.items()
+            }
+        }, f, ensure_ascii=False)
+
+def load_scraped_results(filename: str) -> Dict[str, Any]:
+    """Load scrape results saved by `write_scraped_results`."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def build_stages(config: Dict[str, Any]) -> List[Stage]:
+    """
+    Describe the scrape-to-markdown pipeline as stages with their inputs and outputs.
+    
+    The scrape is written to `paths.scraped_results`, from which the text and
+    JSON outputs are formatted in parallel; topic recommendation only waits
+    for the JSON. The scrape counts as current for
+    `pipeline.scrape_max_age_hours`. In streaming mode the scrape writes the
+    text and JSON outputs itself.
+    
+    Args:
+        config (Dict[str, Any]): Loaded configuration
+        
+    Returns:
+        List[Stage]: The stages
+    """
+    paths = config["paths"]
+    db_path = paths.get("database", "reddit_data.db")
+    prompts = paths["generated_prompts"]
+    streaming = config["scraping"].get("streaming", False)
+    dedup = get_dedup_settings()
+    
+    def scrape(context):
+        # The scraper's database is committed and closed when the block exits
+        with RedditScraper(db_path=db_path) as scraper:
+            if streaming:
+                # Write text and JSON outputs post by post as the scraper yields them
+                posts = scraper.iter_all_subreddits()
+                dedup_stats = {}
+                if dedup["enabled"]:
+                    # Posts are checked as they arrive; later duplicates are dropped without merging comments
+                    posts = iter_unique_posts(posts, dedup["threshold"], scraper.db, dedup_stats)
+                stats = stream_reddit_data(
+                    posts,
+                    paths["reddit_data_txt"],
+                    paths["reddit_data_json"]
+                )
+                print_data_stats(stats, scraper.api_requests, scraper.requests_saved)
+                if dedup_stats:
+                    print_dedup_stats(dedup_stats)
+                return
+            
+            results = scraper.scrape_all_subreddits()
+            if dedup["enabled"]:
+                # Collapse crossposts and near-duplicates before anything is formatted or sent to the LLM
+                results, dedup_stats = collapse_duplicates(
+                    results, dedup["threshold"], dedup["merge_comments"], scraper.db
+                )
+                print_dedup_stats(dedup_stats)
+            context["results"] = results
+            write_scraped_results(results, scraper.api_requests, scraper.requests_saved,
+                                  paths["scraped_results"])
+    
+    def format_text(context):
+        scraped = load_scraped_results(paths["scraped_results"])
+        formatted_data = format_reddit_data(scraped["results"], scraped["api_requests"], scraped["requests_saved"])
+        save_to_file(formatted_data, paths["reddit_data_txt"])
+    
+    def format_json(context):
+        json_data = format_json_data(load_scraped_results(paths["scraped_results"])["results"])
+        save_json_to_file(json_data, paths["reddit_data_json"])
+    
+    def recommend_topics(context):
+        topic_recommender = TopicRecommender(paths["reddit_data_json"], db_path=db_path)
+        topics = topic_recommender.recommend_topics()
+        save_json_to_file(topics, paths["topic_recommendations"])
+    
+    def summarize_posts(context):
+        post_summarizer = PostSummarizer(
+            content_path=paths["reddit_data_json"],
+            theme_path=paths["topic_recommendations"]
+        )
+        
+        # Summaries are merged into the file by theme, so start from an empty one
+        # to drop themes of earlier runs
+        if os.path.exists(paths["theme_summaries"]):
+            os.remove(paths["theme_summaries"])
+        
+        themes = TopicRecommendations(paths["topic_recommendations"]).get_themes()
+        print(f"Processing {len(themes)} themes...")
+        batch_mode = get_batch_settings()["enabled"]
+        failed = 0
+        if themes and (batch_mode or get_async_settings()["enabled"]):
+            # Themes are summarized concurrently or as one batch; failures are reported per theme
+            results = post_summarizer.summarize_themes(range(len(themes)), batch=batch_mode)
+            failed = results.count(None)
+        else:
+            for theme_index in range(len(themes)):
+                try:
+                    theme = themes[theme_index]
+                    print(f"Summarizing theme {theme_index + 1}/{len(themes)}: {theme['theme']}")
+                    post_summarizer.summarize_theme_posts(theme_index)
+                except Exception as e:
+                    print(f"Error summarizing theme {theme_index}: {str(e)}")
+                    failed += 1
+        if failed:
+            # Not checkpointed, so the next run retries (finished themes come from the LLM cache)
+            raise PipelineError(f"{failed} of {len(themes)} themes could not be summarized")
+    
+    def summarize_comments(context):
+        comment_summarizer = CommentSummarizer(
+            summaries_path=paths["theme_summaries"],
+            output_path=paths["comment_summaries"],
+            db_path=db_path,
+            scraped_results=context.get("results")
+        )
+        summaries = comment_summarizer.summarize_comments()
+        if summaries is None:
+            raise PipelineError(f"Could not load {paths['theme_summaries']}")
+        with open(paths["theme_summaries"], "r") as f:
+            themes = json.load(f)
+        missing = len(themes) - len(summaries)
+        if missing:
+            # Themes without comments or whose summary failed; not checkpointed, so the next run retries
+            raise PipelineError(f"{missing} of {len(themes)} themes have no comment summary")
+    
+    def topics_params():
+        params = {key: config.get(key) for key in ("topic_recommender", "trending", "batch")}
+        if config.get("trending", {}).get("enabled", False) and os.path.exists(db_path):
+            # Trend ranking reads the database's time series, which is not a file input
+            with RedditDB(db_path) as db:
+                params["metrics"] = db.get_metrics_version()
+        return params
+    
+    def write_markdown(context):
+        json_to_markdown(paths["comment_summaries"], "abstract.md")
+    
+    scrape_outputs = (paths["reddit_data_txt"], paths["reddit_data_json"]) if streaming else (paths["scraped_results"],)
+    stages = [
+        Stage("scrape", scrape, outputs=scrape_outputs,
+              params={key: config.get(key) for key in ("subreddits", "scraping", "dedup")},
+              max_age_hours=get_pipeline_settings()["scrape_max_age_hours"])
+    ]
+    if not streaming:
+        stages += [
+            Stage("format_text", format_text, inputs=(paths["scraped_results"],), outputs=(paths["reddit_data_txt"],)),
+            Stage("format_json", format_json, inputs=(paths["scraped_results"],), outputs=(paths["reddit_data_json"],))
+        ]
+    stages += [
+        Stage("topics", recommend_topics,
+              inputs=(paths["reddit_data_json"], os.path.join(prompts, "topic_recommender_prompt.txt")),
+              outputs=(paths["topic_recommendations"],),
+              params=topics_params),
+        Stage("post_summaries", summarize_posts,
+              inputs=(paths["reddit_data_json"], paths["topic_recommendations"],
+                      os.path.join(prompts, "post_summarizer_prompt.txt")),
+              outputs=(paths["theme_summaries"],),
+              params=config["summarizer"].get("post")),
+        Stage("comment_summaries", summarize_comments,
+              inputs=(paths["theme_summaries"], os.path.join(prompts, "comment_summarizer_prompt.txt")),
+              outputs=(paths["comment_summaries"],),
+              params=config["summarizer"].get("comment")),
+        Stage("markdown", write_markdown, inputs=(paths["comment_summaries"],), outputs=("abstract.md",),
+              params=config["scraping"].get("time_filter"))
+    ]
+    return stages
+
+def main(force: Iterable[str] = ()):
+    """
+    Run the pipeline from scraping to the markdown digest.
+    
+    Stages whose inputs did not change since their last successful run are
+    skipped, so a run after a failure resumes from the stage that failed.
+    
+    Args:
+        force (Iterable[str]): Stages to run even if they are up to date ("all" for every stage)
     """
     start = time.time()
     # Load configuration
     config = load_config()
-    paths = config["paths"]
-
-
+    
     
     # Generate and save user profile
     # user_profile = UserProfile(**config["user_profile"])
@@ -45,61 +243,29 @@ def main():
     # post_prompt = post_generator.generate_prompt(save_as="post_summarizer_prompt.txt")
     # comment_prompt = comment_generator.generate_prompt(save_as="comment_summarizer_prompt.txt")
     
-    # Initialize and run the scraper
-    scraper = RedditScraper()
-    results = scraper.scrape_all_subreddits()
-    
-    # Save formatted text data
-    formatted_data = format_reddit_data(results, scraper.api_requests)
-    save_to_file(formatted_data, paths["reddit_data_txt"])
-    
-    # Save JSON data
-    json_data = format_json_data(results)
-    save_json_to_file(json_data, paths["reddit_data_json"])
-    
-    # Get topic recommendations
-    topic_recommender = TopicRecommender(paths["reddit_data_json"])
-    topics = topic_recommender.recommend_topics()
-    
-    # Save topic recommendations
-    save_json_to_file(topics, paths["topic_recommendations"])
-    
-    # Generate post summaries for each theme
-    post_summarizer = PostSummarizer(
-        content_path=paths["reddit_data_json"],
-        theme_path=paths["topic_recommendations"]
-    )
-    
-    # Clear existing theme summaries to avoid duplicates
-    if os.path.exists(paths["theme_summaries"]):
-        os.remove(paths["theme_summaries"])
-    
-    # Generate summaries for all themes
-    themes = topics.get("themes", [])
-    print(f"Processing {len(themes)} themes...")
-    for theme_index in range(len(themes)):
-        try:
-            theme = themes[theme_index]
-            print(f"Summarizing theme {theme_index + 1}/{len(themes)}: {theme['theme']}")
-            post_summarizer.summarize_theme_posts(theme_index)
-        except Exception as e:
-            print(f"Error summarizing theme {theme_index}: {str(e)}")
-            continue
-            
-    # Generate comment summaries for each theme
-    comment_summarizer = CommentSummarizer(
-        summaries_path=paths["theme_summaries"],
-        output_path=paths["comment_summaries"]
-    )
-    comment_summarizer.summarize_comments()
-
-    # Convert JSON to markdown
-    json_to_markdown()
-
-    print("Markdown created. Process completed successfully!")
+    stages = build_stages(config)
+    settings = get_pipeline_settings()
+    pipeline = Pipeline(stages, settings["state_path"], settings["max_workers"])
+    outcomes = pipeline.run(force)
+    
+    failed = [name for name, outcome in outcomes.items() if outcome == "failed"]
+    if failed:
+        print(f"Stages failed: {', '.join(failed)}. Re-run to resume from the last completed stage.")
+    else:
+        print("Markdown created. Process completed successfully!")
+    
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        cache_stats = llm_cache.stats()
+        print(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries stored")
         
     end = time.time()
     print(f"Execution time: {end - start:.2f} seconds")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape, summarize and write the Reddit digest")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE",
+                        help="Run these stages even if their inputs did not change ('all' for every stage)")
+    args = parser.parse_args()
+    main(args.force)
@@ -0,0 +1,216 @@
+"""
+Stage-level pipeline runner with content-hash checkpoints
+
+Each stage declares the files it reads and writes, the stages it runs after
+and the configuration it depends on. Before a stage runs, its inputs and
+configuration are fingerprinted by content hash; a stage whose fingerprint
+matches its last successful run, and whose outputs are still as that run left
+them, is skipped. Checkpoints are saved after every stage, so a run that fails
+part-way resumes from the last stage that completed. Stages whose
+dependencies are all done run in parallel.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from .utils import load_config
+
+
+class PipelineError(Exception):
+    """Raised for an invalid pipeline, or by a stage to mark its run as failed."""
+
+
+class Stage(NamedTuple):
+    """One step of a pipeline."""
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    after: Tuple[str, ...] = ()
+    params: Any = None
+    max_age_hours: Optional[float] = None
+
+
+def get_pipeline_settings() -> Dict[str, Any]:
+    """
+    Get the pipeline settings from the `pipeline` config block.
+
+    Returns:
+        Dict[str, Any]: state_path, max_workers and scrape_max_age_hours
+    """
+    settings = load_config().get("pipeline", {})
+    return {
+        "state_path": settings.get("state_path", "pipeline_state.json"),
+        "max_workers": settings.get("max_workers", 2),
+        "scrape_max_age_hours": settings.get("scrape_max_age_hours", 6)
+    }
+
+
+def file_hash(path: str) -> Optional[str]:
+    """SHA-256 of a file's content, or None when the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """
+    Runs stages in dependency order, skipping those whose inputs did not change.
+
+    A stage depends on the stages listed in its `after` and on every stage
+    that writes one of its inputs. Checkpoints (fingerprint, output hashes and
+    finish time per stage) are kept in a JSON state file.
+    """
+    def __init__(self, stages: List[Stage], state_path: str = "pipeline_state.json", max_workers: int = 2):
+        """
+        Args:
+            stages: Stages of the pipeline
+            state_path: JSON file holding the checkpoints
+            max_workers: Maximum number of stages running at once
+
+        Raises:
+            PipelineError: If stage names repeat, a dependency is unknown or dependencies form a cycle
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise PipelineError("Stage names must be unique")
+        self.state_path = state_path
+        self.max_workers = max(1, max_workers)
+
+        writers = {output: stage.name for stage in stages for output in stage.outputs}
+        self.dependencies: Dict[str, set] = {}
+        for stage in stages:
+            unknown = [name for name in stage.after if name not in self.stages]
+            if unknown:
+                raise PipelineError(f"Stage {stage.name} runs after unknown stages: {', '.join(unknown)}")
+            self.dependencies[stage.name] = set(stage.after) | {
+                writers[path] for path in stage.inputs if path in writers and writers[path] != stage.name
+            }
+        self.order = self.topological_order()
+
+    def topological_order(self) -> List[str]:
+        """Stage names with every stage after its dependencies (ties keep declaration order)."""
+        order: List[str] = []
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if dependencies <= set(order)]
+            if not ready:
+                raise PipelineError(f"Stages depend on each other in a cycle: {', '.join(remaining)}")
+            order.extend(ready)
+            for name in ready:
+                del remaining[name]
+        return order
+
+    def fingerprint(self, stage: Stage) -> str:
+        """
+        Hash of a stage's name, parameters and current input contents.
+
+        Callable parameters are called here, just before the stage would run,
+        so they can describe state that earlier stages change (a database, say).
+        """
+        payload = {
+            "stage": stage.name,
+            "params": stage.params() if callable(stage.params) else stage.params,
+            "inputs": {path: file_hash(path) for path in stage.inputs}
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def is_current(self, stage: Stage, fingerprint: str, checkpoint: Optional[Dict[str, Any]]) -> bool:
+        """Whether a stage's checkpoint still holds for this fingerprint and its outputs."""
+        if checkpoint is None or checkpoint["fingerprint"] != fingerprint:
+            return False
+        if stage.max_age_hours is not None and time.time() - checkpoint["finished_at"] > stage.max_age_hours * 3600:
+            return False
+        return all(file_hash(path) == checkpoint["outputs"].get(path) for path in stage.outputs)
+
+    def run(self, force: Iterable[str] = (), context: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        """
+        Run every stage that is not up to date.
+
+        A failing stage is reported and its dependents are not run; stages
+        that do not depend on it still run.
+
+        Args:
+            force: Names of stages to run even if they are up to date ("all" forces every stage)
+            context: Dictionary shared by the stages to pass in-memory results along
+
+        Returns:
+            Dict[str, str]: Outcome per stage in dependency order: "ran",
+            "skipped", "failed" or "blocked"
+        """
+        force = set(force)
+        unknown = force - set(self.stages) - {"all"}
+        if unknown:
+            raise PipelineError(f"Unknown stages: {', '.join(sorted(unknown))}")
+        context = context if context is not None else {}
+        state = self.load_state()
+        outcomes: Dict[str, str] = {}
+        running: Dict[Any, Tuple[str, str, float]] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(outcomes) < len(self.order):
+                for name in self.order:
+                    if name in outcomes or any(task[0] == name for task in running.values()):
+                        continue
+                    dependencies = self.dependencies[name]
+                    if any(outcomes.get(dependency) in ("failed", "blocked") for dependency in dependencies):
+                        outcomes[name] = "blocked"
+                        print(f"Stage {name}: not run (an earlier stage failed)")
+                        continue
+                    if not all(dependency in outcomes for dependency in dependencies):
+                        continue
+                    stage = self.stages[name]
+                    fingerprint = self.fingerprint(stage)
+                    if "all" not in force and name not in force and self.is_current(stage, fingerprint, state.get(name)):
+                        outcomes[name] = "skipped"
+                        print(f"Stage {name}: up to date, skipped")
+                        continue
+                    print(f"Stage {name}: running")
+                    running[executor.submit(stage.run, context)] = (name, fingerprint, time.perf_counter())
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, fingerprint, started = running.pop(future)
+                    elapsed = time.perf_counter() - started
+                    try:
+                        future.result()
+                        missing = [path for path in self.stages[name].outputs if not os.path.exists(path)]
+                        if missing:
+                            raise PipelineError(f"Outputs not written: {', '.join(missing)}")
+                    except Exception as e:
+                        outcomes[name] = "failed"
+                        state.pop(name, None)
+                        print(f"Stage {name}: failed after {elapsed:.1f}s: {str(e)}")
+                    else:
+                        outcomes[name] = "ran"
+                        state[name] = {
+                            "fingerprint": fingerprint,
+                            "outputs": {path: file_hash(path) for path in self.stages[name].outputs},
+                            "finished_at": time.time()
+                        }
+                        print(f"Stage {name}: done in {elapsed:.1f}s")
+                    self.save_state(state)
+
+        return {name: outcomes[name] for name in self.order}
+
+    def load_state(self) -> Dict[str, Any]:
+        """Load the checkpoints from the state file."""
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, "r") as f:
+            return json.load(f)
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        """Write the checkpoints to the state file."""
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.state_path)
@@ -3,8 +3,9 @@ Summarize Reddit posts based on themes
 """
 import os
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from .batch import BatchRequest, run_batch
+from .llm import get_async_settings, get_openai_client, run_concurrently
 from .utils import DailyPosts, Posts, Post, TopicRecommendations, load_config
 from dotenv import load_dotenv
 
@@ -25,9 +26,12 @@ class PostSummarizer:
     """
     def __init__(self, 
                  content_path: str = None,
-                 theme_path: str = None):
+                 theme_path: str = None,
+                 client=None,
+                 async_client=None):
         config = load_config()
-        self.client = OpenAI()
+        self.client = client or get_openai_client()
+        self.async_client = async_client  # Created per run by summarize_themes when None
         self.content_path = content_path or config["paths"]["reddit_data_json"]
         self.theme_path = theme_path or config["paths"]["topic_recommendations"]
         self.model = config["summarizer"]["post"]["model"]
@@ -54,53 +58,152 @@ class PostSummarizer:
             ValueError: If theme_index is out of range or no posts found for theme
         """
         try:
-            # Load posts and themes
-            posts = Posts(self.content_path)
-            all_posts = {post.post_id: post for post in posts.get_posts()}
-            
-            themes = TopicRecommendations(self.theme_path).get_themes()
-            if not themes:
-                raise ValueError("No themes found in the recommendations file")
+            all_posts, themes = self.load_themes()
             if theme_index >= len(themes):
                 raise ValueError(f"Theme index {theme_index} is out of range (max: {len(themes)-1})")
-                
-            # Gather post contents for the theme
-            theme = themes[theme_index]
-            post_contents = ""
-            for post_id in theme["post_id"]:
-                if post_id in all_posts:
-                    post = all_posts[post_id]
-                    post_contents += f"[Post ID: {post.post_id}]\n{post.content}\n\n"
-                    
-            if not post_contents:
-                raise ValueError(f"No posts found for theme '{theme['theme']}'")
             
             # Generate summary
+            theme = themes[theme_index]
             response = self.client.beta.chat.completions.parse(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_message},
-                    {"role": "user", "content": post_contents},
-                ],
+                messages=self.build_messages(theme, all_posts),
                 response_format=PostSummary,
             )
             
-            response = response.choices[0].message.parsed.model_dump()
-            response = response["post_summary"]
-
-            result = {
-                'theme': theme['theme'],
-                'post_id': theme['post_id'],
-                'post_url': theme['url'],
-                'post_summary': response
-            }
-            
+            result = self.build_result(theme, response)
             self.save_summary_to_json(result)
             return result
             
         except Exception as e:
             print(f"Error summarizing posts: {str(e)}")
             raise
+    
+    def summarize_themes(self, theme_indices: Iterable[int] = None, max_concurrency: int = None,
+                         batch: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """
+        Summarize several themes concurrently with the async OpenAI client, or
+        as one Batch API job.
+        
+        Async requests run at most `max_concurrency` at a time, so the total
+        time tracks the slowest theme rather than the sum of all of them. A
+        failing theme is reported and skipped without affecting the others, and
+        results are saved one by one in theme order once every request has finished.
+        
+        Args:
+            theme_indices: Indices of the themes to summarize (default: all themes)
+            max_concurrency: Maximum number of requests in flight (defaults to `summarizer.async.max_concurrency`)
+            batch: Submit the requests through the Batch API (see batch.py) and wait for the batch instead
+            
+        Returns:
+            List of summaries in the order of `theme_indices`, with None for themes that failed
+        """
+        all_posts, themes = self.load_themes()
+        indices = list(range(len(themes)) if theme_indices is None else theme_indices)
+        
+        # Build every request first; a theme that cannot be requested fails on its own
+        outcomes: List[Any] = [None] * len(indices)
+        messages: Dict[int, List[Dict[str, str]]] = {}
+        for position, theme_index in enumerate(indices):
+            try:
+                if theme_index >= len(themes):
+                    raise ValueError(f"Theme index {theme_index} is out of range (max: {len(themes)-1})")
+                messages[position] = self.build_messages(themes[theme_index], all_posts)
+                print(f"Summarizing theme {position + 1}/{len(indices)}: {themes[theme_index]['theme']}")
+            except ValueError as e:
+                outcomes[position] = e
+        
+        def request(theme_messages: List[Dict[str, str]]):
+            async def call(client):
+                return await client.beta.chat.completions.parse(
+                    model=self.model,
+                    messages=theme_messages,
+                    response_format=PostSummary,
+                )
+            return call
+        
+        positions = list(messages)
+        if batch:
+            responses = run_batch("post_summaries", [BatchRequest(self.model, messages[position], PostSummary)
+                                                     for position in positions])
+        else:
+            responses = run_concurrently(
+                [request(messages[position]) for position in positions],
+                max_concurrency or get_async_settings()["max_concurrency"],
+                self.async_client
+            )
+        for position, response in zip(positions, responses):
+            outcomes[position] = response
+        
+        results = []
+        for theme_index, outcome in zip(indices, outcomes):
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                result = self.build_result(themes[theme_index], outcome)
+            except Exception as e:
+                print(f"Error summarizing theme {theme_index}: {str(e)}")
+                results.append(None)
+                continue
+            self.save_summary_to_json(result)
+            results.append(result)
+        return results
+    
+    def load_themes(self) -> Tuple[Dict[str, Post], List[Dict[str, Any]]]:
+        """
+        Load the scraped posts and the recommended themes.
+        
+        Returns:
+            Tuple of posts by post ID and the list of themes
+            
+        Raises:
+            ValueError: If no themes are found
+        """
+        posts = Posts(self.content_path)
+        all_posts = {post.post_id: post for post in posts.get_posts()}
+        
+        themes = TopicRecommendations(self.theme_path).get_themes()
+        if not themes:
+            raise ValueError("No themes found in the recommendations file")
+        return all_posts, themes
+    
+    def build_messages(self, theme: Dict[str, Any], all_posts: Dict[str, Post]) -> List[Dict[str, str]]:
+        """
+        Build the chat messages asking for a theme's summary.
+        
+        Args:
+            theme: Theme dictionary containing theme name and post IDs
+            all_posts: Posts by post ID
+            
+        Returns:
+            System and user messages for the completion request
+            
+        Raises:
+            ValueError: If none of the theme's posts are found
+        """
+        # Gather post contents for the theme
+        post_contents = ""
+        for post_id in theme["post_id"]:
+            if post_id in all_posts:
+                post = all_posts[post_id]
+                post_contents += f"[Post ID: {post.post_id}]\n{post.content}\n\n"
+                
+        if not post_contents:
+            raise ValueError(f"No posts found for theme '{theme['theme']}'")
+        
+        return [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": post_contents},
+        ]
+    
+    def build_result(self, theme: Dict[str, Any], response: Any) -> Dict[str, Any]:
+        """Combine a theme with the summary parsed from its completion."""
+        response = response.choices[0].message.parsed.model_dump()
+        return {
+            'theme': theme['theme'],
+            'post_id': theme['post_id'],
+            'post_url': theme['url'],
+            'post_summary': response["post_summary"]
+        }
             
     def save_summary_to_json(self, summary_data: Dict[str, Any], output_path: str = None) -> None:
         """
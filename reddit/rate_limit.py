@@ -0,0 +1,283 @@
+"""
+Shared, rate-limit-aware scheduler for Reddit API requests
+
+The scheduler is the only throttle on Reddit requests: prawcore's own rate
+limiter keeps reading the headers but no longer sleeps (see
+`use_scheduler_throttle`), so waits are not applied twice.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Mapping, Optional
+import praw
+import requests
+from prawcore.rate_limit import RateLimiter
+from .utils import load_config
+
+
+class FakeClock:
+    """
+    A manual clock for exercising the scheduler offline.
+
+    Pass `clock.now` and `clock.sleep` to RequestScheduler; sleeping advances
+    the clock instantly instead of blocking.
+    """
+    def __init__(self, start: float = 0.0):
+        self.time = start
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        with self._lock:
+            return self.time
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            self.time += max(0.0, seconds)
+
+
+class RequestScheduler:
+    """
+    A token bucket that gates every Reddit request and adapts to Reddit's
+    rate-limit response headers.
+
+    Tokens refill at `requests_per_minute` until Reddit reports its own budget
+    through `x-ratelimit-remaining`/`x-ratelimit-reset`, after which the refill
+    rate is the remaining budget spread over the rest of the window. The number
+    of requests allowed in flight shrinks as the remaining budget runs low.
+    """
+    def __init__(self,
+                 requests_per_minute: float = 100,
+                 burst: int = 10,
+                 max_concurrency: int = 4,
+                 low_budget: int = 50,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            requests_per_minute: Refill rate used until Reddit reports its budget
+            burst: Maximum number of tokens the bucket can hold
+            max_concurrency: Maximum number of requests in flight
+            low_budget: Remaining budget below which concurrency is scaled down
+            clock: Function returning the current time in seconds
+            sleep: Function used to wait for tokens
+        """
+        self.capacity = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.low_budget = max(1, low_budget)
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+
+        self._rate = requests_per_minute / 60.0
+        self._tokens = float(self.capacity)
+        self._last_refill = clock()
+        self._blocked_until = 0.0
+        self._concurrency_limit = self.max_concurrency
+        self._active = 0
+
+        self._remaining: Optional[float] = None
+        self._waiting = 0
+        self._max_queue_depth = 0
+        self._requests = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _refill(self) -> float:
+        """Add the tokens earned since the last refill and return the current time."""
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        return now
+
+    def acquire(self) -> None:
+        """Block until a token and a concurrency slot are available."""
+        start = self._clock()
+        with self._cond:
+            self._waiting += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._waiting)
+            try:
+                while True:
+                    if self._active >= self._concurrency_limit:
+                        self._cond.wait()
+                        continue
+
+                    now = self._refill()
+                    if now < self._blocked_until:
+                        delay = self._blocked_until - now
+                    elif self._tokens >= 1:
+                        self._tokens -= 1
+                        self._active += 1
+                        break
+                    else:
+                        delay = (1 - self._tokens) / self._rate if self._rate > 0 else 1.0
+
+                    # Sleep without holding the lock so other threads can release slots
+                    self._cond.release()
+                    try:
+                        self._sleep(delay)
+                    finally:
+                        self._cond.acquire()
+            finally:
+                self._waiting -= 1
+
+            waited = self._clock() - start
+            self._requests += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def release(self) -> None:
+        """Give back the concurrency slot taken by `acquire`."""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self):
+        """Context manager wrapping a single Reddit request."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def update_from_headers(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """
+        Adapt the refill rate and concurrency to Reddit's rate-limit headers.
+
+        Args:
+            headers: Response headers of a Reddit request
+            status_code: HTTP status code of the response
+        """
+        with self._cond:
+            now = self._refill()
+
+            if status_code == 429:
+                self._throttled += 1
+                retry_after = float(headers.get('retry-after') or headers.get('x-ratelimit-reset') or 1)
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._tokens = 0.0
+                self._concurrency_limit = 1
+                return
+
+            if 'x-ratelimit-remaining' not in headers:
+                return
+
+            remaining = float(headers['x-ratelimit-remaining'])
+            reset = max(1.0, float(headers.get('x-ratelimit-reset', 60)))
+            self._remaining = remaining
+
+            # Spread what is left of the budget over the rest of the window
+            self._rate = max(remaining, 1.0) / reset
+            self._tokens = min(self._tokens, remaining)
+            if remaining < 1:
+                self._blocked_until = max(self._blocked_until, now + reset)
+
+            scaled = int(self.max_concurrency * remaining / self.low_budget)
+            self._concurrency_limit = max(1, min(self.max_concurrency, scaled))
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics.
+
+        Returns:
+            Dict[str, Any]: Queue depth, wait times, throttling and budget figures
+        """
+        with self._cond:
+            return {
+                'requests': self._requests,
+                'queue_depth': self._waiting,
+                'max_queue_depth': self._max_queue_depth,
+                'in_flight': self._active,
+                'concurrency_limit': self._concurrency_limit,
+                'total_wait': round(self._total_wait, 3),
+                'max_wait': round(self._max_wait, 3),
+                'avg_wait': round(self._total_wait / self._requests, 3) if self._requests else 0.0,
+                'throttled': self._throttled,
+                'remaining': self._remaining
+            }
+
+
+class ScheduledSession(requests.Session):
+    """
+    A requests session that sends every request through a RequestScheduler.
+
+    PRAW accepts it through `requestor_kwargs={"session": ...}`, so every call
+    made with the Reddit instance is gated and reports its headers back.
+    """
+    def __init__(self, scheduler: RequestScheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def request(self, method, url, *args, **kwargs):
+        with self.scheduler.request():
+            response = super().request(method, url, *args, **kwargs)
+        self.scheduler.update_from_headers(response.headers, response.status_code)
+        return response
+
+
+class SchedulerRateLimiter(RateLimiter):
+    """
+    prawcore rate limiter that leaves the waiting to the RequestScheduler.
+
+    prawcore delays each request by its own reading of the same headers the
+    scheduler adapts to; with both in place every wait would be paid twice,
+    and each per-thread Reddit instance would pace itself without regard to
+    the others. The headers are still tracked so `remaining`/`used` stay
+    accurate.
+    """
+    def delay(self) -> None:
+        return None
+
+
+def use_scheduler_throttle(reddit: praw.Reddit) -> praw.Reddit:
+    """
+    Make the scheduler the single throttle of a Reddit instance.
+
+    Only call this for instances whose session is a ScheduledSession,
+    otherwise their requests are not throttled at all. The swap relies on
+    prawcore internals (`_rate_limiter` and its `window_size`); a session
+    that does not have them keeps prawcore's own limiter, so requests are
+    throttled twice but never left unthrottled. Calling it again is a no-op.
+
+    Args:
+        reddit: Reddit instance created with a ScheduledSession
+
+    Returns:
+        praw.Reddit: The same instance, with prawcore's sleeping disabled where possible
+    """
+    for name in ("_read_only_core", "_authorized_core"):
+        core = getattr(reddit, name, None)
+        limiter = getattr(core, "_rate_limiter", None)
+        if limiter is None or isinstance(limiter, SchedulerRateLimiter):
+            continue
+        window_size = getattr(limiter, "window_size", None)
+        if not isinstance(limiter, RateLimiter) or window_size is None:
+            print(f"Keeping prawcore's rate limiter on {name}: unexpected {type(limiter).__name__}")
+            continue
+        core._rate_limiter = SchedulerRateLimiter(window_size=window_size)
+    return reddit
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> RequestScheduler:
+    """
+    Get the process-wide scheduler shared by all Reddit-calling modules.
+
+    Returns:
+        RequestScheduler: Scheduler configured from the `rate_limit` config block
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            settings = load_config().get("rate_limit", {})
+            _scheduler = RequestScheduler(
+                requests_per_minute=settings.get("requests_per_minute", 100),
+                burst=settings.get("burst", 10),
+                max_concurrency=settings.get("max_concurrency", 4),
+                low_budget=settings.get("low_budget", 50)
+            )
+        return _scheduler
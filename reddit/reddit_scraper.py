@@ -1,26 +1,46 @@
 import json
-from typing import List, Dict, Any
-from .auth import get_reddit_instance
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from .auth import get_reddit_instance, get_thread_reddit_instance
 import praw
+from .comment_tree import CommentForest, as_dicts
 from .db import RedditDB
+from .rate_limit import get_scheduler
 
 class RedditScraper:
     """
     A class to scrape top posts and comments from specified subreddits.
     """
     
-    def __init__(self, config_file: str = 'reddit/config.json', db_path: str = "reddit_data.db"):
+    def __init__(self, config_file: str = 'reddit/config.json', db_path: str = "reddit_data.db",
+                 reddit: Optional[praw.Reddit] = None,
+                 reddit_factory: Optional[Callable[[], Optional[praw.Reddit]]] = None):
         """
         Initialize the RedditScraper with path to the config JSON file.
         
         Args:
             config_file (str): Path to the configuration JSON file
+            db_path (str): Path to the SQLite database
+            reddit (praw.Reddit, optional): Reddit instance to use instead of authenticating
+            reddit_factory (Callable, optional): Creates the Reddit instance of each
+                worker thread. Defaults to `get_thread_reddit_instance`, or to
+                reusing `reddit` when one is passed
         """
         self.config_file = config_file
         self.api_requests = 0  # Counter for API requests
-        self.reddit = get_reddit_instance()
+        self.requests_saved = 0  # Requests avoided by building reply trees locally
+        self.cache_stats = {'hits': 0, 'misses': 0}  # Incremental scraping counts for the last run
+        self._requests_lock = threading.Lock()  # Guards request counters across worker threads
+        self.reddit = reddit or get_reddit_instance()
         if not self.reddit:
             raise Exception("Failed to authenticate with Reddit")
+        if reddit_factory is None:
+            reddit_factory = (lambda: reddit) if reddit is not None else get_thread_reddit_instance
+        self.reddit_factory = reddit_factory
+        self._local = threading.local()  # Holds each worker thread's own Reddit instance
             
         # Initialize database
         self.db = RedditDB(db_path)
@@ -38,9 +58,48 @@ class RedditScraper:
                 "comments_limit": 5,
                 "replies_limit": 5,
                 "comment_depth": 5,
-                "time_filter": "day"
+                "time_filter": "day",
+                "max_workers": 1,
+                "reply_mode": "forest",
+                "more_comments_limit": 0,
+                "incremental": False,
+                "incremental_max_age_hours": 24,
+                "compact_comments": False,
+                "db_batch_size": 20
             }
             self.subreddits = []
+        self.max_workers = max(1, int(self.config.get('max_workers', 1)))
+
+    def _thread_reddit(self) -> praw.Reddit:
+        """The Reddit instance of the calling worker thread, or the scraper's own instance."""
+        return getattr(self._local, 'reddit', None) or self.reddit
+
+    def _init_worker(self) -> None:
+        """Give a worker thread its own Reddit instance; PRAW instances are not thread-safe."""
+        reddit = self.reddit_factory()
+        if not reddit:
+            raise Exception("Failed to authenticate with Reddit")
+        self._local.reddit = reddit
+
+    def _count_request(self, count: int = 1) -> None:
+        """
+        Increment the API request counter in a thread-safe way.
+        
+        Args:
+            count (int): Number of requests to add
+        """
+        with self._requests_lock:
+            self.api_requests += count
+
+    def _count_saved_request(self, count: int = 1) -> None:
+        """
+        Record requests that the "refresh" reply mode would have made.
+        
+        Args:
+            count (int): Number of requests avoided
+        """
+        with self._requests_lock:
+            self.requests_saved += count
 
     def get_subreddits(self) -> List[str]:
         """
@@ -51,48 +110,106 @@ class RedditScraper:
         """
         return self.subreddits
 
-    def get_top_posts(self, subreddit_name: str, limit: int = None) -> List[Dict[str, Any]]:
+    def get_submissions(self, subreddit_name: str, limit: int = None) -> List[praw.models.Submission]:
         """
-        Get top posts from a subreddit.
+        Fetch the top post listing of a subreddit without loading any comments.
         
         Args:
             subreddit_name (str): Name of the subreddit
             limit (int, optional): Number of top posts to fetch. If None, uses config value.
             
         Returns:
-            List[Dict]: List of post information dictionaries
+            List[praw.models.Submission]: Submissions in listing order
         """
         try:
-            subreddit = self.reddit.subreddit(subreddit_name)
-            posts = []
-            
+            subreddit = self._thread_reddit().subreddit(subreddit_name)
             limit = limit if limit is not None else self.config['posts_limit']
-            self.api_requests += 1  # Count subreddit.top request
-            for post in subreddit.top(limit=limit, time_filter=self.config['time_filter']):
-                post_data = {
-                    'id': post.id,
-                    'subreddit': subreddit_name,
-                    'title': post.title,
-                    'url': post.url,
-                    'score': post.score,
-                    'created_utc': post.created_utc,
-                    'author': str(post.author),
-                    'num_comments': post.num_comments,
-                    'permalink': post.permalink,
-                    'selftext': post.selftext,
-                    'comments': self.get_top_comments(post)
-                }
-                posts.append(post_data)
-            
-            return posts
+            self._count_request()  # Count subreddit.top request
+            return list(subreddit.top(limit=limit, time_filter=self.config['time_filter']))
         except Exception as e:
             print(f"Error fetching posts from r/{subreddit_name}: {str(e)}")
             return []
 
+    def get_stored_comments(self, post: praw.models.Submission) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up the stored comment tree for a post that has not changed since it was last scraped.
+        
+        A stored copy is reused when incremental scraping is enabled, it is not
+        older than `incremental_max_age_hours`, and its `num_comments` matches the
+        listing. Only the listing metadata is compared, so no extra request is made.
+        Safe to call from worker threads.
+        
+        Args:
+            post (praw.models.Submission): Reddit post object from a listing
+            
+        Returns:
+            Optional[List[Dict]]: Stored comments, or None if the post must be fetched
+        """
+        if not self.config.get('incremental', False):
+            return None
+        
+        stored = self.db.get_latest_post(post.id, self.config.get('incremental_max_age_hours', 24))
+        hit = stored is not None and stored['num_comments'] == post.num_comments
+        with self._requests_lock:
+            self.cache_stats['hits' if hit else 'misses'] += 1
+        return stored['comments'] if hit else None
+
+    def get_post_data(self, subreddit_name: str, post: praw.models.Submission,
+                      comments: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Build the post information dictionary for a submission, including its comments.
+        
+        Args:
+            subreddit_name (str): Name of the subreddit the post was listed in
+            post (praw.models.Submission): Reddit post object
+            comments (List[Dict], optional): Already known comment tree. If None, comments are fetched.
+            
+        Returns:
+            Dict[str, Any]: Post information dictionary
+        """
+        if comments is None:
+            comments = self.get_top_comments(post)
+        if self.config.get('compact_comments', False):
+            comments = CommentForest.from_dicts(as_dicts(comments))
+        
+        return {
+            'id': post.id,
+            'subreddit': subreddit_name,
+            'title': post.title,
+            'url': post.url,
+            'score': post.score,
+            'created_utc': post.created_utc,
+            'author': str(post.author),
+            'num_comments': post.num_comments,
+            'permalink': post.permalink,
+            'selftext': post.selftext,
+            'comments': comments
+        }
+
+    def get_top_posts(self, subreddit_name: str, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Get top posts from a subreddit.
+        
+        Args:
+            subreddit_name (str): Name of the subreddit
+            limit (int, optional): Number of top posts to fetch. If None, uses config value.
+            
+        Returns:
+            List[Dict]: List of post information dictionaries
+        """
+        return [
+            self.get_post_data(subreddit_name, post, self.get_stored_comments(post))
+            for post in self.get_submissions(subreddit_name, limit)
+        ]
+
     def get_comment_replies(self, comment: praw.models.Comment, depth: int = None) -> List[Dict[str, Any]]:
         """
         Recursively get replies to a comment up to a specified depth.
         
+        In the default "forest" reply mode the replies already loaded with the
+        submission are walked locally. The "refresh" reply mode re-fetches every
+        comment before reading its replies, costing one request per comment.
+        
         Args:
             comment (praw.models.Comment): Reddit comment object
             depth (int, optional): Maximum depth of replies to fetch. If None, uses config value.
@@ -106,9 +223,12 @@ class RedditScraper:
             
         try:
             replies = []
-            self.api_requests += 1  # Count comment.refresh request
-            comment.refresh()  # Ensure we have the latest replies
-            for reply in comment.replies[:self.config['replies_limit']]:
+            if self.config.get('reply_mode', 'forest') == 'refresh':
+                self._count_request()  # Count comment.refresh request
+                comment.refresh()  # Ensure we have the latest replies
+            else:
+                self._count_saved_request()  # Replies come from the submission fetch
+            for reply in self._loaded_comments(comment.replies)[:self.config['replies_limit']]:
                 reply_data = {
                     'id': reply.id,
                     'author': str(reply.author),
@@ -123,6 +243,75 @@ class RedditScraper:
             print(f"Error fetching replies for comment {comment.id}: {str(e)}")
             return []
 
+    @staticmethod
+    def _loaded_comments(forest) -> List[praw.models.Comment]:
+        """
+        Drop unexpanded "load more comments" placeholders from a comment forest.
+        
+        Args:
+            forest: A CommentForest or list of comments
+            
+        Returns:
+            List[praw.models.Comment]: Only the comments that are already loaded
+        """
+        return [comment for comment in forest if not isinstance(comment, praw.models.MoreComments)]
+
+    def _expand_more_comments(self, post: praw.models.Submission) -> None:
+        """
+        Fetch a submission's comment forest and expand a bounded number of
+        "load more comments" placeholders.
+        
+        Args:
+            post (praw.models.Submission): Reddit post object
+        """
+        more_limit = self.config.get('more_comments_limit', 0)
+        if self.config.get('reply_mode', 'forest') == 'refresh':
+            more_limit = 0
+        
+        self._count_request()  # Count the submission comment fetch
+        pending = []
+        if more_limit != 0:
+            pending = [item for item in post.comments.list() if isinstance(item, praw.models.MoreComments)]
+        skipped = post.comments.replace_more(limit=more_limit)
+        self._count_request(self._count_expansions(pending, skipped))  # Count MoreComments expansions
+
+    @staticmethod
+    def _count_expansions(more_comments: List[praw.models.MoreComments],
+                          skipped: List[praw.models.MoreComments]) -> int:
+        """
+        Count the MoreComments that replace_more actually fetched.
+
+        replace_more queues the MoreComments returned by each expansion, so
+        the placeholders present beforehand undercount the requests made.
+        Every placeholder it did not return as skipped was fetched; the
+        result of a fetched one (`comments()` answers from its cache) is
+        walked for the placeholders it yielded in turn.
+
+        Args:
+            more_comments (List[praw.models.MoreComments]): Placeholders in the forest before replace_more
+            skipped (List[praw.models.MoreComments]): Placeholders returned by replace_more
+
+        Returns:
+            int: Number of MoreComments fetched, one API request each
+        """
+        skipped_ids = {id(item) for item in skipped}
+        expanded = 0
+        stack = list(more_comments)
+        seen = set()
+        while stack:
+            item = stack.pop()
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            if isinstance(item, praw.models.MoreComments):
+                if id(item) in skipped_ids:
+                    continue
+                expanded += 1
+                stack.extend(item.comments(update=False))
+            else:
+                stack.extend(getattr(item, 'replies', None) or [])
+        return expanded
+
     def get_top_comments(self, post: praw.models.Submission, limit: int = None) -> List[Dict[str, Any]]:
         """
         Get top comments from a post, including their replies.
@@ -135,12 +324,11 @@ class RedditScraper:
             List[Dict]: List of comment information dictionaries with replies
         """
         try:
-            self.api_requests += 1  # Count replace_more request
-            post.comments.replace_more(limit=0)  # Remove "load more comments" items
+            self._expand_more_comments(post)
             comments = []
             
             limit = limit if limit is not None else self.config['comments_limit']
-            for comment in post.comments[:limit]:
+            for comment in self._loaded_comments(post.comments)[:limit]:
                 comment_data = {
                     'id': comment.id,
                     'author': str(comment.author),
@@ -165,8 +353,25 @@ class RedditScraper:
         Returns:
             Dict[str, List[Dict]]: Dictionary mapping subreddit names to their posts
         """
+        results = {subreddit: [] for subreddit in self.get_subreddits()}
+        for subreddit, post in self.iter_all_subreddits():
+            results[subreddit].append(post)
+        return results
+
+    def iter_all_subreddits(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Scrape all subreddits in the JSON file, yielding each post as soon as it is complete.
+        Posts are queued for the database writer in batches of `db_batch_size`
+        and are all committed before the iterator finishes.
+        
+        Subreddits are scraped concurrently when `max_workers` in the scraping
+        config is greater than 1, otherwise one at a time. Posts are yielded in
+        config and listing order either way.
+        
+        Yields:
+            Tuple[str, Dict]: Subreddit name and post information dictionary
+        """
         subreddits = self.get_subreddits()
-        results = {}
         
         # Record the search in database
         search_results = [{"name": subreddit} for subreddit in subreddits]
@@ -174,18 +379,105 @@ class RedditScraper:
         
         # Map subreddits to their search IDs
         subreddit_search_map = dict(zip(subreddits, search_ids))
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        
+        if self.max_workers > 1:
+            posts = self._iter_concurrent(subreddits)
+        else:
+            posts = self._iter_serial(subreddits)
+        
+        batch_size = max(1, self.config.get('db_batch_size', 20))
+        batch_subreddit, batch = None, []
+        for subreddit, post in posts:
+            if batch and (subreddit != batch_subreddit or len(batch) >= batch_size):
+                # Queue the batch for the database writer thread
+                self.db.record_posts(subreddit_search_map[batch_subreddit], batch)
+                batch = []
+            batch_subreddit = subreddit
+            batch.append(post)
+            yield subreddit, post
+        if batch:
+            self.db.record_posts(subreddit_search_map[batch_subreddit], batch)
+        # Wait for the writer so the scrape is stored (and write errors raised) before returning
+        self.db.flush()
+        
+        if self.config.get('incremental', False):
+            print(f"Incremental scrape: {self.cache_stats['hits']} unchanged posts reused, "
+                  f"{self.cache_stats['misses']} fetched")
         
+        scheduler_stats = get_scheduler().stats()
+        print(f"Request scheduler: {scheduler_stats['requests']} requests, "
+              f"max queue depth {scheduler_stats['max_queue_depth']}, "
+              f"avg wait {scheduler_stats['avg_wait']}s, max wait {scheduler_stats['max_wait']}s")
+
+    def _iter_serial(self, subreddits: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Scrape subreddits one post at a time on the calling thread.
+        
+        Args:
+            subreddits (List[str]): Subreddit names in config order
+            
+        Yields:
+            Tuple[str, Dict]: Subreddit name and post information dictionary
+        """
         for subreddit in subreddits:
             print(f"Scraping r/{subreddit}...")
-            posts = self.get_top_posts(subreddit)
-            results[subreddit] = posts
+            for post in self.get_submissions(subreddit):
+                yield subreddit, self.get_post_data(subreddit, post, self.get_stored_comments(post))
+
+    def _iter_concurrent(self, subreddits: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Scrape subreddits with a bounded worker pool.
+        
+        Each subreddit listing and each post's comment tree is its own task. At
+        most twice `max_workers` post tasks are in flight, and results are
+        yielded in config order so the output is the same as the serial path.
+        Every worker thread makes its requests through its own Reddit instance.
+        
+        Args:
+            subreddits (List[str]): Subreddit names in config order
+            
+        Yields:
+            Tuple[str, Dict]: Subreddit name and post information dictionary
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, initializer=self._init_worker) as executor:
+            listing_futures = [executor.submit(self.get_submissions, subreddit) for subreddit in subreddits]
             
-            # Save posts to database
-            self.db.record_posts(subreddit_search_map[subreddit], posts)
+            def listed_posts():
+                for subreddit, listing_future in zip(subreddits, listing_futures):
+                    print(f"Scraping r/{subreddit}...")
+                    for post in listing_future.result():
+                        yield subreddit, post
             
-        return results
+            def scrape_post(subreddit, post):
+                # Each worker thread reads through its own database connection. The
+                # listed submission belongs to the Reddit instance of the thread that
+                # listed it, so comments are fetched through a submission of this
+                # worker's own instance
+                comments = self.get_stored_comments(post)
+                if comments is None:
+                    post = self._thread_reddit().submission(id=post.id)
+                return self.get_post_data(subreddit, post, comments)
+            
+            def submit(listed):
+                for subreddit, post in listed:
+                    pending.append((subreddit, executor.submit(scrape_post, subreddit, post)))
+            
+            listed = listed_posts()
+            pending = deque()
+            submit(islice(listed, self.max_workers * 2))
+            while pending:
+                subreddit, future = pending.popleft()
+                post_data = future.result()
+                submit(islice(listed, 1))
+                yield subreddit, post_data
         
-    def __del__(self):
-        """Cleanup database connection when object is destroyed."""
-        if hasattr(self, 'db'):
-            self.db.close()
+    def close(self):
+        """Commit pending database writes and close the database."""
+        self.db.close()
+
+    def __enter__(self) -> "RedditScraper":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
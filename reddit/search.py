@@ -6,12 +6,18 @@ given a user profile, search for relevant subreddits based on keywords
 import praw
 import argparse
 import json
+import os
+import time
+import numpy as np
 import pytz
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Tuple
-from openai import OpenAI
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from .auth import get_reddit_instance
+from .llm import get_openai_client
+from .text_vectors import similarity_to_query, split_words
+from .utils import load_config
 
 
 load_dotenv()
@@ -20,9 +26,13 @@ load_dotenv()
 class Keywords(BaseModel):
     keywords: List[str] = Field(..., description="Keywords extracted from the user profile")
 
-def extract_keywords(user_profile: str):
+def extract_keywords(user_profile: str, client=None):
     """
     Extract keywords from user profile
+    
+    Args:
+        user_profile (str): User profile containing background and intent
+        client: OpenAI client to use (defaults to get_openai_client())
     """
     system_message = """
     You are an intelligent assistant tasked with generating relevant keywords based on a user's profile. The user's profile contains information about their background (who they are) and their goals or interests (their intent). Your role is to infer and identify key concepts, even if they are not explicitly mentioned in the profile, and provide a list of keywords that can be used to search for subreddits matching their interests.
@@ -41,7 +51,7 @@ def extract_keywords(user_profile: str):
     Be creative and accurate in your keyword generation, ensuring they align closely with the user’s profile and intent while covering related concepts that may be valuable.
     """
 
-    client = OpenAI()
+    client = client or get_openai_client()
     response = client.beta.chat.completions.parse(
                 model="gpt-4o-mini",
                 messages=[
@@ -55,13 +65,14 @@ def extract_keywords(user_profile: str):
     return response["keywords"]
 
 
-def search_subreddits(keywords: List[str]) -> Dict[str, List[Dict]]:
+def search_subreddits(keywords: List[str], reddit: Optional[praw.Reddit] = None) -> Dict[str, List[Dict]]:
     """
     Search for relevant subreddits based on keywords coming from extract_keywords().
     Only includes subreddits that have had posts within the last week.
     
     Args:
         keywords (List[str]): List of keywords to search for
+        reddit (praw.Reddit, optional): Reddit instance to use instead of authenticating
         
     Returns:
         Dict[str, List[Dict]]: Dictionary mapping keywords to lists of subreddit information
@@ -84,7 +95,7 @@ def search_subreddits(keywords: List[str]) -> Dict[str, List[Dict]]:
     from datetime import datetime, timedelta
     import pytz
 
-    reddit = get_reddit_instance()
+    reddit = reddit or get_reddit_instance()
     if not reddit:
         raise Exception("Failed to authenticate with Reddit")
     
@@ -125,78 +136,207 @@ class Relevancy(BaseModel):
     relevancy: bool = Field(..., description="Whether the subreddit is relevant to the user profile")
     reasoning: str = Field(..., description="Reasoning behind the relevancy decision")
 
-def get_relevant_subreddits(user_profile: str, subreddit_results: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
-    """
-    Filter subreddits based on relevancy to user profile
-    
-    Args:
-        user_profile (str): User profile containing background and intent
-        subreddit_results (Dict[str, List[Dict]]): Results from search_subreddits()
-        
-    Returns:
-        Dict[str, List[Dict]]: Dictionary containing only relevant subreddits
-    """
-    system_message = """
-    You are an intelligent assistant tasked with determining whether a subreddit matches a given user profile. You will be provided with the following inputs:
+class SubredditRelevancy(Relevancy):
+    name: str = Field(..., description="Name of the subreddit, exactly as given")
+
+class RelevancyBatch(BaseModel):
+    verdicts: List[SubredditRelevancy] = Field(..., description="One verdict for every subreddit given, in the same order")
+
+RELEVANCY_SYSTEM_MESSAGE = """
+    You are an intelligent assistant tasked with determining whether subreddits match a given user profile. You will be provided with the following inputs:
     1. The user's profile, including their background (who they are) and goals or interests (their intent).
-    2. The subreddit's name and description.
+    2. A numbered list of subreddits with their name, description and number of subscribers.
 
-    Your role is to analyze the provided inputs and assess whether the subreddit could potentially bring any value to the user based on their profile. Consider the user's background, interests, and intent to determine the relevance of the subreddit.
+    Your role is to analyze the provided inputs and assess, for each subreddit separately, whether it could potentially bring any value to the user based on their profile. Consider the user's background, interests, and intent to determine the relevance of each subreddit.
 
-    - Focus on understanding the user's profile and the context of the subreddit.
-    - Evaluate the subreddit name and description for alignment with the user's interests and goals.
-    - Provide a boolean output:
+    - Focus on understanding the user's profile and the context of each subreddit.
+    - Evaluate each subreddit's name and description for alignment with the user's interests and goals.
+    - Provide a boolean output per subreddit:
     - `True` if the subreddit is relevant to the user's profile.
     - `False` if the subreddit is not relevant to the user's profile.
 
-    Your output must only be `True` or `False`, based on the relevance of the subreddit to the user's profile. Provide clear and concise reasoning for your decision.
+    Return exactly one verdict for every subreddit in the list, using its name exactly as given. Provide clear and concise reasoning for each decision.
     """
 
-    relevant_results = {}
+def classify_subreddits(user_profile: str, subreddits: List[Dict], client=None,
+                        batch_size: int = 20, max_workers: int = 4) -> Dict[str, Dict]:
+    """
+    Classify the relevancy of many subreddits with a few structured-output requests.
     
-    for keyword, subreddits in subreddit_results.items():
-        relevant_subreddits = []
+    Subreddits are packed `batch_size` per request and the requests run
+    concurrently. Subreddits the model leaves out of its answer are sent once
+    more; any still missing are treated as not relevant.
+    
+    Args:
+        user_profile (str): User profile containing background and intent
+        subreddits (List[Dict]): Unique subreddits with name, description and subscribers
+        client: OpenAI client to use (defaults to get_openai_client())
+        batch_size (int): Number of subreddits per request
+        max_workers (int): Number of requests in flight at once
         
-        for subreddit in subreddits:
-            subreddit_detail = {
+    Returns:
+        Dict[str, Dict]: Relevancy verdict (relevancy, reasoning) by lowercased subreddit name
+    """
+    client = client or get_openai_client()
+    batch_size = max(1, batch_size)
+    
+    def classify(batch: List[Dict]) -> List[SubredditRelevancy]:
+        listing = "\n".join(
+            f"{number}. " + json.dumps({
                 "name": subreddit["name"],
                 "description": subreddit["description"],
                 "subscribers": subreddit["subscribers"]
-            }
-            
-            user_message = f"User Profile: {user_profile}\n\nSubreddit Details: {subreddit_detail}"
-
-            client = OpenAI()
-            response = client.beta.chat.completions.parse(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {"role": "system", "content":system_message},
-                            {"role": "user", "content": user_message},
-                        ],
-                        response_format=Relevancy,
-                    )
-            
-            response = response.choices[0].message.parsed.model_dump()
-            
-            print(f"\nAnalyzing r/{subreddit['name']}...")
-            print(f"Description: {subreddit['description']}")
-            print(f"Subscribers: {subreddit['subscribers']}")
-            print(f"Relevancy: {'✓ Relevant' if response['relevancy'] else '✗ Not relevant'}")
-
-            
-            if response["relevancy"]:
-                relevant_subreddits.append(subreddit)
+            }, ensure_ascii=False)
+            for number, subreddit in enumerate(batch, 1)
+        )
+        response = client.beta.chat.completions.parse(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": RELEVANCY_SYSTEM_MESSAGE},
+                {"role": "user", "content": f"User Profile: {user_profile}\n\nSubreddits:\n{listing}"},
+            ],
+            response_format=RelevancyBatch,
+        )
+        return response.choices[0].message.parsed.verdicts
+    
+    verdicts: Dict[str, Dict] = {}
+    remaining = list(subreddits)
+    for attempt in range(2):
+        batches = [remaining[i:i + batch_size] for i in range(0, len(remaining), batch_size)]
+        if not batches:
+            break
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+            futures = [executor.submit(classify, batch) for batch in batches]
+            for batch, future in zip(batches, futures):
+                try:
+                    answered = {verdict.name.lower(): verdict for verdict in future.result()}
+                except Exception as e:
+                    print(f"Error classifying {len(batch)} subreddits: {str(e)}")
+                    continue
+                for subreddit in batch:
+                    verdict = answered.get(subreddit["name"].lower())
+                    if verdict is not None:
+                        verdicts[subreddit["name"].lower()] = {"relevancy": verdict.relevancy, "reasoning": verdict.reasoning}
+        remaining = [subreddit for subreddit in remaining if subreddit["name"].lower() not in verdicts]
+    
+    for subreddit in remaining:
+        print(f"No verdict for r/{subreddit['name']}; treating it as not relevant")
+    return verdicts
+
+def load_profile_text(path: str = "user_profile.json") -> str:
+    """
+    Get the user profile as text, from a generated profile file or the config.
+    
+    Args:
+        path (str): Profile written by UserProfile (used when it exists)
+        
+    Returns:
+        str: The profile text, or the config's `who` and `intent` joined
+    """
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)["profile"]
+    profile = load_config()["user_profile"]
+    return f"{profile['who']} {profile['intent']}"
+
+def prefilter_subreddits(user_profile: str, subreddits: List[Dict], threshold: float = 0.05,
+                         top_k: Optional[int] = None, n_features: int = 2 ** 18) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Keep only subreddits whose name and description look related to the profile.
+    
+    Scores are the cosine similarity of hashed n-gram TF-IDF vectors (see
+    text_vectors.py), computed locally in one vectorized pass.
+    
+    Args:
+        user_profile (str): User profile text
+        subreddits (List[Dict]): Candidate subreddits with name and description
+        threshold (float): Keep subreddits scoring at least this
+        top_k (int, optional): Also keep the `top_k` best scoring subreddits
+        n_features (int): Number of hash buckets
+        
+    Returns:
+        Tuple[List[Dict], np.ndarray]: Kept subreddits in their original order, and the score of every candidate
+    """
+    scores = similarity_to_query(
+        user_profile,
+        [" ".join(split_words(subreddit["name"])) + " " + (subreddit.get("description") or "") for subreddit in subreddits],
+        n_features
+    )
+    keep = scores >= threshold
+    if top_k:
+        keep[np.argsort(-scores, kind="stable")[:top_k]] = True
+    return [subreddit for subreddit, kept in zip(subreddits, keep) if kept], scores
+
+def get_relevant_subreddits(user_profile: str, subreddit_results: Dict[str, List[Dict]], client=None) -> Dict[str, List[Dict]]:
+    """
+    Filter subreddits based on relevancy to user profile
+    
+    Each subreddit is classified once, however many keywords returned it, and
+    many subreddits share one request (see classify_subreddits). When
+    `search.prefilter.enabled` is set, subreddits that score low against the
+    profile locally (see prefilter_subreddits) are dropped before any request.
+    
+    Args:
+        user_profile (str): User profile containing background and intent
+        subreddit_results (Dict[str, List[Dict]]): Results from search_subreddits()
+        client: OpenAI client to use (defaults to get_openai_client())
         
+    Returns:
+        Dict[str, List[Dict]]: Dictionary containing only relevant subreddits
+    """
+    settings = load_config().get("search", {})
+    
+    unique = {}
+    for subreddits in subreddit_results.values():
+        for subreddit in subreddits:
+            unique.setdefault(subreddit["name"].lower(), subreddit)
+    
+    candidates = list(unique.values())
+    batch_size = max(1, settings.get("relevancy_batch_size", 20))
+    prefilter = settings.get("prefilter", {})
+    if prefilter.get("enabled", False) and candidates:
+        start = time.perf_counter()
+        kept, _ = prefilter_subreddits(
+            user_profile,
+            candidates,
+            prefilter.get("threshold", 0.05),
+            prefilter.get("top_k"),
+            prefilter.get("n_features", 2 ** 18)
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        requests_avoided = -(-len(candidates) // batch_size) - -(-len(kept) // batch_size)
+        print(f"Prefilter kept {len(kept)} of {len(candidates)} subreddits in {elapsed:.1f} ms, "
+              f"skipping {len(candidates) - len(kept)} classifications ({requests_avoided} LLM requests avoided)")
+        candidates = kept
+    
+    verdicts = classify_subreddits(
+        user_profile,
+        candidates,
+        client,
+        batch_size,
+        settings.get("max_workers", 4)
+    )
+    
+    for subreddit in candidates:
+        verdict = verdicts.get(subreddit["name"].lower(), {"relevancy": False})
+        print(f"\nAnalyzing r/{subreddit['name']}...")
+        print(f"Description: {subreddit['description']}")
+        print(f"Subscribers: {subreddit['subscribers']}")
+        print(f"Relevancy: {'✓ Relevant' if verdict['relevancy'] else '✗ Not relevant'}")
+    
+    relevant_results = {}
+    for keyword, subreddits in subreddit_results.items():
+        relevant_subreddits = [
+            subreddit for subreddit in subreddits
+            if verdicts.get(subreddit["name"].lower(), {}).get("relevancy", False)
+        ]
         if relevant_subreddits:
             relevant_results[keyword] = relevant_subreddits
     
     return relevant_results
 
 if __name__ == "__main__":
-    user_profile = """user_profile":{
-        "who": "Aspiring ux designer.",
-        "intent": "I want to learn about AI use in Figma Design"
-    }"""
+    user_profile = load_profile_text()
     
     # Step 1: Extract keywords
     kws = extract_keywords(user_profile)
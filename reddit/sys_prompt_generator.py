@@ -1,6 +1,6 @@
 import os
 import json
-from openai import OpenAI
+from .llm import get_openai_client
 from .utils import load_config
 from pydantic import BaseModel, Field
 from typing import List, Optional
@@ -17,7 +17,7 @@ class SystemPromptGenerator:
     """
     def __init__(self, prompt_example: str, save_path: Optional[str] = None):
         config = load_config()
-        self.client = OpenAI()
+        self.client = get_openai_client()
         self.model = config["default_model"]
         self.prompt_example = prompt_example
         self.save_path = save_path or config["paths"].get("generated_prompts")
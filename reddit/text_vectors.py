@@ -0,0 +1,153 @@
+"""
+Hashed n-gram TF-IDF vectors for cheap local text similarity
+"""
+import re
+import zlib
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Words, with camelCase names split apart (e.g. "FigmaDesign" -> "figma design")
+_CAMEL = re.compile(r"([a-z0-9])([A-Z])")
+_WORD = re.compile(r"[a-z0-9]+")
+# Placed between texts so they can be split in a single pass
+_SEPARATOR = b"\x01"
+# Byte translation keeping ASCII letters, digits and the separator; everything else splits words
+_WORD_BYTES = b"abcdefghijklmnopqrstuvwxyz0123456789" + _SEPARATOR
+_SPLIT_TABLE = bytes(byte if byte in _WORD_BYTES else ord(" ") for byte in range(256))
+
+# Length of the prefix added as a crude stem so "design", "designer" and "designing" share a feature
+STEM_LENGTH = 5
+
+
+# Multiplier used to combine two word hashes into a bigram hash
+_BIGRAM_PRIME = 1_000_003
+
+
+def split_words(text: str) -> List[str]:
+    """
+    Split text into lowercase words, splitting camelCase and snake_case names too.
+
+    HashedTfidf splits on the same characters but does not split camelCase,
+    so pass names through this first.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        List[str]: Words of the text
+    """
+    return _WORD.findall(_CAMEL.sub(r"\1 \2", text or "").lower())
+
+
+class _WordHashes(dict):
+    """
+    Memo of each word's bucket and its stem's bucket, packed into one integer:
+    the low 32 bits hold the word's bucket, the high bits the stem's bucket
+    plus one (0 for words too short to stem). The text separator maps to -1.
+    """
+    def __init__(self, n_features: int):
+        super().__init__()
+        self.n_features = n_features
+        self[_SEPARATOR] = -1
+
+    def __missing__(self, word: bytes) -> int:
+        stem = zlib.crc32(word[:STEM_LENGTH] + b"~") % self.n_features + 1 if len(word) > STEM_LENGTH else 0
+        packed = self[word] = zlib.crc32(word) % self.n_features | stem << 32
+        return packed
+
+
+class HashedTfidf:
+    """
+    TF-IDF over hashed words, word bigrams and word stems, stored as a
+    CSR-style sparse matrix in NumPy arrays.
+
+    Terms are hashed into `n_features` buckets with CRC32, so no vocabulary is
+    kept and scores are stable across processes. Only words are hashed in
+    Python; bigram buckets are derived from the word buckets with NumPy. Rows
+    are L2-normalised, so the dot product of two rows is their cosine similarity.
+    """
+    def __init__(self, n_features: int = 2 ** 18):
+        self.n_features = n_features
+        self._hashes = _WordHashes(n_features)
+
+    def fit_transform(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorize texts, weighting terms by their inverse document frequency among them.
+
+        Args:
+            texts: Documents to vectorize
+
+        Returns:
+            Tuple of `indptr`, `indices` and `data` arrays: row i holds
+            `data[indptr[i]:indptr[i+1]]` at columns `indices[indptr[i]:indptr[i+1]]`
+        """
+        n_features = self.n_features
+        # Split all texts in one pass over their bytes; the separator marks where each text ends
+        joined = "\x01".join(texts).lower().encode("ascii", "replace") + _SEPARATOR
+        tokens = joined.replace(_SEPARATOR, b" \x01 ").translate(_SPLIT_TABLE).split()
+        packed = np.array(list(map(self._hashes.__getitem__, tokens)), dtype=np.int64)
+        is_word = packed >= 0
+        word_rows = np.cumsum(~is_word)[is_word]
+        packed = packed[is_word]
+        hashed = np.stack([packed & 0xFFFFFFFF, (packed >> 32) - 1], axis=1)
+
+        # Bigrams pair each word with the next one in the same text
+        same_text = word_rows[:-1] == word_rows[1:]
+        bigrams = (hashed[:-1, 0][same_text] * _BIGRAM_PRIME + hashed[1:, 0][same_text] + 1) % n_features
+        has_stem = hashed[:, 1] >= 0
+
+        rows = np.concatenate([word_rows, word_rows[:-1][same_text], word_rows[has_stem]])
+        columns = np.concatenate([hashed[:, 0], bigrams, hashed[:, 1][has_stem]])
+        pairs, counts = np.unique(rows * n_features + columns, return_counts=True)
+        counts = counts.astype(np.float64)
+        indices = pairs % n_features
+        indptr = np.searchsorted(pairs // n_features, np.arange(len(texts) + 1), side="left").astype(np.int64)
+
+        # Smoothed idf, as in scikit-learn: log((1 + n) / (1 + df)) + 1
+        df = np.bincount(indices, minlength=n_features)
+        idf = np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0
+        data = (1.0 + np.log(counts)) * idf[indices]
+
+        row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(texts)))
+        data = data / np.where(norms > 0, norms, 1.0)[row_ids]
+        return indptr, indices, data
+
+    def bucket_words(self) -> Dict[int, str]:
+        """
+        Map word buckets back to a word seen in them, to label features.
+
+        Returns:
+            Dict[int, str]: The shortest word hashed into each word bucket
+        """
+        words: Dict[int, str] = {}
+        for word, packed in sorted(self._hashes.items(), key=lambda item: (len(item[0]), item[0]), reverse=True):
+            if packed >= 0:
+                words[packed & 0xFFFFFFFF] = word.decode("ascii")
+        return words
+
+
+def similarity_to_query(query: str, texts: List[str], n_features: int = 2 ** 18) -> np.ndarray:
+    """
+    Cosine similarity between a query and every text under TF-IDF weighting.
+
+    The idf is computed over the texts and the query together.
+
+    Args:
+        query: Text to compare against (e.g. a user profile)
+        texts: Candidate texts
+        n_features: Number of hash buckets
+
+    Returns:
+        np.ndarray: Similarity in [0, 1] per text, in the order of `texts`
+    """
+    if not texts:
+        return np.zeros(0)
+    indptr, indices, data = HashedTfidf(n_features).fit_transform(texts + [query])
+    query_vector = np.zeros(n_features)
+    query_start, query_end = indptr[-2], indptr[-1]
+    query_vector[indices[query_start:query_end]] = data[query_start:query_end]
+
+    products = data[:query_start] * query_vector[indices[:query_start]]
+    row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr[:-1]))
+    return np.bincount(row_ids, weights=products, minlength=len(texts))
@@ -1,9 +1,9 @@
 import json
 from .utils import load_config
 
-def json_to_markdown():
+def json_to_markdown(input_path: str = 'comment_summaries.json', output_path: str = 'abstract.md'):
     # Read the JSON file
-    with open('comment_summaries.json', 'r') as file:
+    with open(input_path, 'r') as file:
         data = json.load(file)
     
     period = load_config()["scraping"]["time_filter"]
@@ -33,7 +33,7 @@ def json_to_markdown():
         markdown_content += "---\n\n"
     
     # Write to markdown file
-    with open('abstract.md', 'w') as file:
+    with open(output_path, 'w') as file:
         file.write(markdown_content)
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+"""
+Local token counting and token-budgeted packing of prompt text
+"""
+from functools import lru_cache
+from typing import Any, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a characters-per-token estimate
+    tiktoken = None
+
+# Rough number of characters per token for English text when tiktoken is missing
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> Optional[Any]:
+    """
+    Get the tiktoken encoding for a model.
+
+    Args:
+        model: Model name
+
+    Returns:
+        Optional[Any]: The encoding, or None when tiktoken is not installed
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Count the tokens of a text, exactly with tiktoken or estimated without it.
+
+    Args:
+        text: Text to count
+        model: Model whose tokenizer to use
+
+    Returns:
+        int: Number of tokens
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """
+    Cut a text down to at most `max_tokens` tokens.
+
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+        model: Model whose tokenizer to use
+
+    Returns:
+        str: The text, or its first `max_tokens` tokens
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def pack_chunks(texts: List[str], budget: int, model: str = "gpt-4o-mini", separator: str = "\n---\n") -> List[str]:
+    """
+    Pack texts, in order, into as few chunks as fit under a token budget.
+
+    A text that alone exceeds the budget is truncated into a chunk of its own.
+
+    Args:
+        texts: Texts to pack (e.g. one formatted post each)
+        budget: Maximum number of tokens per chunk
+        model: Model whose tokenizer to use
+        separator: String placed between texts within a chunk
+
+    Returns:
+        List[str]: The chunks, each the joined texts it holds
+    """
+    separator_tokens = count_tokens(separator, model)
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for text in texts:
+        tokens = count_tokens(text, model)
+        if tokens > budget:
+            text = truncate_to_tokens(text, budget, model)
+            tokens = budget
+        cost = tokens + (separator_tokens if current else 0)
+        if current and used + cost > budget:
+            chunks.append(separator.join(current))
+            current, used, cost = [], 0, tokens
+        current.append(text)
+        used += cost
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
@@ -3,8 +3,13 @@ Recommend topics based on top posts + comments across subreddits
 """
 import os
 from pydantic import BaseModel, Field
-from typing import List
-from openai import OpenAI
+from typing import Any, Dict, List, Optional
+from .batch import BatchRequest, get_batch_settings, run_batch
+from .clustering import cluster_posts, format_clusters
+from .db import RedditDB
+from .llm import get_openai_client, run_concurrently
+from .tokens import count_tokens, pack_chunks
+from .trending import rank_posts
 from .utils import Post, Posts, DailyPosts, load_config
 
 class Theme(BaseModel):
@@ -15,40 +20,280 @@ class Theme(BaseModel):
 class Topics(BaseModel):
     themes: List[Theme] = Field(..., description="4-5 top recommended themes for the day")
 
+REDUCE_INSTRUCTIONS = """
+The posts were too many to read at once, so they were split into batches and
+candidate themes were picked from each batch. Below are the candidates with an
+excerpt of the post each one points to. Merge overlapping candidates and choose
+the final themes from them. Every post_id and url you return must be one of
+the candidates'.
+"""
+
+CLUSTER_INSTRUCTIONS = """
+The posts have been grouped into clusters of similar discussions. Each cluster
+starts with a summary (how many posts it holds, from which subreddits, their
+total score and key terms) followed by its most representative posts. Larger
+clusters are discussed more widely. Every post_id and url you return must be
+one of the representative posts shown.
+"""
+
+# Characters of each candidate's post shown to the reduce step
+CANDIDATE_EXCERPT_CHARS = 600
+
 class TopicRecommender:
-    def __init__(self, path: str = "/Users/tashi/Desktop/projects/whatsup/reddit_data.json"):
-        self.client = OpenAI()
+    def __init__(self, path: str = "/Users/tashi/Desktop/projects/whatsup/reddit_data.json", client=None,
+                 db_path: Optional[str] = None, async_client=None):
+        self.client = client or get_openai_client()
+        self.async_client = async_client  # Created per run for the map step when None
         self.path = path
+        self.db_path = db_path
         config = load_config()
+        self.trending = config.get("trending", {})
+        self.clustering = config.get("topic_recommender", {}).get("clustering", {})
+        settings = config.get("topic_recommender", {})
+        self.model = settings.get("model", "gpt-4o-mini")
+        self.max_input_tokens = settings.get("max_input_tokens", 100000)
+        self.chunk_tokens = settings.get("chunk_tokens", 20000)
+        self.max_concurrency = settings.get("max_concurrency", 4)
+        batch = get_batch_settings()
+        self.batch = batch["enabled"] and batch["topics"]  # `topics` only applies with batch mode on
         prompt_path = os.path.join(config["paths"]["generated_prompts"], "topic_recommender_prompt.txt")
         with open(prompt_path, 'r') as f:
             self.system_prompt = f.read()
     
+    def rank_by_trend(self, daily_posts: DailyPosts) -> None:
+        """
+        Order posts by score/comment velocity from the database's time series, hottest first.
+        
+        Posts without stored history keep their order after the ranked ones.
+        Only the top `max_posts` are kept when the trending config sets it.
+        """
+        posts = daily_posts.get_posts()
+        with RedditDB(self.db_path) as db:
+            ranking = {rank['post_id']: rank for rank in rank_posts(db, [post.post_id for post in posts])}
+        for post in posts:
+            if post.post_id in ranking:
+                post.trend = ranking[post.post_id]['velocity']
+        posts.sort(key=lambda post: -ranking[post.post_id]['trend'] if post.post_id in ranking else float('inf'))
+        if self.trending.get("max_posts"):
+            del posts[self.trending["max_posts"]:]
+    
     def recommend_topics(self):
         """
         Analyze posts and recommend trending topics
+        
+        With `topic_recommender.clustering` enabled, posts are first grouped
+        locally and only cluster summaries and representative posts are sent.
+        Posts that fit in `max_input_tokens` are sent in one request. Larger
+        inputs are packed into chunks of at most `chunk_tokens`, candidate
+        themes are extracted from the chunks concurrently, and the candidates
+        are reduced to the final themes, in further chunked rounds while they
+        do not fit in `max_input_tokens` either.
         """
-        posts_text = DailyPosts(self.path).gather_posts()
+        daily_posts = DailyPosts(self.path)
+        if self.db_path and self.trending.get("enabled", False):
+            self.rank_by_trend(daily_posts)
+        posts = daily_posts.get_posts()
+        posts_text = daily_posts.gather_posts()
+        system_prompt = self.system_prompt
         
-        response = self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": posts_text},
-            ],
-            response_format=Topics,
-        )
-
-        response = response.choices[0].message.parsed
-        response = response.model_dump()
+        if self.clustering.get("enabled", False) and len(posts) > self.clustering.get("min_posts", 0):
+            clusters = cluster_posts(
+                posts,
+                self.clustering.get("n_clusters", 8),
+                self.clustering.get("representatives", 2),
+                self.clustering.get("duplicate_threshold", 0.8),
+                self.clustering.get("n_features", 2 ** 16)
+            )
+            clustered_text = format_clusters(clusters)
+            print(f"Clustered {len(posts)} posts into {len(clusters)} groups; prompt "
+                  f"{count_tokens(posts_text, self.model)} -> {count_tokens(clustered_text, self.model)} tokens")
+            posts = [post for cluster in clusters for post in cluster['representatives']]
+            posts_text = clustered_text
+            system_prompt = self.system_prompt + "\n" + CLUSTER_INSTRUCTIONS
+        
+        if count_tokens(system_prompt + posts_text, self.model) <= self.max_input_tokens:
+            response = self.extract_topics(posts_text, system_prompt)
+        else:
+            response = self.map_reduce_topics(posts)
         
         # Load posts to get URLs
         posts = DailyPosts(self.path).get_posts()
         post_urls = {post.post_id: post.url for post in posts}
         
+        themes = []
         for theme in response["themes"]:
             post_id = theme["post_id"]
+            if post_id not in post_urls:
+                # The model named a post that is not in the data; its URL cannot be resolved
+                print(f"Dropping theme '{theme['theme']}': unknown post_id {post_id}")
+                continue
             theme["post_id"] = [post_id]  # Convert to list format
             theme["url"] = post_urls[post_id]  # Add URL for the post
+            themes.append(theme)
+        if not themes:
+            raise ValueError("None of the recommended themes point at a known post")
+        response["themes"] = themes
 
         return response
+    
+    def extract_topics(self, posts_text: str, system_prompt: str = None) -> Dict[str, Any]:
+        """
+        Ask for the themes of a block of formatted posts in one request.
+        
+        Args:
+            posts_text: Formatted posts (or clusters of posts)
+            system_prompt: System prompt to use (defaults to the topic recommender prompt)
+            
+        Returns:
+            Dict[str, Any]: The parsed Topics
+        """
+        return self.request_topics("topics", [
+            {"role": "system", "content": system_prompt or self.system_prompt},
+            {"role": "user", "content": posts_text},
+        ])
+    
+    def request_topics(self, batch_name: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Send one Topics request, through the Batch API when `batch.topics` is set.
+        
+        Args:
+            batch_name: Name of the batch used in batch mode
+            messages: Chat messages of the request
+            
+        Returns:
+            Dict[str, Any]: The parsed Topics
+        """
+        if self.batch:
+            response = run_batch(batch_name, [BatchRequest(self.model, messages, Topics)])[0]
+            if isinstance(response, Exception):
+                raise response
+        else:
+            response = self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=messages,
+                response_format=Topics,
+            )
+        return response.choices[0].message.parsed.model_dump()
+    
+    def map_reduce_topics(self, posts: List[Post]) -> Dict[str, Any]:
+        """
+        Extract candidate themes from token-budgeted chunks of posts in
+        parallel, then reduce them to the final themes.
+        
+        Args:
+            posts: Posts in priority order (hottest first when ranked by trend)
+            
+        Returns:
+            Dict[str, Any]: The parsed Topics of the reduce step
+        """
+        budget = max(1, self.chunk_tokens - count_tokens(self.system_prompt, self.model))
+        chunks = pack_chunks([post.stringify() for post in posts], budget, self.model)
+        print(f"Posts exceed {self.max_input_tokens} tokens; extracting candidate themes from {len(chunks)} chunks")
+        
+        outcomes = self.request_chunks("topic_chunks", self.system_prompt, chunks)
+        posts_by_id = {post.post_id: post for post in posts}
+        candidates = self.collect_candidates(outcomes, posts_by_id, "chunk")
+        if not candidates:
+            raise ValueError("No candidate themes could be extracted from any chunk")
+        return self.reduce_topics(candidates, posts_by_id)
+    
+    def reduce_topics(self, candidates: List[Theme], posts_by_id: Dict[str, Post], level: int = 1) -> Dict[str, Any]:
+        """
+        Reduce candidate themes to the final themes within `max_input_tokens`.
+        
+        Candidates that do not fit in one request are packed into chunks of at
+        most `chunk_tokens`, each chunk is reduced to its own themes, and the
+        results are reduced again. If a round stops shrinking the candidates,
+        the ones that fit (highest priority first) are reduced and the rest dropped.
+        
+        Args:
+            candidates: Candidate themes in priority order
+            posts_by_id: Posts the candidates point at
+            level: Reduce round, for logging and batch names
+            
+        Returns:
+            Dict[str, Any]: The parsed Topics
+        """
+        system_prompt = self.system_prompt + "\n" + REDUCE_INSTRUCTIONS
+        prompt_tokens = count_tokens(system_prompt, self.model)
+        texts = [
+            f"Candidate theme: {theme.theme}\nPost: {theme.post_id}\nURL: {posts_by_id[theme.post_id].url}\n"
+            f"Excerpt: {posts_by_id[theme.post_id].content[:CANDIDATE_EXCERPT_CHARS]}"
+            for theme in candidates
+        ]
+        fitting = pack_chunks(texts, max(1, self.max_input_tokens - prompt_tokens), self.model)
+        
+        if len(fitting) > 1:
+            chunks = pack_chunks(texts, max(1, self.chunk_tokens - prompt_tokens), self.model)
+            print(f"{len(candidates)} candidate themes exceed {self.max_input_tokens} tokens; "
+                  f"reducing {len(chunks)} chunks (round {level})")
+            outcomes = self.request_chunks(f"topic_reduce_{level}", system_prompt, chunks)
+            reduced = self.collect_candidates(outcomes, posts_by_id, f"round {level} chunk")
+            if 0 < len(reduced) < len(candidates):
+                return self.reduce_topics(reduced, posts_by_id, level + 1)
+            print("Reducing did not shrink the candidate themes; dropping those beyond the token budget")
+        
+        return self.request_topics("topic_candidates", [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": fitting[0]},
+        ])
+    
+    def request_chunks(self, batch_name: str, system_prompt: str, chunks: List[str]) -> List[Any]:
+        """
+        Send one Topics request per chunk, concurrently or as one batch.
+        
+        Args:
+            batch_name: Name of the batch used in batch mode
+            system_prompt: System prompt of every request
+            chunks: User message of each request
+            
+        Returns:
+            List[Any]: Completion or raised exception of each chunk, in order
+        """
+        chunk_messages = [
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": chunk},
+            ]
+            for chunk in chunks
+        ]
+        
+        def request(messages: List[Dict[str, str]]):
+            async def call(client):
+                return await client.beta.chat.completions.parse(
+                    model=self.model,
+                    messages=messages,
+                    response_format=Topics,
+                )
+            return call
+        
+        if self.batch:
+            return run_batch(batch_name, [BatchRequest(self.model, messages, Topics) for messages in chunk_messages])
+        return run_concurrently([request(messages) for messages in chunk_messages],
+                                self.max_concurrency, self.async_client)
+    
+    @staticmethod
+    def collect_candidates(outcomes: List[Any], posts_by_id: Dict[str, Post], label: str) -> List[Theme]:
+        """
+        Gather the distinct themes of chunk responses that point at known posts.
+        
+        Args:
+            outcomes: Results of `request_chunks`
+            posts_by_id: Posts the themes may point at
+            label: What a chunk is called in error messages
+            
+        Returns:
+            List[Theme]: Themes in chunk order
+        """
+        candidates = []
+        seen = set()
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error extracting themes from {label} {index + 1}/{len(outcomes)}: {str(outcome)}")
+                continue
+            for theme in outcome.choices[0].message.parsed.themes:
+                # Candidates pointing at posts that do not exist cannot be resolved later
+                if theme.post_id in posts_by_id and (theme.theme, theme.post_id) not in seen:
+                    seen.add((theme.theme, theme.post_id))
+                    candidates.append(theme)
+        return candidates
@@ -0,0 +1,109 @@
+"""
+Rank posts by how fast their score and comment count are growing
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .db import RedditDB
+from .utils import load_config
+
+SECONDS_PER_HOUR = 3600.0
+
+
+def tails_to_arrays(rows: Iterable[Tuple]) -> Dict[str, Any]:
+    """
+    Turn `RedditDB.get_metric_tails` rows into one NumPy array per field.
+
+    Args:
+        rows: Rows from `RedditDB.get_metric_tails`
+
+    Returns:
+        Dict[str, Any]: `post_ids` (list) and, per post, the latest `ts`,
+        `score`, `num_comments` and `created_utc`, plus the last (`last_*`) and
+        previous (`prev_*`) change in `ts`, `score` and `comments` (0 when missing)
+    """
+    rows = list(rows)
+    # None (no such change) becomes NaN
+    numeric = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 10)
+    arrays: Dict[str, Any] = {'post_ids': [row[0] for row in rows]}
+    names = ('ts', 'score', 'num_comments', 'created_utc',
+             'last_ts', 'last_score', 'last_comments', 'prev_ts', 'prev_score', 'prev_comments')
+    for column, name in enumerate(names):
+        arrays[name] = numeric[:, column] if column < 4 else np.nan_to_num(numeric[:, column])
+    return arrays
+
+
+def compute_trends(arrays: Dict[str, Any],
+                   comments_weight: float = 2.0,
+                   acceleration_weight: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    Compute velocity, acceleration and a combined trend score for every post.
+
+    Velocities are per hour over the latest change between scrapes. Posts seen
+    in only one scrape fall back to their average rate since creation.
+    Acceleration is the change between the last two velocities per hour.
+
+    Args:
+        arrays: Output of `tails_to_arrays`
+        comments_weight: Weight of comment velocity in the trend score
+        acceleration_weight: Weight of score acceleration in the trend score
+
+    Returns:
+        Dict[str, np.ndarray]: `velocity`, `comment_velocity`, `acceleration`
+        and `trend` per post, in the order of `arrays['post_ids']`
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        last_hours = arrays['last_ts'] / SECONDS_PER_HOUR
+        prev_hours = arrays['prev_ts'] / SECONDS_PER_HOUR
+        has_last = last_hours > 0
+        has_prev = has_last & (prev_hours > 0)
+
+        age_hours = np.maximum((arrays['ts'] - np.nan_to_num(arrays['created_utc'], nan=arrays['ts'])) / SECONDS_PER_HOUR, 1.0)
+        velocity = np.where(has_last, arrays['last_score'] / last_hours, arrays['score'] / age_hours)
+        comment_velocity = np.where(has_last, arrays['last_comments'] / last_hours, arrays['num_comments'] / age_hours)
+
+        prev_velocity = np.where(has_prev, arrays['prev_score'] / prev_hours, 0.0)
+        acceleration = np.where(has_prev, (velocity - prev_velocity) / ((last_hours + prev_hours) / 2), 0.0)
+
+    velocity = np.nan_to_num(velocity)
+    comment_velocity = np.nan_to_num(comment_velocity)
+    acceleration = np.nan_to_num(acceleration)
+    return {
+        'velocity': velocity,
+        'comment_velocity': comment_velocity,
+        'acceleration': acceleration,
+        'trend': velocity + comments_weight * comment_velocity + acceleration_weight * acceleration
+    }
+
+
+def rank_posts(db: RedditDB, post_ids: Optional[List[str]] = None,
+               comments_weight: float = None, acceleration_weight: float = None) -> List[Dict[str, Any]]:
+    """
+    Rank posts by trend score, hottest first.
+
+    Args:
+        db: Database holding the score/comment-count time series
+        post_ids: Posts to rank (defaults to every tracked post)
+        comments_weight: Weight of comment velocity (defaults to the `trending` config)
+        acceleration_weight: Weight of score acceleration (defaults to the `trending` config)
+
+    Returns:
+        List[Dict[str, Any]]: post_id, trend, velocity, comment_velocity and acceleration per post
+    """
+    settings = load_config().get("trending", {})
+    arrays = tails_to_arrays(db.get_metric_tails(post_ids))
+    trends = compute_trends(
+        arrays,
+        comments_weight if comments_weight is not None else settings.get("comments_weight", 2.0),
+        acceleration_weight if acceleration_weight is not None else settings.get("acceleration_weight", 1.0)
+    )
+    order = np.argsort(-trends['trend'], kind='stable')
+    return [
+        {
+            'post_id': arrays['post_ids'][i],
+            'trend': float(trends['trend'][i]),
+            'velocity': float(trends['velocity'][i]),
+            'comment_velocity': float(trends['comment_velocity'][i]),
+            'acceleration': float(trends['acceleration'][i])
+        }
+        for i in order
+    ]
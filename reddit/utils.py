@@ -1,7 +1,9 @@
 """
 Post, Posts, and TopicRecommendations classes for handling Reddit data
 """
-from typing import Dict, Any, List
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+import hashlib
 import json
 import os
 
@@ -19,9 +21,13 @@ class Post:
         self.comments = post["comments"]
         self.subreddit = post["subreddit"]
         self.score = post["score"]
+        self.trend: Optional[float] = None  # Score gained per hour, when ranked by trending
     
     def stringify(self) -> str:
-        return f"Post: {self.post_id}\nURL: {self.url}\nContent: {self.content}\nComments: {self.comments}\nSubreddit: {self.subreddit}\nScore: {self.score}"
+        text = f"Post: {self.post_id}\nURL: {self.url}\nContent: {self.content}\nComments: {self.comments}\nSubreddit: {self.subreddit}\nScore: {self.score}"
+        if self.trend is not None:
+            text += f"\nTrend: {self.trend:+.1f} score/hour"
+        return text
     
     def __repr__(self):
         return self.stringify()
@@ -72,3 +78,52 @@ class TopicRecommendations:
             if theme_data["theme"] == theme:
                 return theme_data["post_id"]
         return []
+
+def completion_key(model: str, messages: List[Dict[str, Any]], response_format: Any) -> str:
+    """
+    Build a content hash identifying a structured chat completion request.
+    
+    Args:
+        model: Model name
+        messages: Chat messages sent to the model
+        response_format: Pydantic model describing the response
+        
+    Returns:
+        str: Hex digest of the model, messages and response schema
+    """
+    schema = response_format.model_json_schema() if hasattr(response_format, "model_json_schema") else str(response_format)
+    payload = json.dumps([model, messages, schema], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def recorded_completion(model: str, response: Any) -> Dict[str, Any]:
+    """
+    Keep the parts of a ParsedChatCompletion that `replayed_completion` needs.
+    
+    Args:
+        model: Model that produced the response
+        response: ParsedChatCompletion (or an equivalent) returned by `parse`
+        
+    Returns:
+        Dict[str, Any]: JSON-serializable model, parsed result and raw content
+    """
+    message = response.choices[0].message
+    return {
+        "model": model,
+        "parsed": message.parsed.model_dump() if message.parsed is not None else None,
+        "content": message.content
+    }
+
+def replayed_completion(response_format: Any, recorded: Dict[str, Any]) -> SimpleNamespace:
+    """
+    Rebuild the parts of a ParsedChatCompletion that call sites read.
+    
+    Args:
+        response_format: Pydantic model to validate the parsed result with
+        recorded: Output of `recorded_completion`
+        
+    Returns:
+        SimpleNamespace: Completion with `model` and `choices[0].message.parsed`/`content`
+    """
+    parsed = response_format.model_validate(recorded["parsed"]) if recorded["parsed"] is not None else None
+    message = SimpleNamespace(parsed=parsed, content=recorded["content"], refusal=None, role="assistant")
+    return SimpleNamespace(model=recorded["model"], choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
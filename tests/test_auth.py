@@ -0,0 +1,82 @@
+import json
+import time
+import praw
+import pytest
+from reddit.auth import TOKEN_EXPIRY_MARGIN, RedditAuth, _get_authorizer
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setenv("REDDIT_CLIENT_ID", "id")
+    monkeypatch.setenv("REDDIT_CLIENT_SECRET", "secret")
+    monkeypatch.setenv("REDDIT_USERNAME", "user")
+    monkeypatch.setenv("REDDIT_PASSWORD", "password")
+
+
+def make_auth(token_cache=None):
+    auth = RedditAuth(token_cache=token_cache)
+    auth._reddit = praw.Reddit(client_id=auth.client_id, client_secret=auth.client_secret,
+                               username=auth.username, password=auth.password, user_agent=auth.user_agent)
+    return auth
+
+
+def issue_token(reddit, token, expires_in=3600):
+    authorizer = _get_authorizer(reddit)
+    authorizer.access_token = token
+    authorizer.scopes = {"*"}
+    authorizer._expiration_timestamp_ns = time.monotonic_ns() + int(expires_in * 1e9)
+
+
+def test_refresh_is_saved_and_restored(tmp_path):
+    cache = str(tmp_path / "token.json")
+    auth = make_auth(cache)
+    authorizer = _get_authorizer(auth._reddit)
+    authorizer.refresh = lambda: issue_token(auth._reddit, "fresh")
+    auth._watch_token_refresh()
+    authorizer.refresh()
+
+    with open(cache) as f:
+        saved = json.load(f)
+    assert saved["access_token"] == "fresh"
+    assert saved["owner"] == {"client_id": "id", "username": "user"}
+
+    restored = make_auth(cache)
+    assert restored._restore_token()
+    assert _get_authorizer(restored._reddit).access_token == "fresh"
+    assert RedditAuth._token_remaining(restored._reddit) > 3600 - TOKEN_EXPIRY_MARGIN
+
+
+def test_expired_cached_token_is_not_restored(tmp_path):
+    cache = str(tmp_path / "token.json")
+    auth = make_auth(cache)
+    issue_token(auth._reddit, "stale", expires_in=TOKEN_EXPIRY_MARGIN / 2)
+    auth._save_token()
+    assert not make_auth(cache)._restore_token()
+
+
+def test_worker_instance_adopts_shared_token():
+    shared = make_auth()._reddit
+    issue_token(shared, "shared")
+    worker = RedditAuth().authenticate(token_source=shared)
+    assert worker is not shared
+    assert _get_authorizer(worker).access_token == "shared"
+    assert _get_authorizer(worker).scopes == {"*"}
+
+
+def test_expiring_token_is_not_adopted():
+    shared = make_auth()._reddit
+    issue_token(shared, "shared", expires_in=TOKEN_EXPIRY_MARGIN / 2)
+    assert not make_auth()._adopt_token(shared)
+
+
+def test_missing_authorizer_falls_back_to_normal_login(tmp_path):
+    cache = str(tmp_path / "token.json")
+    with open(cache, "w") as f:
+        json.dump({"owner": {"client_id": "id", "username": "user"}, "access_token": "cached",
+                   "scopes": ["*"], "expires_at": time.time() + 3600}, f)
+    auth = make_auth(cache)
+    del auth._reddit._core._authorizer
+    assert _get_authorizer(auth._reddit) is None
+    auth._watch_token_refresh()
+    assert not auth._restore_token()
+    assert not auth._adopt_token(make_auth()._reddit)
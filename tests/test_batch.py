@@ -0,0 +1,113 @@
+import threading
+from typing import List, Optional
+import pytest
+from openai import OpenAI
+from pydantic import BaseModel, Field
+from reddit.batch import BatchError, BatchRequest, BatchRunner, response_format_param
+from reddit.batch_server import make_server
+from reddit.llm_cache import LLMCache
+from reddit.utils import recorded_completion, replayed_completion
+
+
+class Item(BaseModel):
+    name: str = Field(..., description="Name of the item")
+    note: Optional[str] = None
+
+
+class Answer(BaseModel):
+    items: List[Item]
+    total: int
+
+
+def settings(tmp_path):
+    return {
+        "enabled": True,
+        "topics": False,
+        "base_url": None,
+        "state_path": str(tmp_path / "batch_state.json"),
+        "work_dir": str(tmp_path / "batches"),
+        "poll_seconds": 0.05,
+        "completion_window": "24h"
+    }
+
+
+def request(text):
+    return BatchRequest("gpt-4o-mini", [{"role": "user", "content": text}], Answer)
+
+
+def test_response_format_is_a_strict_schema():
+    param = response_format_param(Answer)
+    assert param["type"] == "json_schema"
+    assert param["json_schema"]["name"] == "Answer"
+    assert param["json_schema"]["strict"] is True
+    schema = param["json_schema"]["schema"]
+    assert schema["additionalProperties"] is False
+    assert schema["required"] == ["items", "total"]
+    item = schema["$defs"]["Item"]
+    assert item["additionalProperties"] is False
+    assert item["required"] == ["name", "note"]
+    assert "default" not in item["properties"]["note"]
+
+
+def test_batch_round_trip_through_local_server(tmp_path):
+    server = make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test")
+        cache = LLMCache(str(tmp_path / "cache.db"))
+        runner = BatchRunner(client=client, settings=settings(tmp_path), cache=cache)
+        results = runner.run("answers", [request("one"), request("two")])
+        assert all(isinstance(result.choices[0].message.parsed, Answer) for result in results)
+        assert runner.load_state() == {}
+
+        # A second run is served from the cache without a new batch
+        server.shutdown()
+        again = runner.run("answers", [request("one"), request("two")])
+        assert [result.choices[0].message.parsed for result in again] == \
+               [result.choices[0].message.parsed for result in results]
+        cache.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FakeCassette:
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+        completions = self
+        self.beta = type("Beta", (), {"chat": type("Chat", (), {"completions": completions})})
+
+    def parse(self, *, model, messages, response_format):
+        self.calls.append(messages[0]["content"])
+        if messages[0]["content"] == self.fail_on:
+            raise KeyError("not recorded")
+        return replayed_completion(response_format, {
+            "model": model, "parsed": {"items": [], "total": len(self.calls)}, "content": "{}"
+        })
+
+
+def test_cassette_mode_skips_the_batch_api(tmp_path, monkeypatch):
+    cassette = FakeCassette(fail_on="two")
+    monkeypatch.setattr("reddit.batch.get_openai_cassette", lambda: cassette)
+    runner = BatchRunner(settings=settings(tmp_path), cache=None)
+    assert runner.client is None
+    results = runner.run("answers", [request("one"), request("two")])
+    assert cassette.calls == ["one", "two"]
+    assert results[0].choices[0].message.parsed.total == 1
+    assert isinstance(results[1], BatchError)
+
+
+def test_parse_output_reports_failed_requests():
+    with pytest.raises(BatchError):
+        BatchRunner.parse_output(None, Answer)
+    with pytest.raises(BatchError):
+        BatchRunner.parse_output({"response": {"status_code": 500, "body": {"error": {"message": "boom"}}}}, Answer)
+    output = {"response": {"status_code": 200, "body": {
+        "model": "gpt-4o-mini",
+        "choices": [{"message": {"content": '{"items": [{"name": "a", "note": null}], "total": 1}'}}]
+    }}}
+    completion = BatchRunner.parse_output(output, Answer)
+    assert completion.choices[0].message.parsed.items[0].name == "a"
+    assert recorded_completion("gpt-4o-mini", completion)["parsed"]["total"] == 1
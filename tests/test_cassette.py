@@ -0,0 +1,87 @@
+import json
+from types import SimpleNamespace
+import pytest
+import requests
+from pydantic import BaseModel
+from reddit.cassette import CassetteMissError, CassetteOpenAI, CassetteSession, CassetteStore
+
+MESSAGES = [{"role": "user", "content": "Summarize"}]
+LISTING_URL = "https://oauth.reddit.com/r/python/hot"
+TOKEN_URL = "https://www.reddit.com/api/v1/access_token"
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def parse(self, *, model, messages, response_format, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(parsed=Answer(text=f"answer {self.calls}"), content=f'{{"text": "answer {self.calls}"}}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_response(url, body, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers["content-type"] = "application/json"
+    response._content = json.dumps(body).encode("utf-8")
+    response.url = url
+    return response
+
+
+def test_openai_record_then_replay(tmp_path):
+    path = str(tmp_path / "openai.jsonl")
+    completions = FakeCompletions()
+    recorder = CassetteOpenAI(CassetteStore(path), "record", client=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    recorded = [recorder.beta.chat.completions.parse(model="model", messages=MESSAGES, response_format=Answer) for _ in range(2)]
+    assert completions.calls == 2
+
+    player = CassetteOpenAI(CassetteStore(path), "replay")
+    replayed = [player.beta.chat.completions.parse(model="model", messages=MESSAGES, response_format=Answer) for _ in range(3)]
+    assert [r.choices[0].message.parsed for r in replayed[:2]] == [r.choices[0].message.parsed for r in recorded]
+    # An exhausted key keeps serving its last response
+    assert replayed[2].choices[0].message.parsed == Answer(text="answer 2")
+    assert completions.calls == 2
+
+    with pytest.raises(CassetteMissError):
+        player.beta.chat.completions.parse(model="model", messages=[{"role": "user", "content": "Other"}], response_format=Answer)
+
+
+def test_reddit_record_then_replay(tmp_path, monkeypatch):
+    path = str(tmp_path / "reddit.jsonl")
+    bodies = {
+        TOKEN_URL: {"access_token": "secret-token", "token_type": "bearer"},
+        LISTING_URL: {"kind": "Listing", "data": {"children": []}}
+    }
+    sent = []
+
+    def serve(self, method, url, *args, **kwargs):
+        sent.append(url)
+        return fake_response(url, bodies[url])
+    monkeypatch.setattr(requests.Session, "request", serve)
+
+    recorder = CassetteSession(CassetteStore(path), "record")
+    recorder.request("POST", TOKEN_URL, data={"grant_type": "password", "password": "hunter2"})
+    recorder.request("GET", LISTING_URL, params={"limit": 10})
+    assert sent == [TOKEN_URL, LISTING_URL]
+    with open(path, encoding="utf-8") as f:
+        stored = f.read()
+    assert "secret-token" not in stored and "hunter2" not in stored
+
+    def refuse(self, method, url, *args, **kwargs):
+        raise AssertionError(f"network access during replay: {method} {url}")
+    monkeypatch.setattr(requests.Session, "request", refuse)
+
+    player = CassetteSession(CassetteStore(path), "replay")
+    token = player.request("POST", TOKEN_URL, data={"grant_type": "password", "password": "other"})
+    assert token.json()["access_token"] == "cassette"
+    listing = player.request("GET", LISTING_URL, params={"limit": 10})
+    assert listing.status_code == 200
+    assert listing.json() == bodies[LISTING_URL]
+
+    with pytest.raises(CassetteMissError):
+        player.request("GET", LISTING_URL, params={"limit": 25})
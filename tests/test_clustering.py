@@ -0,0 +1,91 @@
+import numpy as np
+from reddit.clustering import cluster_posts, format_clusters, spherical_kmeans
+from reddit.text_vectors import HashedTfidf
+from reddit.utils import Post
+
+TOPICS = {
+    "figma": "figma auto layout components variants plugin prototype frames tokens grid handoff",
+    "cooking": "pasta sauce garlic oven recipe kitchen bake dough butter knife roast",
+    "running": "marathon training pace shoes mileage race tempo intervals hills recovery stretch",
+}
+
+
+EXTRA_WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet".split()
+
+
+def topic_text(topic, index):
+    """The topic's words plus two words unique to the post."""
+    return f"{TOPICS[topic]} {EXTRA_WORDS[2 * index]} {EXTRA_WORDS[2 * index + 1]}"
+
+
+def make_post(index, topic, text=None, subreddit=None, score=10):
+    return Post({
+        "post_id": f"{topic}{index}",
+        "post_content": text or topic_text(topic, index),
+        "post_url": f"https://reddit.com/{topic}{index}",
+        "comments": "",
+        "subreddit": subreddit or topic,
+        "score": score
+    })
+
+
+def sample_posts():
+    return [make_post(index, topic) for index in range(4) for topic in TOPICS]
+
+
+def test_kmeans_separates_distinct_topics():
+    texts = [post.content for post in sample_posts()]
+    vectorizer = HashedTfidf(2 ** 12)
+    indptr, indices, data = vectorizer.fit_transform(texts)
+    labels, centroids = spherical_kmeans(indptr, indices, data, 2 ** 12, 3)
+    assert centroids.shape == (3, 2 ** 12)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0)
+    for offset in range(3):
+        assert len(set(labels[offset::3])) == 1
+    assert len(set(labels)) == 3
+
+
+def test_kmeans_caps_clusters_at_rows():
+    vectorizer = HashedTfidf(2 ** 10)
+    indptr, indices, data = vectorizer.fit_transform(["one thing", "another thing"])
+    labels, centroids = spherical_kmeans(indptr, indices, data, 2 ** 10, 8)
+    assert len(centroids) == 2
+    assert len(labels) == 2
+
+
+def test_cluster_posts_groups_and_picks_representatives():
+    posts = sample_posts()
+    clusters = cluster_posts(posts, n_clusters=3, representatives=2, duplicate_threshold=0.99, n_features=2 ** 12)
+    assert len(clusters) == 3
+    for cluster in clusters:
+        topics = {post.subreddit for post in cluster['posts']}
+        assert len(topics) == 1
+        assert len(cluster['posts']) == 4
+        assert len(cluster['representatives']) == 2
+        assert cluster['score'] == 40
+        assert cluster['duplicates'] == 0
+        assert set(cluster['terms']) & set(TOPICS[topics.pop()].split())
+
+
+def test_near_identical_posts_are_collapsed_to_the_first():
+    posts = sample_posts()
+    posts.insert(0, make_post(9, "figma", text=topic_text("figma", 1), subreddit="FigmaDesign"))
+    clusters = cluster_posts(posts, n_clusters=3, representatives=5, duplicate_threshold=0.95, n_features=2 ** 12)
+    figma = next(cluster for cluster in clusters if any(post.post_id == "figma9" for post in cluster['posts']))
+    assert figma['duplicates'] == 1
+    ids = [post.post_id for post in figma['representatives']]
+    assert "figma9" in ids and "figma1" not in ids
+    assert figma['subreddits'] == {"figma": 4, "FigmaDesign": 1}
+
+
+def test_cluster_posts_handles_empty_input():
+    assert cluster_posts([]) == []
+
+
+def test_format_clusters_summarises_each_cluster():
+    clusters = cluster_posts(sample_posts(), n_clusters=3, representatives=1, duplicate_threshold=0.99, n_features=2 ** 12)
+    text = format_clusters(clusters)
+    assert text.count("Cluster ") == 3
+    assert "4 posts" in text
+    assert text.count("Representative posts:") == 3
+    assert "total score 40" in text
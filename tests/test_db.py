@@ -0,0 +1,328 @@
+import json
+import sqlite3
+import threading
+import time
+import pytest
+from reddit.db import SCHEMA_VERSION, DBWriteError, DBWriter, RedditDB
+
+# The schema databases were created with before user_version was tracked
+BASELINE_SCHEMA = '''
+CREATE TABLE reddit_searches (
+    id TEXT PRIMARY KEY,
+    keyword TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    subreddit JSON NOT NULL
+);
+CREATE TABLE subreddit_posts (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL,
+    subreddit_search_id TEXT NOT NULL,
+    subreddit TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    score INTEGER,
+    created_utc REAL,
+    author TEXT,
+    num_comments INTEGER,
+    permalink TEXT,
+    selftext TEXT,
+    comments TEXT,
+    FOREIGN KEY (subreddit_search_id) REFERENCES reddit_searches(id),
+    UNIQUE(post_id, subreddit_search_id)
+);
+'''
+
+
+def make_post(post_id, title, comments=(), **fields):
+    post = {'id': post_id, 'subreddit': 'design', 'title': title, 'url': f"https://example.com/{post_id}",
+            'score': 10, 'created_utc': 1.7e9, 'author': 'author', 'num_comments': len(comments),
+            'permalink': f"/r/design/comments/{post_id}", 'selftext': '',
+            'comments': [{'id': f"{post_id}c{index}", 'author': 'commenter', 'body': body, 'score': 1,
+                          'created_utc': 1.7e9, 'replies': []} for index, body in enumerate(comments)]}
+    post.update(fields)
+    return post
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = RedditDB(str(tmp_path / "reddit.db"))
+    yield database
+    database.close()
+
+
+def fts_count(db, table):
+    return db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+@pytest.mark.parametrize("on_write", [False, True])
+def test_search_sees_text_recorded_before_it(tmp_path, on_write):
+    db = RedditDB(str(tmp_path / "reddit.db"), storage={"full_text_on_write": on_write})
+    try:
+        search_id = db.record_search("figma", [{}])[0]
+        db.record_posts(search_id, [make_post("a1", "Figma plugin tips", ["Try the grid plugin"])])
+        db.flush()
+        assert fts_count(db, "posts_fts") == (1 if on_write else 0)
+        hits = db.search_corpus("plugin")
+        assert {(hit['kind'], hit['post_id']) for hit in hits} == {('post', 'a1'), ('comment', 'a1')}
+
+        db.record_posts(search_id, [make_post("a2", "Another plugin")])
+        db.flush()
+        assert {hit['post_id'] for hit in db.search_corpus("plugin", kind="posts")} == {'a1', 'a2'}
+    finally:
+        db.close()
+
+
+def test_rescraped_text_is_not_indexed_again(db):
+    first, second = db.record_search("figma", [{}, {}])
+    db.record_posts(first, [make_post("a1", "Figma plugin tips", ["Try the grid plugin"])])
+    db.update_search_index()
+    progress = dict(db.conn.execute("SELECT name, last_id FROM fts_progress"))
+
+    db.record_posts(second, [make_post("a1", "Figma plugin tips", ["Try the grid plugin"], score=99)])
+    db.update_search_index()
+    after = dict(db.conn.execute("SELECT name, last_id FROM fts_progress"))
+    assert after['post_contents'] == progress['post_contents']
+    assert after['comment_bodies'] == progress['comment_bodies']
+    assert after['post_snapshots'] == progress['post_snapshots'] + 1
+    assert fts_count(db, "posts_fts") == 1
+    assert fts_count(db, "comments_fts") == 1
+
+
+def comment(comment_id, body, score=1, replies=()):
+    return {'id': comment_id, 'author': 'commenter', 'body': body, 'score': score,
+            'created_utc': 1.7e9, 'replies': list(replies)}
+
+
+def test_baseline_database_migrates_with_its_data(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    tree = [comment('c1', 'Figma grids are great', 5, [comment('c2', 'Agreed', 2)]), comment('c3', 'Use tokens')]
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO reddit_searches VALUES (?, 'figma', ?, '{}')",
+                     [('s1', '2024-01-01T00:00:00'), ('s2', '2024-01-01T06:00:00')])
+    rows = [('snap1', 'p1', 's1', 10, tree), ('snap2', 'p1', 's2', 25, tree), ('snap3', 'p2', 's2', 3, [])]
+    conn.executemany('''
+    INSERT INTO subreddit_posts VALUES (?, ?, ?, 'design', ?, 'https://example.com', ?, 1.7e9, 'author', ?, '', ?, ?)
+    ''', [(snapshot_id, post_id, search_id, f"Figma layout {post_id}", score, len(comments), 'Grid systems',
+           json.dumps(comments)) for snapshot_id, post_id, search_id, score, comments in rows])
+    conn.commit()
+    conn.close()
+
+    db = RedditDB(path, storage={"minhash_index": True})
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        stored = db.conn.execute("SELECT id, post_id, score FROM subreddit_posts ORDER BY id").fetchall()
+        assert stored == [('snap1', 'p1', 10), ('snap2', 'p1', 25), ('snap3', 'p2', 3)]
+        assert db.get_post_comments('snap1') == tree
+        assert db.get_post_comments('snap2') == tree
+        assert db.storage_report()['post_contents'] == 2
+        assert db.storage_report()['comment_bodies'] == 3
+        assert [score for _, score, _ in db.get_metric_series('p1')] == [10, 25]
+        assert {hit['post_id'] for hit in db.search_corpus("layout", kind="posts")} == {'p1', 'p2'}
+        assert {hit['comment_id'] for hit in db.search_corpus("grids", kind="comments")} == {'c1'}
+        assert set(db.get_minhash_signatures(['p1', 'p2'])) == {'p1', 'p2'}
+        tables = {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert not tables & {'legacy_subreddit_posts', 'legacy_comments'}
+    finally:
+        db.close()
+
+    # Reopening an up-to-date database changes nothing
+    with RedditDB(path) as db:
+        assert db.storage_report()['post_snapshots'] == 3
+
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("CREATE TABLE items (value INTEGER UNIQUE)")
+    conn.commit()
+    writer = DBWriter(conn, batch_size=16)
+    yield writer, path
+    writer.close()
+    conn.close()
+
+
+def stored_values(path):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT value FROM items ORDER BY value")]
+
+
+def test_failing_write_rolls_back_only_its_savepoint(writer):
+    writer, path = writer
+    gate = threading.Event()
+    # Hold the writer so the next writes are committed as one batch
+    writer.post(gate.wait)
+
+    def insert(value):
+        writer.conn.execute("INSERT INTO items VALUES (?)", (value,))
+
+    def insert_then_fail(value):
+        insert(value)
+        raise ValueError("bad row")
+
+    writer.post(insert, 1)
+    writer.post(insert_then_fail, 2)
+    writer.post(insert, 1)  # Violates the UNIQUE constraint
+    writer.post(insert, 3)
+    gate.set()
+    with pytest.raises(DBWriteError) as raised:
+        writer.flush()
+    assert [type(error) for error in raised.value.errors] == [ValueError, sqlite3.IntegrityError]
+    assert stored_values(path) == [1, 3]
+    writer.flush()  # Errors are reported once
+
+
+def test_flush_waits_for_queued_writes(writer):
+    writer, path = writer
+
+    def slow_insert(value):
+        time.sleep(0.001)
+        writer.conn.execute("INSERT INTO items VALUES (?)", (value,))
+
+    for value in range(100):
+        writer.post(slow_insert, value)
+    writer.flush()
+    assert stored_values(path) == list(range(100))
+    assert writer.call(lambda: "done") == "done"
+
+
+def test_close_commits_queued_writes(writer):
+    writer, path = writer
+    for value in range(50):
+        writer.post(lambda value=value: writer.conn.execute("INSERT INTO items VALUES (?)", (value,)))
+    writer.close()
+    assert stored_values(path) == list(range(50))
+    with pytest.raises(RuntimeError):
+        writer.post(print)
+
+
+def test_search_ranks_title_matches_first(db):
+    search_id = db.record_search("figma", [{}])[0]
+    db.record_posts(search_id, [
+        make_post("body", "Weekly thread", selftext="A question about auto layout in Figma"),
+        make_post("title", "Auto layout deep dive", selftext="Notes from a workshop"),
+        make_post("other", "Color palettes", ["Nothing about the topic"]),
+        make_post("talk", "Design critique", ["Auto layout saved me hours"]),
+    ])
+    hits = db.search_corpus("auto layout")
+    assert {(hit['kind'], hit['post_id']) for hit in hits} == {('post', 'title'), ('post', 'body'), ('comment', 'talk')}
+    assert [hit['rank'] for hit in hits] == sorted(hit['rank'] for hit in hits)
+    # Title matches weigh more than the same words in selftext
+    order = [hit['post_id'] for hit in hits]
+    assert order[0] == 'title' and order.index('title') < order.index('body')
+    assert hits[0]['snippet'] == '[Auto] [layout] deep dive'
+
+    pages = [db.search_corpus("auto layout", limit=1, page=page) for page in (1, 2, 3, 4)]
+    assert [[hit['post_id'] for hit in page] for page in pages] == [[post_id] for post_id in order] + [[]]
+    assert [hit['post_id'] for hit in db.search_corpus("auto layout", kind="comments")] == ['talk']
+    assert {hit['post_id'] for hit in db.search_corpus("layout OR palettes", kind="posts", raw=True)} == {'title', 'body', 'other'}
+
+
+def test_keyset_pages_cover_every_search_once(db):
+    # Searches recorded by one call share created_at, so pages must break ties by rowid
+    search_ids = []
+    for batch in range(3):
+        ids = db.record_search(f"batch{batch}", [{'name': f"sub{index}"} for index in range(4)])
+        search_ids += ids
+        db.record_posts(ids[0], [make_post(f"p{batch}", "Post", ["A comment"])])
+        time.sleep(0.002)
+    db.flush()
+
+    seen = []
+    after = None
+    for _ in range(len(search_ids)):
+        page, after = db.get_searches_page(limit=5, after=after, comments="none")
+        seen += [search['id'] for search in page]
+        if after is None:
+            break
+    assert sorted(seen) == sorted(search_ids)
+    assert len(seen) == len(set(seen))
+    assert [search['keyword'] for search in db.get_searches_page(limit=4)[0]] == ["batch2"] * 4
+
+    streamed = list(db.iter_searches(page_size=5))
+    assert [search['id'] for search in streamed] == seen
+    posts = [post for search in streamed for post in search['posts']]
+    assert sorted(post['id'] for post in posts) == ['p0', 'p1', 'p2']
+    assert all(post['comments'][0]['body'] == "A comment" for post in posts)
+
+
+def test_full_last_page_ends_with_an_empty_page(db):
+    search_ids = db.record_search("figma", [{}] * 4)
+    db.flush()
+    page, after = db.get_searches_page(limit=4)
+    assert sorted(search['id'] for search in page) == sorted(search_ids)
+    assert db.get_searches_page(limit=4, after=after) == ([], None)
+
+
+def test_identical_content_is_stored_once(db):
+    first, second, third = db.record_search("figma", [{}, {}, {}])
+    post = make_post("a1", "Figma plugin tips", ["Try the grid plugin", "Tokens help"])
+    db.record_posts(first, [post])
+    db.flush()
+    before = db.storage_report()
+    assert (before['post_contents'], before['comment_bodies']) == (1, 2)
+
+    # Only the score changed: new snapshot and links, no new text
+    db.record_posts(second, [dict(post, score=50)])
+    db.flush()
+    report = db.storage_report()
+    assert (report['post_snapshots'], report['comment_links']) == (2, 4)
+    assert (report['post_contents'], report['comment_bodies']) == (1, 2)
+    assert report['text_bytes_stored'] == before['text_bytes_stored']
+    assert report['text_bytes_saved'] == report['text_bytes_without_dedup'] - report['text_bytes_stored'] > 0
+
+    # An edited comment adds one body; the post text is still shared
+    edited = make_post("a1", "Figma plugin tips", ["Try the grid plugin", "Tokens help a lot"])
+    db.record_posts(third, [edited])
+    db.flush()
+    report = db.storage_report()
+    assert (report['post_contents'], report['comment_bodies']) == (1, 3)
+    snapshots = [row[0] for row in db.conn.execute(
+        "SELECT id FROM subreddit_posts WHERE subreddit_search_id IN (?, ?)", (first, third))]
+    bodies = {snapshot: [c['body'] for c in db.get_post_comments(snapshot)] for snapshot in snapshots}
+    assert sorted(bodies.values()) == [["Try the grid plugin", "Tokens help"], ["Try the grid plugin", "Tokens help a lot"]]
+
+
+def test_same_post_twice_in_one_search_is_recorded_once(db):
+    search_id = db.record_search("figma", [{}])[0]
+    post = make_post("a1", "Figma plugin tips")
+    db.record_posts(search_id, [post, post])
+    db.record_posts(search_id, [post])
+    db.flush()
+    assert db.storage_report()['post_snapshots'] == 1
+
+
+def test_metric_deltas_decode_to_the_original_series(db):
+    series = {
+        'a1': [(1000, 5, 0), (4600, 40, 3), (8200, 31, 9), (11800, 31, 9)],
+        'b2': [(1000, 0, 0), (8200, 1200, 250)],
+    }
+    points = sorted(((post_id, ts, score, comments, 900.0) for post_id, values in series.items()
+                     for ts, score, comments in values), key=lambda point: point[1])
+    db._writer.call(db._append_metrics, points)
+    # Points not newer than the stored head are ignored
+    db._writer.call(db._append_metrics, [('a1', 8200, 99, 99, 900.0)])
+    assert {post_id: db.get_metric_series(post_id) for post_id in series} == series
+    assert db.get_metric_series('missing') == []
+    stored = db.conn.execute("SELECT score_delta FROM post_metrics WHERE post_id = 'a1' ORDER BY seq").fetchall()
+    assert [row[0] for row in stored] == [5, 35, -9, 0]
+
+
+def test_concurrent_producers_are_all_recorded(db):
+    search_ids = db.record_search("figma", [{}] * 8)
+
+    def produce(worker, search_id):
+        for index in range(10):
+            db.record_posts(search_id, [make_post(f"w{worker}p{index}", f"Post {index}", ["Comment"])])
+
+    threads = [threading.Thread(target=produce, args=(worker, search_id)) for worker, search_id in enumerate(search_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.flush()
+    report = db.storage_report()
+    assert report['post_snapshots'] == 80
+    assert report['comment_links'] == 80
+    assert len(db.get_metric_series('w7p9')) == 1
@@ -0,0 +1,144 @@
+import random
+import pytest
+from reddit.comment_tree import CommentForest, as_dicts
+from reddit.db import RedditDB
+from reddit.dedup import (collapse_duplicates, find_duplicate_groups, iter_unique_posts, merge_comments,
+                          minhash, similarity, url_key)
+
+VOCABULARY = [f"w{i}" for i in range(3000)]
+
+
+def words(rng, count):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+def comment(comment_id, score):
+    return {'id': comment_id, 'author': 'a', 'body': f'body {comment_id}', 'score': score,
+            'created_utc': 1.0, 'replies': []}
+
+
+def post(post_id, subreddit, title, text, url, score=10, comments=()):
+    return {'id': post_id, 'subreddit': subreddit, 'title': title, 'selftext': text, 'url': url,
+            'score': score, 'created_utc': 1.0, 'author': 'x', 'num_comments': len(comments),
+            'permalink': f'/r/{subreddit}/comments/{post_id}/t/', 'comments': list(comments)}
+
+
+@pytest.fixture
+def results():
+    rng = random.Random(1)
+    announcement = words(rng, 150)
+    edited = announcement.replace(announcement.split()[3], "changed")
+    results = {
+        'productdesign': [
+            post('orig', 'productdesign', 'Config announced', announcement,
+                 'https://www.reddit.com/r/productdesign/comments/orig/config/', 50, [comment('c1', 5)])
+        ],
+        'FigmaDesign': [
+            # Crosspost of `orig`: no text, links to the original, higher score
+            post('xpost', 'FigmaDesign', 'Config announced', '',
+                 '/r/productdesign/comments/orig/config/', 80, [comment('c2', 9)]),
+            post('link2', 'FigmaDesign', 'Read this', '', 'https://example.com/a/', 7, [comment('c5', 3)])
+        ],
+        'UX_Design': [
+            # Independent repost with a small edit
+            post('repost', 'UX_Design', 'Config announced!', edited,
+                 'https://www.reddit.com/r/UX_Design/comments/repost/x/', 5, [comment('c3', 1)]),
+            post('link1', 'UX_Design', 'Great article', '', 'https://www.example.com/a?utm_source=x', 3,
+                 [comment('c4', 2)])
+        ]
+    }
+    for index in range(30):
+        subreddit = list(results)[index % 3]
+        results[subreddit].append(post(f'p{index}', subreddit, words(rng, 8), words(rng, 80),
+                                       f'https://www.reddit.com/r/{subreddit}/comments/p{index}/t/', index,
+                                       [comment(f'u{index}', 1)]))
+    return results
+
+
+def flatten(results):
+    return [(subreddit, item) for subreddit, posts in results.items() for item in posts]
+
+
+def test_url_key_normalises_links():
+    assert url_key('https://redd.it/abc') == 't3_abc'
+    assert url_key('https://old.reddit.com/comments/abc/') == 't3_abc'
+    assert url_key('http://www.Example.com/x/?b=1&utm_medium=z&a=2#frag') == \
+        url_key('https://example.com/x?a=2&b=1')
+    assert url_key(None) is None
+
+
+def test_minhash_estimates_similarity():
+    rng = random.Random(0)
+    text = words(rng, 200)
+    assert similarity(minhash(text), minhash(text)) == 1.0
+    assert similarity(minhash(text), minhash(words(rng, 200))) < 0.1
+    assert minhash("") is None
+
+
+def test_groups_crossposts_reposts_and_shared_links(results):
+    posts = [item for _, item in flatten(results)]
+    groups = sorted(sorted(posts[position]['id'] for position in group)
+                    for group in find_duplicate_groups(posts, 0.6))
+    assert groups == [['link1', 'link2'], ['orig', 'repost', 'xpost']]
+
+
+def test_collapse_keeps_original_and_merges_comments(results):
+    collapsed, stats = collapse_duplicates(results, 0.6, merge=True)
+    ids = {item['id'] for _, item in flatten(collapsed)}
+    assert {'orig', 'link2'} <= ids
+    assert not {'xpost', 'repost', 'link1'} & ids
+
+    original = collapsed['productdesign'][0]
+    assert original['id'] == 'orig'
+    assert sorted(other['id'] for other in original['crossposts']) == ['repost', 'xpost']
+    assert [thread['id'] for thread in original['comments']] == ['c2', 'c1', 'c3']
+    assert original['num_comments'] == 3
+    assert results['productdesign'][0].get('crossposts') is None  # input left untouched
+
+    assert stats == {'posts': 35, 'groups': 2, 'duplicates': 3, 'cross_subreddit_groups': 2,
+                     'comments_merged': 3, 'largest_group': 3, 'unique': 32}
+
+
+def test_collapse_without_merging_keeps_comments(results):
+    collapsed, stats = collapse_duplicates(results, 0.6, merge=False)
+    assert [thread['id'] for thread in collapsed['productdesign'][0]['comments']] == ['c1']
+    assert stats['comments_merged'] == 0
+
+
+def test_merge_keeps_comment_forests():
+    first = {'comments': CommentForest.from_dicts([comment('a', 1)])}
+    second = {'comments': [comment('a', 1), comment('b', 4)]}
+    merged = merge_comments([first, second])
+    assert isinstance(merged, CommentForest)
+    assert [thread['id'] for thread in as_dicts(merged)] == ['b', 'a']
+
+
+def test_streamed_duplicates_are_dropped_as_they_arrive(results):
+    stats = {}
+    stream = iter(flatten(results))
+    streamed = iter_unique_posts(stream, 0.6, None, stats)
+    first = next(streamed)
+    # The first post is yielded before the rest of the stream is read
+    assert first == flatten(results)[0] and len(list(stream)) == len(flatten(results)) - 1
+
+    streamed = list(iter_unique_posts(iter(flatten(results)), 0.6, None, stats))
+    assert streamed == [pair for pair in flatten(results) if pair[1]['id'] not in {'xpost', 'repost', 'link1'}]
+    # Kept posts are passed through without merged comments
+    assert streamed[0][1] is results['productdesign'][0] and 'crossposts' not in streamed[0][1]
+    assert stats == {'posts': 35, 'unique': 32, 'duplicates': 3, 'groups': 2, 'cross_subreddit_groups': 2,
+                     'largest_group': 3}
+
+
+def test_database_index_gives_the_same_groups(results, tmp_path):
+    db = RedditDB(str(tmp_path / "dedup.db"), storage={"minhash_index": True})
+    try:
+        search_ids = db.record_search('all', [{'name': subreddit} for subreddit in results])
+        for search_id, posts in zip(search_ids, results.values()):
+            db.record_posts(search_id, posts)
+        db.flush()
+        posts = [item for _, item in flatten(results)]
+        assert set(db.get_minhash_signatures([item['id'] for item in posts])) >= {'orig', 'repost'}
+        with_db = sorted(map(sorted, find_duplicate_groups(posts, 0.6, db)))
+        assert with_db == sorted(map(sorted, find_duplicate_groups(posts, 0.6)))
+    finally:
+        db.close()
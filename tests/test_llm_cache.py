@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from pydantic import BaseModel
+from reddit.llm_cache import CachedAsyncOpenAI, CachedOpenAI, LLMCache
+
+MESSAGES = [{"role": "user", "content": "Summarize"}]
+
+
+class Answer(BaseModel):
+    text: str
+
+
+def completion(text):
+    message = SimpleNamespace(parsed=Answer(text=text), content=f'{{"text": "{text}"}}')
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def parse(self, *, model, messages, response_format, **kwargs):
+        self.calls += 1
+        return completion(f"answer {self.calls}")
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def parse(self, **kwargs):
+        return FakeCompletions.parse(self, **kwargs)
+
+
+def fake_client(completions):
+    return SimpleNamespace(beta=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    key = LLMCache.key("model", MESSAGES, Answer)
+    assert cache.get(key, Answer) is None
+    cache.put(key, "model", completion("hello"))
+    cached = cache.get(key, Answer)
+    assert cached.choices[0].message.parsed == Answer(text="hello")
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    cache.close()
+
+
+def test_extra_parameters_change_the_key():
+    assert LLMCache.key("model", MESSAGES, Answer) != LLMCache.key("model", MESSAGES, Answer, temperature=0)
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), ttl=60)
+    key = LLMCache.key("model", MESSAGES, Answer)
+    cache.put(key, "model", completion("hello"))
+    cache.conn.execute("UPDATE completions SET created_at = ?", (time.time() - 120,))
+    assert cache.get(key, Answer) is None
+    assert cache.stats()['expired'] == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_bytes=120)
+    keys = [LLMCache.key("model", [{"role": "user", "content": str(i)}], Answer) for i in range(3)]
+    for key in keys:
+        cache.put(key, "model", completion("x" * 20))
+        time.sleep(0.01)
+    assert cache.get(keys[0], Answer) is None
+    assert cache.get(keys[2], Answer) is not None
+    assert cache.stats()['evicted'] >= 1
+    cache.close()
+
+
+def test_bypass_skips_lookups_but_stores(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), bypass=True)
+    key = LLMCache.key("model", MESSAGES, Answer)
+    cache.put(key, "model", completion("hello"))
+    assert cache.get(key, Answer) is None
+    assert cache.stats()['bypassed'] == 1
+    assert cache.stats()['entries'] == 1
+    cache.close()
+
+
+def test_cached_client_calls_api_once(tmp_path):
+    completions = FakeCompletions()
+    client = CachedOpenAI(fake_client(completions), LLMCache(str(tmp_path / "cache.db")))
+    first = client.beta.chat.completions.parse(model="model", messages=MESSAGES, response_format=Answer)
+    second = client.beta.chat.completions.parse(model="model", messages=MESSAGES, response_format=Answer)
+    assert completions.calls == 1
+    assert second.choices[0].message.parsed == first.choices[0].message.parsed
+    client.cache.close()
+
+
+def test_async_client_keeps_sqlite_off_the_event_loop(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    cache_threads = []
+    for name in ("get", "put"):
+        method = getattr(cache, name)
+
+        def traced(*args, method=method):
+            cache_threads.append(threading.get_ident())
+            return method(*args)
+        setattr(cache, name, traced)
+
+    completions = FakeAsyncCompletions()
+    client = CachedAsyncOpenAI(fake_client(completions), cache)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        for _ in range(2):
+            await client.beta.chat.completions.parse(model="model", messages=MESSAGES, response_format=Answer)
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert completions.calls == 1
+    assert len(cache_threads) == 3
+    assert loop_thread not in cache_threads
+    cache.close()
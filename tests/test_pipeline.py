@@ -0,0 +1,216 @@
+import json
+import os
+import time
+import pytest
+from reddit.db import RedditDB
+from reddit.pipeline import Pipeline, PipelineError, Stage
+from reddit.utils import load_config
+
+
+class Steps:
+    """Stage functions that log their runs and write their outputs."""
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.calls = []
+        self.failing = set()
+
+    def path(self, name):
+        return str(self.tmp_path / name)
+
+    def copy(self, name, output, source=None, value="1"):
+        def run(context):
+            self.calls.append(name)
+            if name in self.failing:
+                raise PipelineError("boom")
+            data = open(self.path(source)).read() if source else value
+            with open(self.path(output), "w") as f:
+                f.write(data)
+        return run
+
+
+@pytest.fixture
+def steps(tmp_path):
+    return Steps(tmp_path)
+
+
+def chain(steps, value="1"):
+    """a -> b -> c, plus d which only depends on a."""
+    path = steps.path
+    return [
+        Stage("a", steps.copy("a", "a.txt", value=value), outputs=(path("a.txt"),), params={"value": value}),
+        Stage("b", steps.copy("b", "b.txt", "a.txt"), inputs=(path("a.txt"),), outputs=(path("b.txt"),)),
+        Stage("c", steps.copy("c", "c.txt", "b.txt"), inputs=(path("b.txt"),), outputs=(path("c.txt"),)),
+        Stage("d", steps.copy("d", "d.txt", "a.txt"), inputs=(path("a.txt"),), outputs=(path("d.txt"),)),
+    ]
+
+
+def run(steps, stages, force=()):
+    steps.calls.clear()
+    return Pipeline(stages, steps.path("state.json"), max_workers=2).run(force)
+
+
+def test_dependencies_come_from_inputs_and_after(steps):
+    stages = chain(steps) + [Stage("e", steps.copy("e", "e.txt"), after=("c",), outputs=(steps.path("e.txt"),))]
+    pipeline = Pipeline(stages, steps.path("state.json"))
+    assert pipeline.dependencies["b"] == {"a"}
+    assert pipeline.dependencies["e"] == {"c"}
+    order = pipeline.order
+    assert order.index("a") < order.index("b") < order.index("c") < order.index("e")
+
+
+def test_invalid_pipelines_are_rejected(steps):
+    with pytest.raises(PipelineError):
+        Pipeline([Stage("a", steps.copy("a", "a.txt")), Stage("a", steps.copy("a", "a.txt"))])
+    with pytest.raises(PipelineError):
+        Pipeline([Stage("a", steps.copy("a", "a.txt"), after=("missing",))])
+    with pytest.raises(PipelineError):
+        Pipeline([Stage("a", steps.copy("a", "a.txt"), after=("b",)),
+                  Stage("b", steps.copy("b", "b.txt"), after=("a",))])
+    with pytest.raises(PipelineError):
+        run(steps, chain(steps), force=("nope",))
+
+
+def test_second_run_skips_everything(steps):
+    assert set(run(steps, chain(steps)).values()) == {"ran"}
+    assert sorted(steps.calls) == ["a", "b", "c", "d"]
+    assert set(run(steps, chain(steps)).values()) == {"skipped"}
+    assert steps.calls == []
+
+
+def test_unchanged_output_skips_downstream(steps):
+    run(steps, chain(steps))
+    # Changed params re-run `a`, but it writes the same content, so nothing else runs
+    stages = chain(steps)
+    stages[0] = stages[0]._replace(params={"value": "1", "extra": True})
+    outcomes = run(steps, stages)
+    assert outcomes == {"a": "ran", "b": "skipped", "d": "skipped", "c": "skipped"}
+
+
+def test_changed_output_reruns_dependents(steps):
+    run(steps, chain(steps))
+    outcomes = run(steps, chain(steps, value="2"))
+    assert set(outcomes.values()) == {"ran"}
+    assert open(steps.path("c.txt")).read() == "2"
+
+
+def test_failure_blocks_dependents_and_resumes(steps):
+    run(steps, chain(steps))
+    steps.failing.add("b")
+    outcomes = run(steps, chain(steps, value="2"))
+    assert outcomes == {"a": "ran", "b": "failed", "d": "ran", "c": "blocked"}
+    assert "c" not in steps.calls
+
+    steps.failing.clear()
+    outcomes = run(steps, chain(steps, value="2"))
+    assert outcomes == {"a": "skipped", "b": "ran", "d": "skipped", "c": "ran"}
+
+
+def test_missing_outputs_fail_the_stage(steps):
+    stages = [Stage("a", lambda context: None, outputs=(steps.path("never.txt"),))]
+    assert run(steps, stages) == {"a": "failed"}
+
+
+def test_edited_output_reruns_its_stage(steps):
+    run(steps, chain(steps))
+    with open(steps.path("c.txt"), "w") as f:
+        f.write("edited")
+    outcomes = run(steps, chain(steps))
+    assert outcomes["c"] == "ran"
+    assert open(steps.path("c.txt")).read() == "1"
+
+
+def test_force_reruns_named_stages(steps):
+    run(steps, chain(steps))
+    assert run(steps, chain(steps), force=("b",))["b"] == "ran"
+    assert steps.calls == ["b"]
+    assert set(run(steps, chain(steps), force=("all",)).values()) == {"ran"}
+
+
+def test_expired_checkpoint_reruns(steps):
+    stages = chain(steps)
+    stages[0] = stages[0]._replace(max_age_hours=1)
+    run(steps, stages)
+    state = json.load(open(steps.path("state.json")))
+    state["a"]["finished_at"] = time.time() - 2 * 3600
+    json.dump(state, open(steps.path("state.json"), "w"))
+    assert run(steps, stages)["a"] == "ran"
+
+
+def test_callable_params_are_evaluated_when_the_stage_is_due(steps):
+    version = {"value": 1}
+    stages = [Stage("a", steps.copy("a", "a.txt"), outputs=(steps.path("a.txt"),), params=lambda: dict(version))]
+    run(steps, stages)
+    assert run(steps, stages) == {"a": "skipped"}
+    version["value"] = 2
+    assert run(steps, stages) == {"a": "ran"}
+
+
+def test_context_is_shared_between_stages(steps):
+    def produce(context):
+        context["value"] = 42
+
+    def consume(context):
+        with open(steps.path("out.txt"), "w") as f:
+            f.write(str(context["value"]))
+
+    stages = [Stage("produce", produce), Stage("consume", consume, after=("produce",), outputs=(steps.path("out.txt"),))]
+    run(steps, stages)
+    assert open(steps.path("out.txt")).read() == "42"
+
+
+@pytest.fixture
+def main_config(tmp_path):
+    config = load_config()
+    config["paths"] = dict(config["paths"], **{
+        name: str(tmp_path / os.path.basename(path))
+        for name, path in config["paths"].items() if name != "generated_prompts"
+    })
+    config["scraping"]["streaming"] = False
+    return config
+
+
+def stage_named(stages, name):
+    return next(stage for stage in stages if stage.name == name)
+
+
+def test_markdown_stage_reads_the_configured_summaries(main_config):
+    from reddit.main import build_stages
+    markdown = stage_named(build_stages(main_config), "markdown")
+    assert markdown.inputs == (main_config["paths"]["comment_summaries"],)
+
+
+def test_topics_fingerprint_follows_the_trend_database(main_config):
+    from reddit.main import build_stages
+    main_config["trending"]["enabled"] = True
+    topics = stage_named(build_stages(main_config), "topics")
+    db = RedditDB(main_config["paths"]["database"])
+    try:
+        db._writer.call(db._append_metrics, [("a", 1000, 5, 1, 0.0)])
+        before = topics.params()
+        assert before["metrics"] == (1, 0, 1000)
+        db._writer.call(db._append_metrics, [("a", 2000, 9, 2, 0.0)])
+        assert topics.params()["metrics"] == (1, 1, 2000)
+    finally:
+        db.close()
+
+    main_config["trending"]["enabled"] = False
+    assert "metrics" not in stage_named(build_stages(main_config), "topics").params()
+
+
+def test_comment_stage_fails_when_themes_are_missing(main_config, monkeypatch):
+    import reddit.main
+    paths = main_config["paths"]
+    with open(paths["theme_summaries"], "w") as f:
+        json.dump([{"theme": "one"}, {"theme": "two"}], f)
+
+    class FakeSummarizer:
+        def __init__(self, **kwargs):
+            pass
+
+        def summarize_comments(self):
+            return [{"theme": "one"}]
+
+    monkeypatch.setattr(reddit.main, "CommentSummarizer", FakeSummarizer)
+    stage = stage_named(reddit.main.build_stages(main_config), "comment_summaries")
+    with pytest.raises(PipelineError, match="1 of 2 themes"):
+        stage.run({})
@@ -0,0 +1,33 @@
+from reddit.search import prefilter_subreddits
+from reddit.text_vectors import similarity_to_query, split_words
+
+PROFILE = "Aspiring ux designer. I want to learn about AI use in Figma Design"
+
+SUBREDDITS = [
+    {"name": "FigmaDesign", "description": "Tips, plugins and prototypes for Figma design"},
+    {"name": "Cooking", "description": "Recipes and kitchen help"},
+    {"name": "UX_Design", "description": "User experience design, research and careers"},
+    {"name": "soccer", "description": None},
+]
+
+
+def test_split_words_breaks_camel_case_and_underscores():
+    assert split_words("FigmaDesign") == ["figma", "design"]
+    assert split_words("UX_Design") == ["ux", "design"]
+
+
+def test_related_texts_score_higher():
+    scores = similarity_to_query("figma design", ["figma design tips", "football scores"])
+    assert scores[0] > scores[1]
+    assert 0.0 <= scores[1] < 0.05
+
+
+def test_prefilter_keeps_related_subreddits_in_order():
+    kept, scores = prefilter_subreddits(PROFILE, SUBREDDITS, threshold=0.05)
+    assert [subreddit["name"] for subreddit in kept] == ["FigmaDesign", "UX_Design"]
+    assert len(scores) == len(SUBREDDITS)
+
+
+def test_prefilter_top_k_keeps_best_even_below_threshold():
+    kept, _ = prefilter_subreddits(PROFILE, SUBREDDITS, threshold=1.1, top_k=1)
+    assert [subreddit["name"] for subreddit in kept] == ["FigmaDesign"]
@@ -0,0 +1,171 @@
+import praw
+import pytest
+from reddit.rate_limit import FakeClock, RequestScheduler, SchedulerRateLimiter, use_scheduler_throttle
+
+
+def make_scheduler(clock, **kwargs):
+    kwargs.setdefault("requests_per_minute", 60)
+    kwargs.setdefault("burst", 2)
+    return RequestScheduler(clock=clock.now, sleep=clock.sleep, **kwargs)
+
+
+def take(scheduler, count=1):
+    for _ in range(count):
+        with scheduler.request():
+            pass
+
+
+def test_burst_is_served_without_waiting():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, burst=3)
+    take(scheduler, 3)
+    assert clock.now() == 0.0
+
+
+def test_empty_bucket_waits_for_refill():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=60, burst=2)
+    take(scheduler, 2)
+    take(scheduler)
+    assert clock.now() == pytest.approx(1.0)
+    take(scheduler)
+    assert clock.now() == pytest.approx(2.0)
+
+
+def test_refill_is_capped_at_burst():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=60, burst=2)
+    take(scheduler, 2)
+    clock.sleep(100)
+    take(scheduler, 2)
+    assert clock.now() == pytest.approx(100.0)
+    take(scheduler)
+    assert clock.now() == pytest.approx(101.0)
+
+
+def test_headers_set_rate_from_remaining_budget():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=600, burst=5)
+    scheduler.update_from_headers({"x-ratelimit-remaining": "10", "x-ratelimit-reset": "20"})
+    take(scheduler, 5)
+    assert clock.now() == 0.0
+    # 10 requests left over 20 seconds: one token every 2 seconds
+    take(scheduler)
+    assert clock.now() == pytest.approx(2.0)
+
+
+def test_headers_cap_tokens_at_remaining_budget():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, burst=10)
+    scheduler.update_from_headers({"x-ratelimit-remaining": "2", "x-ratelimit-reset": "10"})
+    take(scheduler, 2)
+    assert clock.now() == 0.0
+    take(scheduler)
+    assert clock.now() == pytest.approx(5.0)
+
+
+def test_exhausted_budget_blocks_until_reset():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.update_from_headers({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "30"})
+    take(scheduler)
+    assert clock.now() >= 30.0
+
+
+def test_low_budget_scales_concurrency_down():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_concurrency=4, low_budget=50)
+    scheduler.update_from_headers({"x-ratelimit-remaining": "500", "x-ratelimit-reset": "60"})
+    assert scheduler.stats()["concurrency_limit"] == 4
+    scheduler.update_from_headers({"x-ratelimit-remaining": "25", "x-ratelimit-reset": "60"})
+    assert scheduler.stats()["concurrency_limit"] == 2
+    scheduler.update_from_headers({"x-ratelimit-remaining": "5", "x-ratelimit-reset": "60"})
+    assert scheduler.stats()["concurrency_limit"] == 1
+
+
+def test_429_blocks_for_retry_after():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_concurrency=4)
+    scheduler.update_from_headers({"retry-after": "12"}, status_code=429)
+    take(scheduler)
+    assert clock.now() >= 12.0
+    stats = scheduler.stats()
+    assert stats["throttled"] == 1
+    assert stats["concurrency_limit"] == 1
+
+
+def test_headers_without_budget_are_ignored():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.update_from_headers({"content-type": "application/json"})
+    assert scheduler.stats()["remaining"] is None
+
+
+def test_stats_report_requests_and_waits():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=60, burst=1)
+    take(scheduler, 3)
+    scheduler.update_from_headers({"x-ratelimit-remaining": "80", "x-ratelimit-reset": "60"})
+    stats = scheduler.stats()
+    assert stats["requests"] == 3
+    assert stats["total_wait"] == pytest.approx(2.0)
+    assert stats["max_wait"] == pytest.approx(1.0)
+    assert stats["avg_wait"] == pytest.approx(0.667)
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] == 1
+    assert stats["throttled"] == 0
+    assert stats["remaining"] == 80.0
+
+
+def test_stats_before_any_request():
+    stats = make_scheduler(FakeClock()).stats()
+    assert stats["requests"] == 0
+    assert stats["avg_wait"] == 0.0
+
+
+def test_prawcore_limiter_no_longer_sleeps(monkeypatch):
+    reddit = praw.Reddit(client_id="id", client_secret="secret", user_agent="test",
+                         username="user", password="password")
+    use_scheduler_throttle(reddit)
+    for core in (reddit._read_only_core, reddit._authorized_core):
+        limiter = core._rate_limiter
+        assert isinstance(limiter, SchedulerRateLimiter)
+        limiter.update(response_headers={"x-ratelimit-remaining": "0", "x-ratelimit-used": "600",
+                                         "x-ratelimit-reset": "300"})
+        monkeypatch.setattr("time.sleep", lambda seconds: pytest.fail("prawcore slept"))
+        limiter.delay()
+        assert limiter.remaining == 0
+
+
+def make_reddit():
+    return praw.Reddit(client_id="id", client_secret="secret", user_agent="test",
+                       username="user", password="password")
+
+
+def test_throttle_swap_is_idempotent():
+    reddit = make_reddit()
+    window_size = reddit._read_only_core._rate_limiter.window_size
+    use_scheduler_throttle(reddit)
+    limiters = [reddit._read_only_core._rate_limiter, reddit._authorized_core._rate_limiter]
+    assert all(isinstance(limiter, SchedulerRateLimiter) for limiter in limiters)
+    assert limiters[0].window_size == window_size
+    use_scheduler_throttle(reddit)
+    assert [reddit._read_only_core._rate_limiter, reddit._authorized_core._rate_limiter] == limiters
+
+
+def test_throttle_swap_keeps_unknown_limiters():
+    reddit = make_reddit()
+    unknown = object()
+    reddit._read_only_core._rate_limiter = unknown
+    del reddit._authorized_core._rate_limiter
+    use_scheduler_throttle(reddit)
+    assert reddit._read_only_core._rate_limiter is unknown
+    assert not hasattr(reddit._authorized_core, "_rate_limiter")
+
+
+def test_throttle_swap_tolerates_missing_cores():
+    class Bare:
+        pass
+    reddit = Bare()
+    assert use_scheduler_throttle(reddit) is reddit
@@ -0,0 +1,148 @@
+import os
+import threading
+import praw
+from praw.models import Comment, MoreComments
+from praw.models.comment_forest import CommentForest
+from reddit.reddit_scraper import RedditScraper
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reddit", "config.json")
+REDDIT = praw.Reddit(client_id="id", client_secret="secret", user_agent="test")
+
+
+class FakeSubmission:
+    fullname = "t3_post"
+    id = "post"
+    comment_sort = "top"
+    comment_limit = 10
+
+    def __init__(self):
+        self._comments_by_id = {}
+
+
+def more_comments(submission, more_id, nested, fetched):
+    """A MoreComments whose expansion returns one comment and, `nested` times over, another MoreComments."""
+    more = MoreComments(REDDIT, {"id": more_id, "name": f"t1_{more_id}", "children": [f"{more_id}c"],
+                                 "count": nested + 1, "parent_id": "t3_post"})
+
+    def comments(update=True):
+        if more._comments is not None:
+            return more._comments  # Cached like praw's own comments()
+        fetched.append(more_id)
+        comment = Comment(REDDIT, _data={"id": f"{more_id}x", "name": f"t1_{more_id}x",
+                                         "parent_id": "t3_post", "body": "body"})
+        comment._replies = []
+        comment._submission = submission
+        more._comments = [comment]
+        if nested:
+            more._comments.append(more_comments(submission, f"{more_id}n", nested - 1, fetched))
+        return more._comments
+
+    more.comments = comments
+    return more
+
+
+def expand(limit):
+    submission = FakeSubmission()
+    fetched = []
+    forest = CommentForest(submission, [more_comments(submission, "a", 2, fetched),
+                                        more_comments(submission, "b", 0, fetched)])
+    pending = [item for item in forest.list() if isinstance(item, MoreComments)]
+    skipped = forest.replace_more(limit=limit)
+    return len(pending), fetched, RedditScraper._count_expansions(pending, skipped)
+
+
+def test_counts_expansions_queued_by_replace_more():
+    pending, fetched, counted = expand(limit=10)
+    assert pending == 2
+    assert len(fetched) == 4
+    assert counted == 4
+
+
+def test_counts_only_expansions_within_the_limit():
+    _, fetched, counted = expand(limit=2)
+    assert len(fetched) == 2
+    assert counted == 2
+
+
+def test_nothing_to_expand():
+    assert RedditScraper._count_expansions([], []) == 0
+
+
+class ThreadBoundReddit:
+    """A Reddit stand-in that records every use from a thread other than the one that created it."""
+    def __init__(self, instances):
+        self.thread = threading.get_ident()
+        self.foreign_uses = 0
+        instances.append(self)
+
+    def check_thread(self):
+        # Recorded rather than raised: the scraper reports and swallows per-post errors
+        if threading.get_ident() != self.thread:
+            self.foreign_uses += 1
+
+    def subreddit(self, name):
+        self.check_thread()
+        return ThreadBoundSubreddit(self, name)
+
+    def submission(self, id):
+        self.check_thread()
+        return ThreadBoundSubmission(self, id)
+
+
+class ThreadBoundSubreddit:
+    def __init__(self, reddit, name):
+        self.reddit = reddit
+        self.name = name
+
+    def top(self, limit, time_filter):
+        self.reddit.check_thread()
+        return [ThreadBoundSubmission(self.reddit, f"{self.name}{index}") for index in range(limit)]
+
+
+class StubForest(list):
+    def replace_more(self, limit=32):
+        return []
+
+    def list(self):
+        return list(self)
+
+
+class ThreadBoundSubmission:
+    def __init__(self, reddit, post_id):
+        self.reddit = reddit
+        self.id = post_id
+        self.title = f"title {post_id}"
+        self.url = f"https://example.com/{post_id}"
+        self.score = 1
+        self.created_utc = 1.0
+        self.author = "author"
+        self.num_comments = 0
+        self.permalink = f"/r/sub/comments/{post_id}/"
+        self.selftext = "text"
+
+    @property
+    def comments(self):
+        # Fetching comments is a request, so it must happen on the instance's own thread
+        self.reddit.check_thread()
+        return StubForest()
+
+
+def test_each_worker_scrapes_through_its_own_reddit_instance(tmp_path):
+    instances = []
+    main_reddit = ThreadBoundReddit(instances)
+    scraper = RedditScraper(config_file=CONFIG_PATH, db_path=str(tmp_path / "scrape.db"), reddit=main_reddit,
+                            reddit_factory=lambda: ThreadBoundReddit(instances))
+    try:
+        scraper.subreddits = ["one", "two", "three"]
+        scraper.config.update({"posts_limit": 4, "max_workers": 3, "incremental": False,
+                               "compact_comments": False, "more_comments_limit": 0})
+        scraper.max_workers = 3
+        results = scraper.scrape_all_subreddits()
+    finally:
+        scraper.close()
+
+    assert [len(posts) for posts in results.values()] == [4, 4, 4]
+    assert results["two"][0]["id"] == "two0"
+    # The main instance plus one per worker thread, none used from another thread
+    assert len(instances) == 4
+    assert [reddit.foreign_uses for reddit in instances] == [0, 0, 0, 0]
@@ -0,0 +1,79 @@
+import json
+import threading
+from types import SimpleNamespace
+from reddit.search import RelevancyBatch, SubredditRelevancy, classify_subreddits, get_relevant_subreddits
+
+
+def subreddit(name):
+    return {'name': name, 'description': f"About {name}", 'subscribers': 1000}
+
+
+class FakeCompletions:
+    """Judges a subreddit relevant when its name mentions design."""
+    def __init__(self, skip=(), fail_first=0):
+        self.skip = {name.lower() for name in skip}
+        self.fail_first = fail_first
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def parse(self, *, model, messages, response_format):
+        listing = messages[1]["content"].split("Subreddits:\n", 1)[1]
+        names = [json.loads(line.split(". ", 1)[1])["name"] for line in listing.splitlines()]
+        with self.lock:
+            self.requests.append(names)
+            if len(self.requests) <= self.fail_first:
+                raise RuntimeError("rate limited")
+        verdicts = [
+            SubredditRelevancy(name=name.upper(), relevancy="design" in name.lower(), reasoning="stub")
+            for name in names if name.lower() not in self.skip
+        ]
+        message = SimpleNamespace(parsed=RelevancyBatch(verdicts=verdicts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_client(completions):
+    return SimpleNamespace(beta=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+
+def test_subreddits_are_classified_in_batches():
+    subreddits = [subreddit(f"Design{index}") for index in range(20)] + [subreddit(f"Cooking{index}") for index in range(25)]
+    completions = FakeCompletions()
+    verdicts = classify_subreddits("designer", subreddits, fake_client(completions), batch_size=20, max_workers=3)
+
+    assert sorted(len(names) for names in completions.requests) == [5, 20, 20]
+    assert len(verdicts) == 45
+    assert verdicts["design3"] == {"relevancy": True, "reasoning": "stub"}
+    assert verdicts["cooking3"]["relevancy"] is False
+
+
+def test_missing_verdicts_are_requested_once_more():
+    subreddits = [subreddit(name) for name in ("UXDesign", "Figma", "Knitting", "Gardening")]
+    completions = FakeCompletions(skip=["Knitting"])
+    verdicts = classify_subreddits("designer", subreddits, fake_client(completions), batch_size=10)
+
+    assert completions.requests == [["UXDesign", "Figma", "Knitting", "Gardening"], ["Knitting"]]
+    assert set(verdicts) == {"uxdesign", "figma", "gardening"}
+
+
+def test_failed_batches_are_retried():
+    subreddits = [subreddit(f"Design{index}") for index in range(4)]
+    completions = FakeCompletions(fail_first=1)
+    verdicts = classify_subreddits("designer", subreddits, fake_client(completions), batch_size=2, max_workers=1)
+
+    assert len(completions.requests) == 3
+    assert set(verdicts) == {f"design{index}" for index in range(4)}
+
+
+def test_each_subreddit_is_classified_once_across_keywords():
+    results = {
+        "figma": [subreddit("FigmaDesign"), subreddit("Cooking")],
+        "ux": [subreddit("figmadesign"), subreddit("UX_Design")],
+    }
+    completions = FakeCompletions()
+    relevant = get_relevant_subreddits("designer", results, fake_client(completions))
+
+    assert sorted(name for names in completions.requests for name in names) == ["Cooking", "FigmaDesign", "UX_Design"]
+    assert {keyword: [item["name"] for item in items] for keyword, items in relevant.items()} == {
+        "figma": ["FigmaDesign"],
+        "ux": ["figmadesign", "UX_Design"],
+    }
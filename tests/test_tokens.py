@@ -0,0 +1,42 @@
+import pytest
+from reddit.tokens import count_tokens, pack_chunks, truncate_to_tokens
+
+SEPARATOR = "\n---\n"
+
+
+def texts(count, words=20):
+    return [" ".join(f"post{index}word{word}" for word in range(words)) for index in range(count)]
+
+
+@pytest.mark.parametrize("texts_per_budget", [1, 2.5, 10])
+def test_chunks_stay_under_budget_and_keep_order(texts_per_budget):
+    items = texts(30)
+    budget = int(max(map(count_tokens, items)) * texts_per_budget)
+    chunks = pack_chunks(items, budget)
+    assert all(count_tokens(chunk) <= budget for chunk in chunks)
+    assert SEPARATOR.join(chunks) == SEPARATOR.join(items)
+
+
+def test_texts_are_packed_greedily():
+    items = texts(10)
+    single = count_tokens(items[0])
+    separator = count_tokens(SEPARATOR)
+    chunks = pack_chunks(items, 3 * single + 2 * separator)
+    assert [chunk.count(SEPARATOR) + 1 for chunk in chunks] == [3, 3, 3, 1]
+
+
+def test_everything_fits_in_one_chunk():
+    items = texts(5)
+    assert pack_chunks(items, 10_000) == [SEPARATOR.join(items)]
+
+
+def test_oversized_text_is_truncated_into_its_own_chunk():
+    small, large = texts(1, words=5)[0], texts(1, words=500)[0]
+    budget = count_tokens(small) * 3
+    chunks = pack_chunks([small, large, small], budget)
+    assert chunks == [small, truncate_to_tokens(large, budget), small]
+    assert count_tokens(chunks[1]) <= budget
+
+
+def test_no_texts_no_chunks():
+    assert pack_chunks([], 100) == []
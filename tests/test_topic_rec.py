@@ -0,0 +1,115 @@
+import re
+from types import SimpleNamespace
+import pytest
+import reddit.topic_rec as topic_rec
+from reddit.tokens import count_tokens
+from reddit.topic_rec import REDUCE_INSTRUCTIONS, Theme, TopicRecommender, Topics
+from reddit.utils import Post
+
+SYSTEM_PROMPT = "Recommend the themes of the day."
+
+
+def completion(post_ids):
+    themes = [Theme(theme=f"theme {post_id}", post_id=post_id, url=f"https://example.com/{post_id}")
+              for post_id in post_ids]
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(parsed=Topics(themes=themes)))])
+
+
+class FakeCompletions:
+    """Extracts a theme per post in map requests and keeps `keep` candidates per reduce request."""
+    def __init__(self, keep):
+        self.keep = keep
+        self.requests = []
+
+    def respond(self, messages):
+        self.requests.append(messages)
+        post_ids = re.findall(r"Post: (\S+)", messages[1]["content"])
+        if REDUCE_INSTRUCTIONS in messages[0]["content"] and self.keep is not None:
+            post_ids = post_ids[:self.keep]
+        return completion(post_ids)
+
+    def parse(self, *, model, messages, response_format):
+        return self.respond(messages)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def parse(self, *, model, messages, response_format):
+        return self.respond(messages)
+
+
+def fake_client(completions):
+    return SimpleNamespace(beta=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+
+@pytest.fixture
+def recommender(tmp_path, monkeypatch):
+    (tmp_path / "topic_recommender_prompt.txt").write_text(SYSTEM_PROMPT)
+    config = topic_rec.load_config()
+    config["paths"]["generated_prompts"] = str(tmp_path)
+    monkeypatch.setattr(topic_rec, "load_config", lambda: config)
+
+    def make(keep, max_input_tokens, chunk_tokens):
+        sync, concurrent = FakeCompletions(keep), FakeAsyncCompletions(keep)
+        recommender = TopicRecommender(str(tmp_path / "posts.json"), client=fake_client(sync),
+                                       async_client=fake_client(concurrent))
+        recommender.batch = False
+        recommender.max_input_tokens = max_input_tokens
+        recommender.chunk_tokens = chunk_tokens
+        return recommender, sync, concurrent
+    return make
+
+
+def make_posts(count):
+    return [Post({'post_id': f"p{index}", 'post_content': f"Post {index} about design " * 30,
+                  'post_url': f"https://example.com/p{index}", 'comments': [], 'subreddit': 'design',
+                  'score': count - index}) for index in range(count)]
+
+
+def request_tokens(messages):
+    return sum(count_tokens(message["content"]) for message in messages)
+
+
+def reduce_prompt_tokens():
+    return count_tokens(SYSTEM_PROMPT + "\n" + REDUCE_INSTRUCTIONS)
+
+
+def test_reduce_recurses_until_candidates_fit(recommender):
+    # Room for about two candidates per request, twelve posts to reduce
+    budget = reduce_prompt_tokens() + 400
+    recommender, sync, concurrent = recommender(keep=1, max_input_tokens=budget, chunk_tokens=budget)
+    posts = make_posts(12)
+    result = recommender.map_reduce_topics(posts)
+
+    reduce_requests = [messages for messages in concurrent.requests if REDUCE_INSTRUCTIONS in messages[0]["content"]]
+    assert len(reduce_requests) > 1
+    assert len(sync.requests) == 1
+    assert all(request_tokens(messages) <= budget for messages in concurrent.requests + sync.requests)
+    # The highest priority candidate survives every round
+    assert result["themes"][0]["post_id"] == "p0"
+
+
+def test_reduce_keeps_the_fitting_candidates_when_it_stops_shrinking(recommender):
+    budget = reduce_prompt_tokens() + 400
+    recommender, sync, concurrent = recommender(keep=None, max_input_tokens=budget, chunk_tokens=budget)
+    result = recommender.map_reduce_topics(make_posts(12))
+
+    assert len(sync.requests) == 1
+    assert request_tokens(sync.requests[0]) <= budget
+    kept = [theme["post_id"] for theme in result["themes"]]
+    assert kept == [f"p{index}" for index in range(len(kept))] and 0 < len(kept) < 12
+
+
+def test_candidates_that_fit_are_reduced_in_one_request(recommender):
+    recommender, sync, concurrent = recommender(keep=1, max_input_tokens=100_000, chunk_tokens=reduce_prompt_tokens() + 400)
+    result = recommender.map_reduce_topics(make_posts(6))
+    assert not any(REDUCE_INSTRUCTIONS in messages[0]["content"] for messages in concurrent.requests)
+    assert len(sync.requests) == 1
+    assert [theme["post_id"] for theme in result["themes"]] == ["p0"]
+
+
+@pytest.mark.parametrize("enabled, topics, expected", [(False, True, False), (True, False, False), (True, True, True)])
+def test_topics_use_batches_only_with_batch_mode_enabled(recommender, monkeypatch, enabled, topics, expected):
+    settings = dict(topic_rec.get_batch_settings(), enabled=enabled, topics=topics)
+    monkeypatch.setattr(topic_rec, "get_batch_settings", lambda: settings)
+    recommender, _, _ = recommender(keep=1, max_input_tokens=100_000, chunk_tokens=100_000)
+    assert TopicRecommender(recommender.path, client=recommender.client).batch is expected
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pytest
+from reddit.db import RedditDB
+from reddit.trending import compute_trends, rank_posts, tails_to_arrays
+
+HOUR = 3600
+
+
+def tail(post_id, ts, score, comments, created, last=None, prev=None):
+    last = last or (None, None, None)
+    prev = prev or (None, None, None)
+    return (post_id, ts, score, comments, created) + tuple(last) + tuple(prev)
+
+
+def test_tails_to_arrays_fills_missing_changes_with_zero():
+    arrays = tails_to_arrays([tail("a", 10 * HOUR, 50, 5, 0.0)])
+    assert arrays['post_ids'] == ["a"]
+    assert arrays['score'][0] == 50
+    assert arrays['last_ts'][0] == 0
+    assert arrays['prev_score'][0] == 0
+
+
+def test_tails_to_arrays_handles_no_rows():
+    arrays = tails_to_arrays([])
+    assert arrays['post_ids'] == []
+    assert arrays['ts'].shape == (0,)
+
+
+def test_single_scrape_uses_rate_since_creation():
+    arrays = tails_to_arrays([tail("a", 10 * HOUR, 50, 20, 0.0)])
+    trends = compute_trends(arrays, comments_weight=2.0, acceleration_weight=1.0)
+    assert trends['velocity'][0] == pytest.approx(5.0)
+    assert trends['comment_velocity'][0] == pytest.approx(2.0)
+    assert trends['acceleration'][0] == 0.0
+    assert trends['trend'][0] == pytest.approx(9.0)
+
+
+def test_young_posts_count_at_least_one_hour():
+    arrays = tails_to_arrays([tail("a", 600, 30, 0, 0.0)])
+    assert compute_trends(arrays)['velocity'][0] == pytest.approx(30.0)
+
+
+def test_velocity_and_acceleration_from_last_changes():
+    # +20 score over the last 2 hours after +10 over the 2 hours before
+    arrays = tails_to_arrays([tail("a", 10 * HOUR, 100, 10, 0.0,
+                                   last=(2 * HOUR, 20, 4), prev=(2 * HOUR, 10, 2))])
+    trends = compute_trends(arrays, comments_weight=0.0, acceleration_weight=1.0)
+    assert trends['velocity'][0] == pytest.approx(10.0)
+    assert trends['comment_velocity'][0] == pytest.approx(2.0)
+    assert trends['acceleration'][0] == pytest.approx(2.5)
+    assert trends['trend'][0] == pytest.approx(12.5)
+
+
+def test_missing_created_utc_does_not_produce_nan():
+    arrays = tails_to_arrays([tail("a", 10 * HOUR, 50, 5, None)])
+    trends = compute_trends(arrays)
+    assert all(np.isfinite(trends[name][0]) for name in trends)
+
+
+def test_rank_posts_orders_hottest_first(tmp_path):
+    db = RedditDB(os.path.join(tmp_path, "trending.db"))
+    try:
+        base = 1_700_000_000
+        growth = {"slow": (1, 0), "fast": (50, 5), "steady": (10, 1)}
+        for scrape in range(3):
+            points = [(post_id, base + scrape * HOUR, score * (scrape + 1), comments * (scrape + 1), base - HOUR)
+                      for post_id, (score, comments) in growth.items()]
+            db._writer.call(db._append_metrics, points)
+
+        ranked = rank_posts(db, comments_weight=0.0, acceleration_weight=0.0)
+        assert [row['post_id'] for row in ranked] == ["fast", "steady", "slow"]
+        assert ranked[0]['velocity'] == pytest.approx(50.0)
+
+        subset = rank_posts(db, ["slow", "steady"], comments_weight=0.0, acceleration_weight=0.0)
+        assert [row['post_id'] for row in subset] == ["steady", "slow"]
+    finally:
+        db.close()